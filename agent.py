@@ -9,20 +9,27 @@ from dotenv import load_dotenv
 import json
 import multiprocessing
 import os
+import time
 from typing import Any
+import aiohttp
+import numpy as np
 from livekit import rtc, api
 from livekit.agents import (
     AgentSession,
     Agent,
     JobContext,
+    JobProcess,
     function_tool,
     RunContext,
+    StopResponse,
+    ToolError,
     get_job_context,
     cli,
     WorkerOptions,
     RoomInputOptions,
     ConversationItemAddedEvent,
     UserInputTranscribedEvent,
+    FunctionToolsExecutedEvent,
 )
 from livekit.plugins import (
     deepgram,
@@ -32,6 +39,20 @@ from livekit.plugins import (
     noise_cancellation # noqa: F401
 )
 from livekit.plugins.turn_detector.english import EnglishModel
+from answering_machine import AnsweringMachineDetector
+from call_watchdog import CallWatchdog
+from greeting_cache import (
+    DEFAULT_AUDIO_CACHE_DIR,
+    FALLBACK_GREETING_INSTRUCTIONS,
+    VERIFY_INSTRUCTIONS,
+    PhraseAudioCache,
+    SpeculativeGreeting,
+    play_frames,
+)
+from backend_client import BackendClient, BackendError, with_filler
+from script_registry import DEFAULT_REGISTRY_DIR, ScriptRegistry
+from transcript_sink import DEFAULT_TRANSCRIPT_DIR, TranscriptSink
+from voice_metrics import DEFAULT_METRICS_DIR, VoiceMetrics
 
 
 
@@ -47,6 +68,71 @@ except RuntimeError:
     pass
 
 
+CARTESIA_VOICE_ID = "79f8b5fb-2cc8-479a-80df-29f7a7cf1a3e"
+
+script_registry = ScriptRegistry(os.getenv("SCRIPT_REGISTRY_DIR", DEFAULT_REGISTRY_DIR))
+metrics_dir = os.getenv("VOICE_METRICS_DIR", DEFAULT_METRICS_DIR)
+
+# local answering machine detection: "hangup", "message" (leave VOICEMAIL_MESSAGE) or "off"
+amd_action = os.getenv("AMD_ACTION", "hangup")
+amd_threshold = float(os.getenv("AMD_THRESHOLD", "0.85"))
+VOICEMAIL_MESSAGE = (
+    "Hi, this is Alex from the Bank of America with a message for {customer_name}. "
+    "Please call us back at your earliest convenience regarding your account. Thank you."
+)
+
+# prepare the opening turn while the phone rings; fixed phrases come from a per-campaign audio cache
+speculative_greeting = os.getenv("SPECULATIVE_GREETING", "1") != "0"
+audio_cache_dir = os.getenv("AUDIO_CACHE_DIR", DEFAULT_AUDIO_CACHE_DIR)
+
+
+#------------------------
+#--------PREWARM---------
+#------------------------
+
+def prewarm(proc: JobProcess):
+    """Loads the models once per worker process, before any job is assigned to it"""
+    start = time.perf_counter()
+    proc.userdata["vad"] = silero.VAD.load()
+    # the OpenAI plugin owns its own HTTP client, so one instance serves every job of the process
+    proc.userdata["llm"] = openai.LLM(model="gpt-4o-mini")
+    proc.userdata["startup_latencies_ms"] = []
+    # latency percentiles are aggregated over every call this process handles
+    proc.userdata["voice_metrics"] = VoiceMetrics()
+    # connection pool to the payments/scheduling backend, shared by every call of the process
+    proc.userdata["backend"] = BackendClient(
+        os.getenv("BACKEND_URL", "http://127.0.0.1:8787"),
+        api_key=os.getenv("BACKEND_API_KEY"),
+        timeout=float(os.getenv("BACKEND_TIMEOUT", "5")),
+    )
+    proc.userdata["transcript_sink"] = TranscriptSink(os.getenv("TRANSCRIPT_DIR", DEFAULT_TRANSCRIPT_DIR))
+    logger.info(f"worker process prewarmed in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def get_speech_clients(proc: JobProcess):
+    """STT/TTS clients shared by every job of this process over one keep-alive HTTP session.
+
+    Created on first use because the aiohttp session has to be made inside the job's event loop.
+    """
+    clients = proc.userdata.get("speech_clients")
+    if clients is None:
+        http_session = aiohttp.ClientSession()
+        clients = (
+            deepgram.STT(http_session=http_session),
+            cartesia.TTS(voice=CARTESIA_VOICE_ID, http_session=http_session),
+        )
+        proc.userdata["speech_clients"] = clients
+    return clients
+
+
+def get_phrase_cache(proc: JobProcess, campaign: str) -> PhraseAudioCache:
+    """The campaign's cache of synthesized fixed phrases, shared by every job of this process"""
+    caches = proc.userdata.setdefault("phrase_caches", {})
+    if campaign not in caches:
+        caches[campaign] = PhraseAudioCache(audio_cache_dir, campaign, voice=CARTESIA_VOICE_ID)
+    return caches[campaign]
+
+
 #------------------------
 #---------AGENT----------
 #------------------------
@@ -62,48 +148,23 @@ class VasooliMan(Agent):
         due_date: str,
         card_type: str,
         dial_info: dict[str, Any],
+        backend: BackendClient,
+        call_id: str,
+        phrases: PhraseAudioCache | None = None,
     ):
+        # the script comes from the versioned registry; it hot-reloads, so a new version
+        # rolls out to running workers without a restart
+        script = script_registry.pick(account_number)
         super().__init__(
-            instructions=f"""
-            You are a professional debt collection representative for a major bank. Your interface with users will be voice.
-            You are calling {customer_name} regarding their overdue credit card bill. YOU HAVE TO RETURN ANSWERS THAT A PERSON CAN SPEAK OUT LOUD.
-            DO NOT RETURN MARKDOWN FORMATTING.
-            
-            FETCHED DETAILS:
-            - Customer: {customer_name}
-            - Account: {account_number}
-            - Card Type: {card_type}
-            - Outstanding Amount: ${outstanding_amount}
-            - Payment Due Date: {due_date}
-            
-            NEEDED BEHAVIOR:
-            - Always identify yourself and the company at the start.
-            - Be professional, respectful, and empathetic.
-            - Verify you're speaking with the right person before discussing debt details.
-            - Offer payment options (full amount, minimum payment, or payment plan).
-            - Respect customer requests to end the call.
-            
-            GOALS:
-            1. Verify customer identity.
-            2. Inform about the overdue credit card account.
-            3. Discuss payment options and try to secure a payment commitment.
-            4. If no immediate payment, provide clear next steps.
-            
-            HOW TO HANDLE THESE EDGE CASES:
-            - If customer disputes debt: Use handle_payment_dispute tool to log the dispute.
-            - If customer requests no more calls: Use handle_do_not_call_request tool.
-            - If customer is silent after pickup: Use handle_silent_call tool to prompt for a response.
-            - If customer is hostile: Stay calm, and document the interaction.
-            - If interrupted: Acknowledge the interruption and continue the conversation naturally.
-            
-            HOW TO START THE CONVERSATION:
-            - If user says "Hello?": Immediately respond with your name and the bank's name.
-            - If user is silent: Wait 3 seconds then say "Hello, is this {customer_name}?"
-            - If background noise: Acknowledge it and ask if they can hear you clearly.
-            
-            ALWAYS MAINTAIN A HELPFUL, SOLUTION-ORIENTED APPROACH.
-            """
+            instructions=script.render(
+                customer_name=customer_name,
+                account_number=account_number,
+                outstanding_amount=outstanding_amount,
+                due_date=due_date,
+                card_type=card_type,
+            )
         )
+        self.script_version = script.version
         # Store customer information
         self.customer_name = customer_name
         self.account_number = account_number
@@ -112,6 +173,13 @@ class VasooliMan(Agent):
         self.card_type = card_type
         self.participant: rtc.RemoteParticipant | None = None
         self.dial_info = dial_info
+        self.backend = backend
+        # while the answering machine detector listens, the LLM does not reply to the line
+        self.screening = amd_action != "off"
+        # identifies this call in backend idempotency keys
+        self.call_id = call_id
+        # pre-synthesized audio of the filler lines, when the campaign has it
+        self.phrases = phrases
 
     def set_participant(self, participant: rtc.RemoteParticipant):
         self.participant = participant
@@ -119,7 +187,9 @@ class VasooliMan(Agent):
     # the agent wasn't hanging up the call, so I added this func
     async def hangup(self):
         """Function to hang up the call by deleting the room"""
-        logger.info(f"hanging up the call for {self.participant.identity}")
+        # the watchdog can hang up before the participant has been set
+        identity = self.participant.identity if self.participant else self.dial_info["phone_number"]
+        logger.info(f"hanging up the call for {identity}")
         job_ctx = get_job_context()
         await job_ctx.api.room.delete_room(
             api.DeleteRoomRequest(
@@ -128,6 +198,22 @@ class VasooliMan(Agent):
         )
 
 
+    async def on_user_turn_completed(self, turn_ctx, new_message):
+        if self.screening:
+            raise StopResponse()
+
+    async def _backend_call(self, ctx: RunContext, request, filler: str) -> dict:
+        """Runs a backend request for a tool, speaking `filler` if it is slow to answer"""
+        frames = self.phrases.cached(filler) if self.phrases is not None else None
+        try:
+            return await with_filler(
+                ctx.session, request, filler, audio=(lambda: play_frames(frames)) if frames else None
+            )
+        except BackendError as e:
+            logger.error(f"backend request failed for {self.account_number}: {e}")
+            raise ToolError("The system is not responding right now. Offer to call the customer back.")
+
+
 #------------------------
 #---------TOOLS----------
 #------------------------
@@ -162,12 +248,11 @@ class VasooliMan(Agent):
         logger.info(
             f"setting up payment plan for {self.participant.identity}: ${monthly_amount}/month for {duration_months} months"
         )
-        await asyncio.sleep(2)
-        return {
-            "status": "approved",
-            "plan_id": "PLAN789012345",
-            "message": f"Payment plan approved: ${monthly_amount} per month for {duration_months} months"
-        }
+        return await self._backend_call(
+            ctx,
+            self.backend.setup_payment_plan(self.account_number, self.call_id, monthly_amount, duration_months),
+            filler="Okay, let me set that plan up for you, one moment.",
+        )
 
     @function_tool()
     async def schedule_callback(
@@ -185,11 +270,11 @@ class VasooliMan(Agent):
         logger.info(
             f"scheduling callback for {self.participant.identity} on {callback_date} at {callback_time}"
         )
-        return {
-            "status": "scheduled",
-            "callback_id": "CB456789012",
-            "message": f"Callback scheduled for {callback_date} at {callback_time}"
-        }
+        return await self._backend_call(
+            ctx,
+            self.backend.schedule_callback(self.account_number, self.call_id, callback_date, callback_time),
+            filler="Sure, let me put that in the calendar.",
+        )
 
     @function_tool()
     async def process_payment(
@@ -207,11 +292,11 @@ class VasooliMan(Agent):
         logger.info(
             f"processing payment of ${amount} via {payment_method} for {self.participant.identity}"
         )
-        await asyncio.sleep(2)
-        return {
-            "status": "success",
-            "message": f"Payment of ${amount} processed successfully via {payment_method}"
-        }
+        return await self._backend_call(
+            ctx,
+            self.backend.process_payment(self.account_number, self.call_id, amount, payment_method),
+            filler="Thanks, I'm processing that payment now, it'll just take a moment.",
+        )
 
     @function_tool()
     async def handle_payment_dispute(
@@ -225,11 +310,11 @@ class VasooliMan(Agent):
             dispute_reason: The reason customer gives for disputing (already paid, not theirs, etc.)
         """
         logger.info(f"Payment dispute from {self.participant.identity}: {dispute_reason}")
-        return {
-            "status": "disputed",
-            "dispute_id": "DISP123456789",
-            "message": "Dispute logged. Account will be reviewed within 3-5 business days"
-        }
+        return await self._backend_call(
+            ctx,
+            self.backend.log_dispute(self.account_number, self.call_id, dispute_reason),
+            filler="I understand, let me note that down on your account.",
+        )
 
     @function_tool()
     async def handle_silent_call(self, ctx: RunContext):
@@ -245,12 +330,62 @@ class VasooliMan(Agent):
         logger.info(f"detected answering machine for {self.participant.identity}")
         await self.hangup()
 
+async def report_call_status(ctx: JobContext, status: str, **details):
+    """Publishes the call status in the room metadata, where the campaign runner polls it"""
+    try:
+        await ctx.api.room.update_room_metadata(
+            api.UpdateRoomMetadataRequest(
+                room=ctx.room.name,
+                metadata=json.dumps({"call_status": status, **details}),
+            )
+        )
+    except Exception as e:
+        logger.warning(f"failed to report call status {status}: {e}")
+
+async def listen_for_answering_machine(
+    session: AgentSession,
+    participant: rtc.RemoteParticipant,
+    detector: AnsweringMachineDetector,
+    done,
+):
+    """Feeds the caller's audio and final transcripts to the detector until `done(detector)` or its window ends"""
+    def on_transcribed(event: UserInputTranscribedEvent):
+        if event.is_final:
+            detector.feed_transcript(event.transcript)
+
+    session.on("user_input_transcribed", on_transcribed)
+    stream = rtc.AudioStream.from_participant(
+        participant=participant,
+        track_source=rtc.TrackSource.SOURCE_MICROPHONE,
+        sample_rate=16000,
+        num_channels=1,
+    )
+
+    async def _listen():
+        async for event in stream:
+            detector.feed_audio(np.frombuffer(event.frame.data, dtype=np.int16), event.frame.sample_rate)
+            if done(detector) or detector.elapsed >= detector.window:
+                return
+
+    try:
+        # the audio track may never arrive; the window is also enforced on the wall clock
+        await asyncio.wait_for(_listen(), detector.window - detector.elapsed + 1)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        session.off("user_input_transcribed", on_transcribed)
+        await stream.aclose()
+
+
 async def entrypoint(ctx: JobContext):
+    job_received = time.perf_counter()
     logger.info(f"JOB RECEIVED: connecting to room {ctx.room.name}")
     logger.info(f"JOB METADATA: {ctx.job.metadata}")
     await ctx.connect()
     dial_info = json.loads(ctx.job.metadata)
     participant_identity = phone_number = dial_info["phone_number"]
+    # campaigns spread calls over several trunks, single jobs fall back to the default one
+    sip_trunk_id = dial_info.get("sip_trunk_id") or outbound_trunk_id
 
 
     customer_name = dial_info.get("customer_name", "Valued Customer")
@@ -258,8 +393,10 @@ async def entrypoint(ctx: JobContext):
     outstanding_amount = dial_info.get("outstanding_amount", "1000")
     due_date = dial_info.get("due_date", "September 15, 2025")
     card_type = dial_info.get("card_type", "Visa")
-    
+    campaign = dial_info.get("campaign", "default")
 
+    stt, tts = get_speech_clients(ctx.proc)
+    phrases = get_phrase_cache(ctx.proc, campaign)
     agent = VasooliMan(
         customer_name=customer_name,
         account_number=account_number,
@@ -267,44 +404,54 @@ async def entrypoint(ctx: JobContext):
         due_date=due_date,
         card_type=card_type,
         dial_info=dial_info,
+        backend=ctx.proc.userdata["backend"],
+        call_id=ctx.room.name,
+        phrases=phrases,
     )
+    logger.info(f"using agent script {agent.script_version} for {account_number}")
 
+    # models and clients come from prewarm, so nothing is loaded between job start and dialing.
+    # EnglishModel is only a handle: the turn-detection model itself is loaded once per worker
+    # by the shared inference executor, and the handle is bound to this job's executor.
+    # open the TTS connection now so the greeting does not pay for the handshake
+    tts.prewarm()
     session = AgentSession(
         turn_detection=EnglishModel(),
-        vad=silero.VAD.load(),
-        stt=deepgram.STT(),
-        tts=cartesia.TTS(voice="79f8b5fb-2cc8-479a-80df-29f7a7cf1a3e"),
-        llm=openai.LLM(model="gpt-4o-mini"),
+        vad=ctx.proc.userdata["vad"],
+        stt=stt,
+        tts=tts,
+        llm=ctx.proc.userdata["llm"],
     )
     
-    # made these event handlers to debug the conversation flow, not needed for production
-    @session.on("user_input_transcribed")
-    def on_user_input_transcribed(event: UserInputTranscribedEvent):
-        async def _log_transcript():
-            logger.info(f"User speech committed: {event.transcript}")
-        
-        asyncio.create_task(_log_transcript())
-    
-    @session.on("conversation_item_added") 
-    def on_agent_speech_committed(event: ConversationItemAddedEvent):
-        async def _log_item():
-            logger.info(f"Agent speech committed: {event.item.text_content}")
+    # per-turn latency, tool durations and interruptions; exported when the job ends
+    voice_metrics = ctx.proc.userdata["voice_metrics"]
+    voice_metrics.attach(session)
+    ctx.add_shutdown_callback(lambda: asyncio.to_thread(voice_metrics.write, metrics_dir))
+
+    # transcripts and tool outcomes go to rotating JSONL files the pipeline can score
+    transcript_sink = ctx.proc.userdata["transcript_sink"]
+    call_id = ctx.room.name
+
+    @session.on("conversation_item_added")
+    def on_conversation_item_added(event: ConversationItemAddedEvent):
+        item = event.item
+        transcript_sink.emit(
+            call_id, "message", role=item.role, content=item.text_content, interrupted=item.interrupted
+        )
 
-        asyncio.create_task(_log_item())
-    
-    @session.on("user_state_changed")
-    def on_user_state_changed(state: str):
-        async def _log_state():
-            logger.info(f"User state changed: {state}")
-        
-        asyncio.create_task(_log_state())
-    
-    @session.on("agent_state_changed")
-    def on_agent_state_changed(state: str):
-        async def _log_state():
-            logger.info(f"Agent state changed: {state}")
+    @session.on("function_tools_executed")
+    def on_function_tools_executed(event: FunctionToolsExecutedEvent):
+        for call, output in event.zipped():
+            transcript_sink.emit(
+                call_id,
+                "tool",
+                name=call.name,
+                arguments=call.arguments,
+                output=output.output if output else None,
+                is_error=output.is_error if output else None,
+            )
 
-        asyncio.create_task(_log_state())
+    ctx.add_shutdown_callback(transcript_sink.flush)
 
     # this starts the session first before dialing, to ensure that when the user picks up
     # the agent does not miss anything the user says
@@ -319,13 +466,42 @@ async def entrypoint(ctx: JobContext):
         )
     )
 
+    # the greeting is written and synthesized while the phone rings, so it plays right at pickup;
+    # the campaign's other fixed phrases are synthesized once in the background for later use
+    greeting = None
+    if speculative_greeting:
+        greeting = SpeculativeGreeting(tts, ctx.proc.userdata["llm"], phrases, agent.instructions, customer_name)
+        greeting.start()
+        ctx.add_shutdown_callback(greeting.aclose)
+        phrases.start_warming(tts)
+
     # this starts dialing the user
-    logger.info(f"Creating SIP participant for {phone_number} with trunk {outbound_trunk_id}") 
+    logger.info(f"Creating SIP participant for {phone_number} with trunk {sip_trunk_id}") 
+    await report_call_status(ctx, "dialing")
+
+    # the first terminal status reported is final: the shutdown callback's "completed" must not
+    # overwrite "voicemail" or "failed", or the campaign runner would never retry those calls
+    final_status = None
+
+    async def finish_call(status: str, **details):
+        nonlocal final_status
+        if final_status is None:
+            final_status = status
+            await report_call_status(ctx, status, **details)
+
+    watchdog = None
+
+    startup_latencies = ctx.proc.userdata["startup_latencies_ms"]
+    startup_latencies.append((time.perf_counter() - job_received) * 1000)
+    logger.info(
+        f"job startup latency (job received -> dial issued): {startup_latencies[-1]:.0f} ms, "
+        f"process average {sum(startup_latencies) / len(startup_latencies):.0f} ms over {len(startup_latencies)} jobs"
+    )
     try:
         await ctx.api.sip.create_sip_participant(
             api.CreateSIPParticipantRequest(
                 room_name=ctx.room.name,
-                sip_trunk_id=outbound_trunk_id,
+                sip_trunk_id=sip_trunk_id,
                 sip_call_to=phone_number,
                 participant_identity=participant_identity,
                 wait_until_answered=True,
@@ -333,38 +509,100 @@ async def entrypoint(ctx: JobContext):
         )
         logger.info("SIP participant created successfully")
 
+        picked_up = time.perf_counter()
+        # when answering machine detection gave its verdict; the greeting waits for it
+        amd_decided = None
+
+        def on_first_audio(seconds: float):
+            amd_seconds = amd_decided - picked_up if amd_decided is not None else None
+            if amd_seconds is None:
+                logger.info(f"time to first audio: {seconds * 1000:.0f} ms after pickup")
+            else:
+                logger.info(
+                    f"time to first audio: {seconds * 1000:.0f} ms after pickup, "
+                    f"{(seconds - amd_seconds) * 1000:.0f} ms after answering machine detection"
+                )
+                voice_metrics.observe("time_to_first_audio_after_amd", seconds - amd_seconds)
+            transcript_sink.emit(
+                call_id,
+                "first_audio",
+                seconds=round(seconds, 3),
+                amd_seconds=round(amd_seconds, 3) if amd_seconds is not None else None,
+                speculative=greeting is not None,
+            )
+
+        await report_call_status(ctx, "answered", script_version=agent.script_version)
+        transcript_sink.emit(
+            call_id, "call", account_number=account_number, script_version=agent.script_version, status="answered"
+        )
+        ctx.add_shutdown_callback(lambda: finish_call("completed"))
+
+        # ends stuck, silent or abandoned calls so the job and SIP channel are released
+        watchdog = CallWatchdog(
+            session,
+            ctx.room,
+            participant_identity,
+            hangup=agent.hangup,
+            shutdown=lambda reason: ctx.shutdown(reason=f"watchdog: {reason}"),
+            max_duration=float(os.getenv("MAX_CALL_DURATION", "300")),
+            max_silence=float(os.getenv("MAX_CALL_SILENCE", "30")),
+        )
+        watchdog.start()
+        ctx.add_shutdown_callback(watchdog.stop)
+
         await session_started
         participant = await ctx.wait_for_participant(identity=participant_identity)
         logger.info(f"participant joined: {participant.identity}")
 
         agent.set_participant(participant)
 
-
+        if agent.screening:
+            detector = AnsweringMachineDetector(threshold=amd_threshold)
+            await listen_for_answering_machine(session, participant, detector, lambda d: d.decision() is not None)
+            verdict = detector.decision() or "human"
+            amd_decided = time.perf_counter()
+            logger.info(f"answering machine detection: {verdict} ({detector.confidence():.2f}) after {detector.elapsed:.1f}s")
+            if verdict == "machine":
+                if greeting is not None:
+                    greeting.cancel()
+                await finish_call("voicemail", script_version=agent.script_version)
+                if amd_action == "message":
+                    # wait for the beep (or a few more seconds) so the message is recorded
+                    detector.window = detector.elapsed + 10
+                    await listen_for_answering_machine(session, participant, detector, lambda d: d.beep)
+                    await session.say(
+                        VOICEMAIL_MESSAGE.format(customer_name=customer_name), allow_interruptions=False
+                    ).wait_for_playout()
+                # end the call but leave the room, so the campaign runner still reads the voicemail
+                # status on its next poll; it deletes the rooms of calls that did not complete.
+                # The watchdog would take the caller leaving as a hang-up and delete the room.
+                await watchdog.stop()
+                await ctx.api.room.remove_participant(
+                    api.RoomParticipantIdentity(room=ctx.room.name, identity=participant.identity)
+                )
+                ctx.shutdown(reason="voicemail")
+                return
+            agent.screening = False
+
+        # armed only now, so a voicemail message is never measured as a greeting
+        voice_metrics.track_first_audio(session, picked_up, on_measured=on_first_audio)
         logger.info("Starting conversation with initial greeting")
         try:
-            await session.generate_reply(
-                instructions="Introduce yourself with this greeting: 'Hi, I'm Alex from the Bank of America'. Then, ask if you are speaking with {customer_name} to verify their identity before proceeding."
-            )
+            handle = await greeting.play(session) if greeting is not None else None
+            if handle is None:
+                await session.generate_reply(
+                    instructions=FALLBACK_GREETING_INSTRUCTIONS.format(customer_name=customer_name)
+                )
+            else:
+                await handle
+                # the prepared question was not ready in time: ask it the usual way
+                if not greeting.personalized and not handle.interrupted:
+                    await session.generate_reply(instructions=VERIFY_INSTRUCTIONS.format(customer_name=customer_name))
             logger.info("Initial greeting sent successfully")
         except Exception as e:
             logger.error(f"Error sending initial greeting: {e}")
         
 
-        # this keeps the conversation alive
-        try:
-            await session.wait_for_completion()
-        except Exception as e:
-            logger.error(f"Session error: {e}")
-
-        # Monitor for call disconnect and timeout (background task)
-        call_start_time = asyncio.get_event_loop().time()
-        
-        async def monitor_call():
-            """Monitor call for disconnects and timeouts"""
-            max_call_duration = 300
-        
-        monitor_task = asyncio.create_task(monitor_call())
-
     except api.TwirpError as e:
         logger.error(
             f"error creating SIP participant: {e.message}, "
@@ -372,16 +610,27 @@ async def entrypoint(ctx: JobContext):
             f"{e.metadata.get('sip_status')}"
         )
         logger.error(f"Full error details: {e}")
+        # busy / no-answer statuses let the campaign runner queue a retry
+        await finish_call(
+            "sip_error",
+            sip_status_code=e.metadata.get("sip_status_code"),
+            sip_status=e.metadata.get("sip_status"),
+        )
         ctx.shutdown()
     except Exception as e:
         logger.error(f"Unexpected error creating SIP participant: {e}")
         logger.error(f"Error type: {type(e)}")
+        if watchdog is not None:
+            # keep the room (and the failed status) for the campaign runner to read
+            await watchdog.stop()
+        await finish_call("failed")
         ctx.shutdown()
 
 if __name__ == "__main__":
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
             agent_name="vasooli-man",
         )
     )
\ No newline at end of file
@@ -0,0 +1,253 @@
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import wave
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# phrases that practically only occur in voicemail greetings
+MACHINE_PATTERN = re.compile(
+    r"leave (me |us )?(a |your )?(message|name|number)|after the (tone|beep)|not available|"
+    r"can'?t (come to|take|get to) the phone|voice ?(mail|message)|mailbox|record your message|"
+    r"you have reached|you'?ve reached|at the tone|press pound|get back to you|sorry (we|i) missed you",
+    re.I,
+)
+# short openers a person answering the phone says
+HUMAN_PATTERN = re.compile(r"^\s*(hello|hi|hey|yeah|yes|speaking|who is (this|it)|who'?s calling)\b[\s?!.,]*", re.I)
+
+# log-odds evidence per feature; with no evidence the confidence is 0.5, i.e. undecided.
+# Cadence alone (a long first utterance, many words) stays below the default threshold:
+# long human greetings and background noise look the same, so only a greeting phrase or
+# a beep can make the call a machine (see `decision()`)
+WEIGHTS = {
+    "bias": 0.0,
+    "machine_phrase": 3.0,
+    "beep": 5.0,
+    "long_first_utterance": 0.8,
+    "many_words": 0.5,
+    "short_greeting": -2.5,
+    "pause_after_greeting": -1.5,
+}
+
+FRAME_MS = 20
+# frame energy (dBFS) above which a frame counts as speech
+SPEECH_DBFS = -40.0
+# gaps between words shorter than this do not end a speech segment
+MIN_PAUSE_MS = 300
+# tones: one FFT bin holding this share of the frame's energy, for at least BEEP_MS
+TONE_PEAK_RATIO = 0.5
+BEEP_MS = 160
+BEEP_BAND_HZ = (300, 3000)
+
+
+class AnsweringMachineDetector:
+    """Classifies the first seconds of an answered call as a person or a voicemail greeting.
+
+    Combines transcript phrases, speech cadence (a person says a short "hello?" and waits;
+    a greeting talks for several seconds straight) and voicemail beeps into a confidence
+    that the line is a machine. `decision()` returns "machine" or "human" as soon as the
+    confidence clears `threshold` (or its mirror), and a final verdict after `window` seconds.
+    """
+
+    def __init__(self, threshold: float = 0.85, window: float = 4.0, pause_after_greeting: float = 0.8):
+        self.threshold = threshold
+        self.window = window
+        self.pause_after_greeting = pause_after_greeting
+        self.elapsed = 0.0
+        self.transcript = ""
+        # (start, end) of speech segments in seconds from the start of the call
+        self.segments = []
+        self.beep = False
+        self._segment_start = None
+        self._silent_frames = 0
+        self._tone_frames = 0
+        self._tone_freq = None
+        self._pending = np.zeros(0, dtype=np.float32)
+
+    def feed_audio(self, samples: np.ndarray, sample_rate: int):
+        """Adds mono int16 (or float in [-1, 1]) samples; audio after `window` is ignored."""
+        if self.elapsed >= self.window:
+            return
+        if samples.dtype == np.int16:
+            samples = samples.astype(np.float32) / 32768.0
+        samples = np.concatenate([self._pending, samples.astype(np.float32, copy=False)])
+        frame_len = sample_rate * FRAME_MS // 1000
+        count = len(samples) // frame_len
+        self._pending = samples[count * frame_len:]
+        if count == 0:
+            return
+
+        frames = samples[:count * frame_len].reshape(count, frame_len)
+        dbfs = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+        spectra = np.abs(np.fft.rfft(frames * np.hanning(frame_len), axis=1)) ** 2
+        peaks = spectra.argmax(axis=1)
+        peak_ratio = spectra.max(axis=1) / (spectra.sum(axis=1) + 1e-12)
+        peak_hz = peaks * sample_rate / frame_len
+        for speech, ratio, hz in zip(dbfs > SPEECH_DBFS, peak_ratio, peak_hz):
+            self._track_speech(bool(speech))
+            self._track_tone(bool(speech) and ratio > TONE_PEAK_RATIO and BEEP_BAND_HZ[0] <= hz <= BEEP_BAND_HZ[1], hz)
+            self.elapsed += FRAME_MS / 1000
+
+    def feed_transcript(self, text: str):
+        self.transcript = f"{self.transcript} {text}".strip()
+
+    def advance(self, seconds: float):
+        """Moves the clock forward without audio (transcript-only detection)."""
+        self._track_speech(False, seconds)
+        self.elapsed += seconds
+
+    def _track_speech(self, speech: bool, frame_seconds: float = FRAME_MS / 1000):
+        if speech:
+            self._silent_frames = 0
+            if self._segment_start is None:
+                self._segment_start = self.elapsed
+            return
+        self._silent_frames += 1
+        if self._segment_start is not None and self._silent_frames * frame_seconds * 1000 >= MIN_PAUSE_MS:
+            # the segment ended where the silence began
+            self.segments.append((self._segment_start, self.elapsed - (self._silent_frames - 1) * frame_seconds))
+            self._segment_start = None
+
+    def _track_tone(self, tone: bool, hz: float):
+        # a beep is one steady frequency; speech harmonics wander from frame to frame
+        if tone and (self._tone_freq is None or abs(hz - self._tone_freq) <= 60):
+            self._tone_frames += 1
+            self._tone_freq = hz if self._tone_freq is None else self._tone_freq
+        else:
+            self._tone_frames, self._tone_freq = (1, hz) if tone else (0, None)
+        if self._tone_frames * FRAME_MS >= BEEP_MS:
+            self.beep = True
+
+    def features(self) -> dict:
+        segments = list(self.segments)
+        if self._segment_start is not None:
+            segments.append((self._segment_start, self.elapsed))
+        first = segments[0][1] - segments[0][0] if segments else 0.0
+        words = len(self.transcript.split())
+        silence_after_first = (
+            (segments[1][0] if len(segments) > 1 else self.elapsed) - segments[0][1]
+            if segments and (len(segments) > 1 or self._segment_start is None) else 0.0
+        )
+        short_greeting = bool(HUMAN_PATTERN.fullmatch(self.transcript)) or (0 < words <= 3 and not MACHINE_PATTERN.search(self.transcript))
+        return {
+            "machine_phrase": bool(MACHINE_PATTERN.search(self.transcript)),
+            "beep": self.beep,
+            "long_first_utterance": first >= 2.5,
+            "many_words": words >= 10,
+            "short_greeting": short_greeting,
+            "pause_after_greeting": 0 < first < 1.5 and silence_after_first >= self.pause_after_greeting,
+        }
+
+    def confidence(self, features: dict | None = None) -> float:
+        """Probability-like confidence that the line is an answering machine."""
+        features = self.features() if features is None else features
+        logit = WEIGHTS["bias"] + sum(WEIGHTS[name] for name, on in features.items() if on)
+        return 1 / (1 + math.exp(-logit))
+
+    def decision(self) -> str | None:
+        features = self.features()
+        confidence = self.confidence(features)
+        # hanging up on a person is worse than talking to a machine: cadence only adds to the evidence
+        if confidence >= self.threshold and (features["machine_phrase"] or features["beep"]):
+            return "machine"
+        if confidence <= 1 - self.threshold:
+            return "human"
+        if self.elapsed >= self.window:
+            # undecided at the end of the window: let the agent talk, it can still hang up on a greeting
+            return "human"
+        return None
+
+
+def read_wav(path: str) -> tuple[np.ndarray, int]:
+    """Mono int16 samples and sample rate of a 16-bit PCM WAV file (channels are averaged)."""
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM is supported")
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+        if f.getnchannels() > 1:
+            samples = samples.reshape(-1, f.getnchannels()).mean(axis=1).astype(np.int16)
+        return samples, f.getframerate()
+
+
+def classify_fixture(fixture: dict, base_dir: str, threshold: float, window: float) -> tuple[str, float, float]:
+    """Replays one fixture through a detector; returns (decision, confidence, seconds to decide)."""
+    detector = AnsweringMachineDetector(threshold=threshold, window=window)
+    # transcript segments arrive at their timestamps: [[seconds, text], ...] or one string at 1s
+    transcript = fixture.get("transcript") or []
+    if isinstance(transcript, str):
+        transcript = [[1.0, transcript]]
+    transcript = sorted(transcript)
+
+    samples, sample_rate = (None, None)
+    if fixture.get("audio"):
+        samples, sample_rate = read_wav(os.path.join(base_dir, fixture["audio"]))
+    step = 0.1
+    while detector.elapsed < window:
+        while transcript and transcript[0][0] <= detector.elapsed:
+            detector.feed_transcript(transcript.pop(0)[1])
+        if samples is not None:
+            start = int(detector.elapsed * sample_rate)
+            chunk = samples[start:start + int(step * sample_rate)]
+            if len(chunk) == 0:
+                detector.advance(step)
+            else:
+                detector.feed_audio(chunk, sample_rate)
+        else:
+            detector.advance(step)
+        decision = detector.decision()
+        if decision is not None:
+            return decision, detector.confidence(), detector.elapsed
+    return detector.decision() or "human", detector.confidence(), detector.elapsed
+
+
+def evaluate(fixtures_path: str, thresholds: list, window: float = 4.0) -> list:
+    """Precision/recall of the machine class and mean decision time per threshold.
+
+    Fixtures are JSONL lines like `{"label": "machine", "transcript": [[0.4, "Hi, you've
+    reached..."]], "audio": "vm_01.wav"}`; audio paths are relative to the fixtures file.
+    """
+    base_dir = os.path.dirname(os.path.abspath(fixtures_path))
+    with open(fixtures_path, "r") as f:
+        fixtures = [json.loads(line) for line in f if line.strip()]
+
+    report = []
+    for threshold in thresholds:
+        tp = fp = fn = tn = 0
+        decision_times = []
+        for fixture in fixtures:
+            decision, _, seconds = classify_fixture(fixture, base_dir, threshold, window)
+            decision_times.append(seconds)
+            machine = fixture["label"] == "machine"
+            if decision == "machine":
+                tp, fp = tp + machine, fp + (not machine)
+            else:
+                fn, tn = fn + machine, tn + (not machine)
+        report.append({
+            "threshold": threshold,
+            "precision": tp / (tp + fp) if tp + fp else None,
+            "recall": tp / (tp + fn) if tp + fn else None,
+            "accuracy": (tp + tn) / len(fixtures),
+            "humans_hung_up_on": fp,
+            "mean_decision_seconds": round(float(np.mean(decision_times)), 2),
+        })
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate the answering machine detector on recorded fixtures.")
+    parser.add_argument("fixtures", help="JSONL file of labelled fixtures")
+    parser.add_argument("--threshold", type=float, action="append", default=[],
+                        help="confidence threshold(s) to evaluate, repeatable (default: a sweep)")
+    parser.add_argument("--window", type=float, default=4.0, help="seconds of the call the detector may listen to")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for row in evaluate(args.fixtures, args.threshold or [0.8, 0.85, 0.9], args.window):
+        print(json.dumps(row))
@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import aiohttp
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class BackendError(RuntimeError):
+    """The payments/scheduling backend rejected a request or could not be reached."""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+def idempotency_key(account_number: str, call_id: str, operation: str, payload: dict) -> str:
+    """Same account, call, operation and arguments -> same key, so a retried or repeated
+    tool call is applied once by the backend."""
+    raw = json.dumps([account_number, call_id, operation, payload], sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+class BackendClient:
+    """Async client for the payments and scheduling backend used by the agent's tools.
+
+    One instance per worker process: its connection pool is shared by every call the
+    process handles. Requests time out after `timeout` seconds and are retried with
+    jittered backoff on connection errors, timeouts and 408/429/5xx responses; every
+    write carries an `Idempotency-Key` header, so retries are safe.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str | None = None,
+        timeout: float = 5.0,
+        max_retries: int = 2,
+        base_delay: float = 0.2,
+        pool_size: int = 100,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.pool_size = pool_size
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # created on first use, inside the event loop that runs the jobs
+        if self._session is None or self._session.closed:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=headers,
+            )
+        return self._session
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def _post(self, path: str, payload: dict, key: str) -> dict:
+        session = self._get_session()
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with session.post(
+                    f"{self.base_url}{path}", json=payload, headers={"Idempotency-Key": key}
+                ) as response:
+                    if response.status < 400:
+                        return await response.json()
+                    body = await response.text()
+                    if response.status not in RETRYABLE_STATUS_CODES:
+                        raise BackendError(f"{path} failed with {response.status}: {body}", response.status)
+                    error = BackendError(f"{path} failed with {response.status}", response.status)
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = BackendError(f"{path} unreachable: {e!r}")
+            if attempt == self.max_retries:
+                raise error
+            delay = random.uniform(0, self.base_delay * 2 ** attempt)
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            logging.warning(f"{error}; retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+    async def _call(self, path: str, account_number: str, call_id: str, **payload) -> dict:
+        key = idempotency_key(account_number, call_id, path, payload)
+        return await self._post(path, {"account_number": account_number, "call_id": call_id, **payload}, key)
+
+    async def setup_payment_plan(self, account_number: str, call_id: str, monthly_amount: str, duration_months: str) -> dict:
+        return await self._call(
+            "/payment-plans", account_number, call_id,
+            monthly_amount=monthly_amount, duration_months=duration_months,
+        )
+
+    async def process_payment(self, account_number: str, call_id: str, amount: str, payment_method: str) -> dict:
+        return await self._call("/payments", account_number, call_id, amount=amount, payment_method=payment_method)
+
+    async def schedule_callback(self, account_number: str, call_id: str, callback_date: str, callback_time: str) -> dict:
+        return await self._call(
+            "/callbacks", account_number, call_id,
+            callback_date=callback_date, callback_time=callback_time,
+        )
+
+    async def log_dispute(self, account_number: str, call_id: str, dispute_reason: str) -> dict:
+        return await self._call("/disputes", account_number, call_id, dispute_reason=dispute_reason)
+
+
+async def with_filler(session, work, filler: str, delay: float = 1.0, audio=None):
+    """Awaits `work`; if it takes longer than `delay` seconds, says `filler` meanwhile so the
+    caller does not sit in dead air. The filler is kept out of the chat context.
+    `audio` is a callable returning pre-synthesized audio frames of the filler, if there are any."""
+    task = asyncio.ensure_future(work)
+    done, _ = await asyncio.wait({task}, timeout=delay)
+    if not done:
+        if audio is not None:
+            session.say(filler, audio=audio(), add_to_chat_ctx=False)
+        else:
+            session.say(filler, add_to_chat_ctx=False)
+    return await task
@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import logging
+import random
+import uuid
+from aiohttp import web
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class StubBackend:
+    """Local HTTP stand-in for the payments and scheduling backend.
+
+    Answers after a random latency, fails a share of requests with 503, and replays the
+    stored response for a repeated `Idempotency-Key`, like the real backend.
+    """
+
+    def __init__(self, latency: tuple = (0.05, 0.3), failure_rate: float = 0.0, seed: int | None = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        # idempotency key -> stored response
+        self.responses = {}
+        # requests received, retries included
+        self.requests = 0
+        self.app = web.Application()
+        self.app.add_routes([
+            web.post("/payment-plans", self._handler(self._payment_plan)),
+            web.post("/payments", self._handler(self._payment)),
+            web.post("/callbacks", self._handler(self._callback)),
+            web.post("/disputes", self._handler(self._dispute)),
+        ])
+        self._runner = None
+
+    def _handler(self, build):
+        async def handle(request: web.Request) -> web.Response:
+            self.requests += 1
+            body = await request.json()
+            await asyncio.sleep(self.rng.uniform(*self.latency))
+            if self.rng.random() < self.failure_rate:
+                return web.json_response({"error": "unavailable"}, status=503)
+            key = request.headers.get("Idempotency-Key")
+            if not key:
+                return web.json_response({"error": "missing Idempotency-Key"}, status=400)
+            if key not in self.responses:
+                self.responses[key] = build(body)
+            return web.json_response(self.responses[key])
+        return handle
+
+    @staticmethod
+    def _payment_plan(body: dict) -> dict:
+        return {
+            "status": "approved",
+            "plan_id": f"PLAN{uuid.uuid4().hex[:10].upper()}",
+            "message": f"Payment plan approved: ${body['monthly_amount']} per month for {body['duration_months']} months",
+        }
+
+    @staticmethod
+    def _payment(body: dict) -> dict:
+        return {
+            "status": "success",
+            "payment_id": f"PAY{uuid.uuid4().hex[:10].upper()}",
+            "message": f"Payment of ${body['amount']} processed successfully via {body['payment_method']}",
+        }
+
+    @staticmethod
+    def _callback(body: dict) -> dict:
+        return {
+            "status": "scheduled",
+            "callback_id": f"CB{uuid.uuid4().hex[:10].upper()}",
+            "message": f"Callback scheduled for {body['callback_date']} at {body['callback_time']}",
+        }
+
+    @staticmethod
+    def _dispute(body: dict) -> dict:
+        return {
+            "status": "disputed",
+            "dispute_id": f"DISP{uuid.uuid4().hex[:10].upper()}",
+            "message": "Dispute logged. Account will be reviewed within 3-5 business days",
+        }
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Starts serving and returns the base URL (port 0 picks a free port)."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the local payments/scheduling backend stand-in.")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--min-latency", type=float, default=0.05)
+    parser.add_argument("--max-latency", type=float, default=0.3)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests answered with 503")
+    return parser.parse_args()
+
+
+async def main(args):
+    stub = StubBackend((args.min_latency, args.max_latency), args.failure_rate)
+    url = await stub.start(port=args.port)
+    logging.info(f"stub backend listening on {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
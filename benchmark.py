@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import run_mini_pipeline
+from chat_simulator import ChatSimulator
+from context_strategy import count_tokens
+from llm_client import LLMClient
+from mock_openai import MockOpenAI
+from personality_generator import PersonalityGenerator
+from scheduler import RateLimiter, SimulationScheduler
+from script_optimizer import ScriptOptimizer
+from script_registry import ScriptRegistry
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_BASELINE_PATH = "benchmark_baseline.json"
+BENCHMARKS = ("personas", "simulate", "optimize", "pipeline")
+
+# settings a baseline was recorded with
+CONFIG_KEYS = ("size", "max_turns", "latency", "jitter", "error_rate", "reply_words", "seed")
+
+# metric -> (which direction is better, allowed relative change before it counts as a regression)
+REGRESSION_CHECKS = {
+    "wall_seconds": ("lower", 0.25),
+    "simulations_per_minute": ("higher", 0.25),
+    "calls_per_simulation": ("lower", 0.05),
+    "tokens_per_simulation": ("lower", 0.05),
+    "peak_memory_mb": ("lower", 0.25),
+}
+
+
+def make_llm(base_url: str) -> LLMClient:
+    # limits far above what the mock serves, so only its latency and injected errors shape the run
+    rate_limiter = RateLimiter(requests_per_minute=100_000, tokens_per_minute=100_000_000, base_delay=0.05)
+    return LLMClient(api_key="benchmark", rate_limiter=rate_limiter, base_url=base_url)
+
+
+async def bench_personas(base_url: str, size: int, max_turns: int, seed: int) -> int:
+    generator = PersonalityGenerator(api_key="benchmark", llm=make_llm(base_url))
+    await generator.generate_many(size)
+    return 0
+
+
+async def bench_simulate(base_url: str, size: int, max_turns: int, seed: int) -> int:
+    llm = make_llm(base_url)
+    personalities = await PersonalityGenerator(api_key="benchmark", llm=llm).generate_many(size)
+    chat_sim = ChatSimulator(api_key="benchmark", llm=llm)
+    script = ScriptRegistry().active().source
+    logs = await SimulationScheduler(max_concurrency=8, progress_every=size).run([
+        lambda p=p: chat_sim.simulate(script, p, max_turns=max_turns) for p in personalities
+    ])
+    return sum(log is not None for log in logs)
+
+
+async def bench_optimize(base_url: str, size: int, max_turns: int, seed: int) -> int:
+    # fixed transcripts, so this measures the single-prompt optimization call alone
+    logs = [
+        [
+            {"role": "user" if turn % 2 == 0 else "assistant", "content": f"Turn {turn} of conversation {i}."}
+            for turn in range(2 * max_turns + 1)
+        ]
+        for i in range(size)
+    ]
+    optimizer = ScriptOptimizer(api_key="benchmark", llm=make_llm(base_url))
+    await optimizer.optimize(ScriptRegistry().active().source, logs)
+    return 0
+
+
+async def bench_pipeline(base_url: str, size: int, max_turns: int, seed: int) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        args = run_mini_pipeline.parse_args([
+            "--num-simulations", str(size),
+            "--max-turns", str(max_turns),
+            "--max-concurrency", "8",
+            "--rpm", "100000",
+            "--tpm", "100000000",
+            "--cache-mode", "off",
+            "--persona-pool", os.path.join(tmp, "personas.jsonl"),
+            "--score-cache", os.path.join(tmp, "scores.jsonl"),
+            "--run-dir", os.path.join(tmp, "run"),
+            "--seed", str(seed),
+            "--base-url", base_url,
+        ])
+        # the pipeline prints its results; keep them out of the benchmark report
+        with contextlib.redirect_stdout(io.StringIO()):
+            await run_mini_pipeline.main(args)
+    return size
+
+
+BENCHMARK_FUNCTIONS = {
+    "personas": bench_personas,
+    "simulate": bench_simulate,
+    "optimize": bench_optimize,
+    "pipeline": bench_pipeline,
+}
+
+
+async def run_benchmark(name: str, args) -> dict:
+    """Runs one benchmark against a fresh mock server and returns its metrics."""
+    mock = MockOpenAI(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        reply_words=args.reply_words, seed=args.seed,
+    )
+    base_url = await mock.start()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        simulations = await BENCHMARK_FUNCTIONS[name](base_url, args.size, args.max_turns, args.seed)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await mock.stop()
+
+    tokens = mock.prompt_tokens + mock.completion_tokens
+    result = {
+        "wall_seconds": round(elapsed, 3),
+        "api_calls": mock.requests,
+        "injected_errors": mock.errors,
+        "prompt_tokens": mock.prompt_tokens,
+        "completion_tokens": mock.completion_tokens,
+        "peak_memory_mb": round(peak / 2**20, 2),
+    }
+    if simulations:
+        result.update({
+            "simulations": simulations,
+            "simulations_per_minute": round(simulations / elapsed * 60, 1),
+            "calls_per_simulation": round(mock.requests / simulations, 2),
+            "tokens_per_simulation": round(tokens / simulations, 1),
+        })
+    return result
+
+
+def find_regressions(results: dict, baseline: dict, tolerance_scale: float = 1.0) -> list:
+    """Human-readable regressions of `results` against the stored baseline."""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, (better, tolerance) in REGRESSION_CHECKS.items():
+            old, new = baseline.get(name, {}).get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > 0 if better == "lower" else change < 0
+            if worse and abs(change) > tolerance * tolerance_scale:
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change:+.0%}, allowed {tolerance * tolerance_scale:.0%})")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a local mock OpenAI server.")
+    parser.add_argument("benchmarks", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--size", type=int, default=20, help="personas / simulations per benchmark")
+    parser.add_argument("--max-turns", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="mock seconds per reply")
+    parser.add_argument("--jitter", type=float, default=0.05, help="mock random extra latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of mock requests failed with 429/500")
+    parser.add_argument("--reply-words", type=int, default=20, help="words per mock text reply")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="JSON file of stored results")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance-scale", type=float, default=1.0, help="multiply every allowed regression by this")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    args.benchmarks = args.benchmarks or list(BENCHMARKS)
+    return args
+
+
+async def warm_up():
+    """One untimed request, so lazy imports in the HTTP stack and the tokenizer vocabulary are not
+    billed to the first benchmark."""
+    count_tokens([{"role": "user", "content": "hi"}])
+    mock = MockOpenAI(latency=0, jitter=0)
+    base_url = await mock.start()
+    await make_llm(base_url).chat(model="gpt-4o-mini", messages=[{"role": "user", "content": "hi"}])
+    await mock.stop()
+
+
+async def main(args) -> int:
+    # per-request logs of the components would drown the report
+    logging.getLogger().setLevel(logging.WARNING)
+    await warm_up()
+    results = {}
+    for name in args.benchmarks:
+        results[name] = await run_benchmark(name, args)
+        print(json.dumps({name: results[name]}))
+
+    # results are only comparable under the same mock and size settings
+    config = {key: getattr(args, key) for key in CONFIG_KEYS}
+    stored = {"config": config, "results": {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            stored = json.load(f)
+    if args.update_baseline:
+        kept = stored["results"] if stored["config"] == config else {}
+        with open(args.baseline, "w") as f:
+            json.dump({"config": config, "results": {**kept, **results}}, f, indent=4)
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    baseline = stored["results"]
+    if stored["config"] != config:
+        print(f"settings differ from the baseline ({stored['config']}); not comparing")
+        return 0
+    regressions = find_regressions(results, baseline, args.tolerance_scale)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not baseline:
+        print(f"no baseline at {args.baseline}; run with --update-baseline to store one")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+from livekit import rtc
+from livekit.agents import AgentSession, AgentStateChangedEvent, UserStateChangedEvent
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class CallWatchdog:
+    """Ends a call that runs too long, goes silent on both sides, or loses its caller.
+
+    Started as soon as the SIP participant exists. When a limit trips, `hangup` is awaited
+    for at most `teardown_timeout` seconds and `shutdown` is called either way, so the
+    job, SIP channel and STT/TTS streams are released within a bounded time.
+    """
+
+    def __init__(
+        self,
+        session: AgentSession,
+        room: rtc.Room,
+        participant_identity: str,
+        hangup: Callable[[], Awaitable],
+        shutdown: Callable[[str], None],
+        max_duration: float = 300,
+        max_silence: float = 30,
+        teardown_timeout: float = 10,
+        check_interval: float = 1.0,
+    ):
+        self.session = session
+        self.room = room
+        self.participant_identity = participant_identity
+        self.hangup = hangup
+        self.shutdown = shutdown
+        self.max_duration = max_duration
+        self.max_silence = max_silence
+        self.teardown_timeout = teardown_timeout
+        self.check_interval = check_interval
+        self.reason = None
+        self._started_at = None
+        self._last_activity = None
+        self._user_speaking = False
+        self._agent_busy = False
+        self._task = None
+
+    def start(self):
+        self._started_at = self._last_activity = time.monotonic()
+        self.session.on("user_state_changed", self._on_user_state)
+        self.session.on("agent_state_changed", self._on_agent_state)
+        self.room.on("participant_disconnected", self._on_participant_disconnected)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.session.off("user_state_changed", self._on_user_state)
+        self.session.off("agent_state_changed", self._on_agent_state)
+        self.room.off("participant_disconnected", self._on_participant_disconnected)
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    def _on_user_state(self, event: UserStateChangedEvent):
+        self._user_speaking = event.new_state == "speaking"
+        self._last_activity = time.monotonic()
+
+    def _on_agent_state(self, event: AgentStateChangedEvent):
+        # thinking counts as activity: a slow tool or LLM call is not a silent line
+        self._agent_busy = event.new_state in ("thinking", "speaking")
+        self._last_activity = time.monotonic()
+
+    def _on_participant_disconnected(self, participant: rtc.RemoteParticipant):
+        if participant.identity == self.participant_identity and self.reason is None:
+            self.reason = "participant_disconnected"
+            self._task.cancel()
+            asyncio.create_task(self._teardown())
+
+    async def _run(self):
+        while self.reason is None:
+            await asyncio.sleep(self.check_interval)
+            now = time.monotonic()
+            if now - self._started_at > self.max_duration:
+                self.reason = "max_duration"
+            elif not (self._user_speaking or self._agent_busy) and now - self._last_activity > self.max_silence:
+                self.reason = "silence"
+        await self._teardown()
+
+    async def _teardown(self):
+        logging.info(
+            f"watchdog ending call with {self.participant_identity}: {self.reason} "
+            f"after {time.monotonic() - self._started_at:.0f}s"
+        )
+        try:
+            # deleting the room drops the SIP leg even if the caller already left
+            await asyncio.wait_for(self.hangup(), self.teardown_timeout)
+        except Exception as e:
+            logging.warning(f"watchdog hangup failed ({self.reason}): {e!r}")
+        finally:
+            await self.stop()
+            self.shutdown(self.reason)
@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import csv
+import heapq
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Iterable, Iterator
+from dotenv import load_dotenv
+from livekit import api
+from scheduler import TokenBucket
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+load_dotenv(".env.local")
+
+# SIP status codes the agent reports back that are worth another attempt later
+SIP_RETRY_STATUSES = {
+    "486": "busy",
+    "600": "busy",
+    "408": "no_answer",
+    "480": "no_answer",
+    "487": "no_answer",
+}
+RETRYABLE_STATUSES = {"busy", "no_answer", "timeout", "voicemail"}
+TERMINAL_STATUSES = {"completed", "failed", "exhausted", "unknown"}
+
+
+def read_accounts(path: str) -> Iterator[dict]:
+    """Streams accounts from a CSV or JSONL file without loading it into memory."""
+    with open(path, "r", newline="") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def account_id(account: dict) -> str:
+    return str(account.get("account_number") or account["phone_number"])
+
+
+class CampaignProgress:
+    """Append-only JSONL log of call attempts, so an interrupted campaign can be resumed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # account id -> latest {"status", "attempt", ...}
+        self.latest = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.latest[event["account_id"]] = event
+        self._file = open(path, "a")
+
+    def record(self, account: dict, status: str, attempt: int, **details):
+        event = {"account_id": account_id(account), "status": status, "attempt": attempt, "ts": time.time(), **details}
+        self.latest[event["account_id"]] = event
+        self._file.write(json.dumps(event) + "\n")
+        self._file.flush()
+
+    def resume_state(self, account: dict) -> tuple[str | None, int]:
+        """Latest status and attempt count of an account. A call that was dispatched but never
+        reported back is returned as `unknown` rather than redialed, to avoid calling someone twice."""
+        event = self.latest.get(account_id(account))
+        if event is None:
+            return None, 0
+        if event["status"] == "dispatched":
+            return "unknown", event["attempt"]
+        return event["status"], event["attempt"]
+
+    def close(self):
+        self._file.close()
+
+
+class LiveKitDispatcher:
+    """Creates one room per call and dispatches the agent into it with the account as job metadata.
+
+    The agent reports the call status in the room metadata (see `report_call_status` in
+    agent.py); a room that disappears after the call was answered has completed.
+    """
+
+    def __init__(self, lkapi, agent_name: str = "vasooli-man", empty_timeout: int = 120):
+        self.lkapi = lkapi
+        self.agent_name = agent_name
+        self.empty_timeout = empty_timeout
+
+    async def dispatch(self, room_name: str, metadata: dict):
+        await self.lkapi.room.create_room(api.CreateRoomRequest(name=room_name, empty_timeout=self.empty_timeout))
+        await self.lkapi.agent_dispatch.create_dispatch(
+            api.CreateAgentDispatchRequest(
+                agent_name=self.agent_name,
+                room=room_name,
+                metadata=json.dumps(metadata),
+            )
+        )
+
+    async def statuses(self, room_names: list) -> dict:
+        """Reported status metadata per room; rooms that no longer exist map to None."""
+        found = {}
+        for start in range(0, len(room_names), 100):
+            batch = room_names[start:start + 100]
+            response = await self.lkapi.room.list_rooms(api.ListRoomsRequest(names=batch))
+            for room in response.rooms:
+                try:
+                    found[room.name] = json.loads(room.metadata) if room.metadata else {}
+                except json.JSONDecodeError:
+                    found[room.name] = {}
+        return {name: found.get(name) for name in room_names}
+
+    async def cleanup(self, room_name: str):
+        try:
+            await self.lkapi.room.delete_room(api.DeleteRoomRequest(room=room_name))
+        except api.TwirpError:
+            pass
+
+
+class CampaignRunner:
+    """Dials a stream of accounts through the agent with per-trunk caps, pacing and retries."""
+
+    def __init__(
+        self,
+        dispatcher: LiveKitDispatcher,
+        progress: CampaignProgress,
+        trunks: dict,
+        calls_per_second: float = 1.0,
+        max_attempts: int = 3,
+        retry_delay: float = 1800,
+        poll_interval: float = 2.0,
+        answer_timeout: float = 90,
+        campaign: str = "default",
+    ):
+        self.dispatcher = dispatcher
+        self.progress = progress
+        self.trunks = trunks
+        self.pacer = TokenBucket(calls_per_second * 60, capacity=max(1.0, calls_per_second))
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.answer_timeout = answer_timeout
+        # passed to the agent, which keeps a synthesized-phrase audio cache per campaign
+        self.campaign = campaign
+        # outcome of every attempt, retried ones included
+        self.counts = {}
+        # room name -> (future resolved with the final status, dispatch time)
+        self._pending = {}
+        # room name -> last call status reported in the room, which decides the outcome once
+        # the agent hangs up and deletes the room between two polls
+        self._last_status = {}
+        # (due time, sequence, account, attempt)
+        self._retries = []
+        self._sequence = 0
+
+    async def run(self, accounts: Iterable[dict]):
+        """Dials every account that has not reached a terminal status yet and waits for all calls."""
+        # one free slot per allowed concurrent call on each trunk
+        slots = asyncio.Queue()
+        for trunk_id, limit in self.trunks.items():
+            for _ in range(limit):
+                slots.put_nowait(trunk_id)
+
+        poller = asyncio.create_task(self._poll())
+        calls = set()
+
+        async def _start(account: dict, attempt: int):
+            trunk_id = await slots.get()
+            await self.pacer.acquire(1)
+            task = asyncio.create_task(self._call(account, attempt, trunk_id, slots))
+            calls.add(task)
+            task.add_done_callback(calls.discard)
+
+        try:
+            for account in accounts:
+                await self._start_due_retries(_start)
+                status, attempt = self.progress.resume_state(account)
+                if status in TERMINAL_STATUSES:
+                    continue
+                if status in RETRYABLE_STATUSES:
+                    # resumed campaign: retry right away, the original delay has usually passed
+                    self._schedule_retry(account, attempt, delay=0)
+                    continue
+                await _start(account, attempt + 1)
+
+            # drain retries and in-flight calls
+            while self._retries or calls:
+                await self._start_due_retries(_start)
+                if calls:
+                    await asyncio.wait(set(calls), timeout=self.poll_interval)
+                else:
+                    await asyncio.sleep(min(self.poll_interval, max(0.0, self._retries[0][0] - time.monotonic())))
+        finally:
+            poller.cancel()
+        logging.info(f"campaign finished: {self.counts}")
+        return self.counts
+
+    async def _start_due_retries(self, start):
+        while self._retries and self._retries[0][0] <= time.monotonic():
+            _, _, account, attempt = heapq.heappop(self._retries)
+            await start(account, attempt + 1)
+
+    def _schedule_retry(self, account: dict, attempt: int, delay: float):
+        self._sequence += 1
+        heapq.heappush(self._retries, (time.monotonic() + delay, self._sequence, account, attempt))
+
+    async def _call(self, account: dict, attempt: int, trunk_id: str, slots: asyncio.Queue):
+        room_name = f"call-{account_id(account)}-{uuid.uuid4().hex[:8]}"
+        try:
+            self.progress.record(account, "dispatched", attempt, room=room_name, trunk=trunk_id)
+            outcome = asyncio.get_running_loop().create_future()
+            self._pending[room_name] = (outcome, time.monotonic())
+            try:
+                await self.dispatcher.dispatch(room_name, {**account, "sip_trunk_id": trunk_id, "campaign": self.campaign})
+                status, details = await outcome
+            except Exception as e:
+                logging.error(f"dispatch failed for {account_id(account)}: {e}")
+                status, details = "failed", {"error": str(e)}
+            finally:
+                self._pending.pop(room_name, None)
+                self._last_status.pop(room_name, None)
+        finally:
+            slots.put_nowait(trunk_id)
+
+        if status in RETRYABLE_STATUSES:
+            if attempt < self.max_attempts:
+                self._schedule_retry(account, attempt, self.retry_delay)
+            else:
+                status = "exhausted"
+        self.counts[status] = self.counts.get(status, 0) + 1
+        self.progress.record(account, status, attempt, room=room_name, **details)
+        if status != "completed":
+            await self.dispatcher.cleanup(room_name)
+
+    async def _poll(self):
+        """Resolves pending calls from the statuses reported in their rooms, one batched lookup per cycle."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._pending:
+                continue
+            try:
+                statuses = await self.dispatcher.statuses(list(self._pending))
+            except Exception as e:
+                logging.warning(f"failed to poll call statuses: {e}")
+                continue
+            now = time.monotonic()
+            for room_name, metadata in statuses.items():
+                entry = self._pending.get(room_name)
+                if entry is None or entry[0].done():
+                    continue
+                outcome, dispatched_at = entry
+                result = self._classify(room_name, metadata, now - dispatched_at)
+                if result is not None:
+                    outcome.set_result(result)
+
+    def _classify(self, room_name: str, metadata: dict | None, elapsed: float) -> tuple[str, dict] | None:
+        """Maps the room state to a final (status, details), or None while the call is still going."""
+        if metadata is None:
+            # the room is gone: the agent hung up after a conversation or a voicemail greeting,
+            # or the job never got going
+            last = self._last_status.get(room_name)
+            if last is None:
+                return "failed", {"error": "room closed before the call was answered"}
+            if last.get("call_status") == "voicemail":
+                return "voicemail", {"script_version": last.get("script_version")}
+            return "completed", {"script_version": last.get("script_version")}
+        status = metadata.get("call_status")
+        if status in ("answered", "voicemail"):
+            self._last_status[room_name] = metadata
+        if status == "answered":
+            return None
+        if status == "sip_error":
+            code = str(metadata.get("sip_status_code", ""))
+            return SIP_RETRY_STATUSES.get(code, "failed"), {"sip_status_code": code}
+        if status == "voicemail":
+            return "voicemail", {"script_version": metadata.get("script_version")}
+        if status in ("completed", "failed"):
+            return status, {"script_version": self._last_status.get(room_name, {}).get("script_version")}
+        # a call that is still ringing (or whose agent never reported) past the timeout gets no more time
+        if status in (None, "dialing") and elapsed > self.answer_timeout:
+            return "timeout", {}
+        return None
+
+
+def parse_trunks(values: list) -> dict:
+    """Parses `TRUNK_ID:MAX_CONCURRENT` arguments."""
+    trunks = {}
+    for value in values:
+        trunk_id, _, limit = value.partition(":")
+        trunks[trunk_id] = int(limit or 1)
+    return trunks
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Dial a campaign of accounts through the vasooli-man agent.")
+    parser.add_argument("accounts", help="CSV or JSONL file of accounts (same fields as the job metadata)")
+    parser.add_argument("--trunk", action="append", default=[],
+                        help="TRUNK_ID:MAX_CONCURRENT, repeatable (default: SIP_OUTBOUND_TRUNK_ID:1)")
+    parser.add_argument("--cps", type=float, default=1.0, help="calls started per second")
+    parser.add_argument("--max-attempts", type=int, default=3, help="attempts per account for busy/no-answer")
+    parser.add_argument("--retry-delay", type=float, default=1800, help="seconds before redialing busy/no-answer")
+    parser.add_argument("--progress", default="campaign_progress.jsonl", help="progress log used to resume")
+    parser.add_argument("--campaign", default=None,
+                        help="campaign name the agent caches greeting audio under (default: the accounts file name)")
+    parser.add_argument("--stub", action="store_true", help="run against the local LiveKit stand-in")
+    return parser.parse_args()
+
+
+async def main(args):
+    trunks = parse_trunks(args.trunk) or {os.getenv("SIP_OUTBOUND_TRUNK_ID"): 1}
+    if args.stub:
+        from livekit_stub import FakeLiveKitAPI
+        lkapi = FakeLiveKitAPI()
+    else:
+        lkapi = api.LiveKitAPI()
+
+    progress = CampaignProgress(args.progress)
+    runner = CampaignRunner(
+        LiveKitDispatcher(lkapi),
+        progress,
+        trunks,
+        calls_per_second=args.cps,
+        max_attempts=args.max_attempts,
+        retry_delay=args.retry_delay,
+        campaign=args.campaign or os.path.splitext(os.path.basename(args.accounts))[0],
+    )
+    try:
+        await runner.run(read_accounts(args.accounts))
+    finally:
+        progress.close()
+        await lkapi.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -1,63 +1,204 @@
-
+import asyncio
 import logging
 import json
-from openai import AsyncOpenAI
+from context_strategy import ContextStrategy, count_tokens
+from conversation_state import ConversationLog, ConversationState
+from llm_client import LLMClient
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class ChatSimulator:
-    def __init__(self, api_key: str):
-        self.client = AsyncOpenAI(api_key=api_key)
+    def __init__(self, api_key: str, llm: LLMClient | None = None, context_strategy: ContextStrategy | None = None):
+        self.llm = llm or LLMClient(api_key)
+        self.context_strategy = context_strategy or ContextStrategy()
+        # prompt tokens sent per side, counted locally before each call
+        self.token_usage = {"agent": 0, "persona": 0, "calls": 0}
+
+    async def simulate(self, agent_script: str, personality: str, max_turns: int = 7, max_extra_turns: int = 3):
+        """Simulates a chat conversation between the agent and a personality.
 
-    async def simulate(self, agent_script: str, personality: str, max_turns: int = 7):
-        """Simulates a chat conversation between the agent and a personality."""
+        The call ends early once the persona commits to a payment, disputes the debt,
+        asks not to be called, asks for a callback or hangs up, and runs up to
+        `max_extra_turns` past `max_turns` while a negotiation is still going on.
+        Returns a ConversationLog whose `outcome` describes how the call ended.
+        """
         logging.info(f"Starting chat simulation...")
-        
+        if self.llm.usage is not None:
+            # budgets are checked once per conversation, so a started one is never cut off half-way
+            self.llm.usage.check("agent_turn")
+            self.llm.usage.check("persona_turn")
+
         personality_data = json.loads(personality)
         conversation_log = []
-        
+        persona = personality_data.get('name')
+        # per-conversation state of the context strategy (e.g. the rolling summary)
+        context_state = {}
+
         # The first turn is the user's starting line
         user_message = personality_data.get('starting_line', 'Hello?')
         conversation_log.append({"role": "user", "content": user_message})
 
-        for _ in range(max_turns):
+        state = ConversationState(max_turns, max_extra_turns)
+        while not state.finished():
             # Agent's turn
-            agent_response = await self._get_agent_response(agent_script, conversation_log)
+            agent_response = await self._get_agent_response(agent_script, conversation_log, context_state, persona)
             conversation_log.append({"role": "assistant", "content": agent_response})
 
             # User's turn
-            user_response = await self._get_user_response(personality, conversation_log)
+            user_response = await self._get_user_response(personality, conversation_log, context_state, persona)
             conversation_log.append({"role": "user", "content": user_response})
+            state.observe(user_response)
 
-        logging.info("Chat simulation finished.")
-        return conversation_log
+        if state.needs_closing_turn():
+            # the agent confirms the next steps, as it would before hanging up
+            agent_response = await self._get_agent_response(agent_script, conversation_log, context_state, persona)
+            conversation_log.append({"role": "assistant", "content": agent_response})
 
-    async def _get_agent_response(self, agent_script: str, history: list) -> str:
-        """Gets the agent's response based on the conversation history."""
-        response = await self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": agent_script},
-                *history
-            ]
-        )
-        return response.choices[0].message.content
+        outcome = state.summary()
+        logging.info(f"Chat simulation finished: {outcome['outcome']} after {outcome['turns']} turns.")
+        return ConversationLog(conversation_log, outcome=outcome)
 
-    async def _get_user_response(self, personality: str, history: list) -> str:
-        """Gets the user's response based on their personality and the history."""
+    def context_report(self) -> dict:
+        """Prompt tokens spent under the current context strategy."""
+        report = {"strategy": self.context_strategy.name, **self.token_usage}
+        report["summary"] = getattr(self.context_strategy, "summary_prompt_tokens", 0)
+        report["total"] = report["agent"] + report["persona"] + report["summary"]
+        return report
+
+    async def simulate_lockstep(
+        self,
+        agent_script: str,
+        personalities: list,
+        max_turns: int = 7,
+        max_extra_turns: int = 3,
+        on_finished=None,
+    ) -> list:
+        """Simulates all conversations together, one turn at a time, through the Batch API.
+
+        Every round submits the agent replies of all unfinished conversations as one
+        batch job, then their persona replies as another, so the calls are billed at
+        batch prices and do not count against the interactive rate limits. Conversations
+        end exactly as in `simulate`. `on_finished(index, log)` is called as each one
+        ends. Returns the ConversationLogs in the order of `personalities`; a
+        conversation whose request the batch failed is dropped (None).
+        """
+        if self.llm.usage is not None:
+            self.llm.usage.check("agent_turn")
+            self.llm.usage.check("persona_turn")
+
+        count = len(personalities)
+        personas = [json.loads(personality).get("name") for personality in personalities]
+        histories = [
+            [{"role": "user", "content": json.loads(personality).get("starting_line", "Hello?")}]
+            for personality in personalities
+        ]
+        context_states = [{} for _ in personalities]
+        states = [ConversationState(max_turns, max_extra_turns) for _ in personalities]
+        results = [None] * count
+        ended = set()
+
+        def _finish(i: int, log):
+            ended.add(i)
+            results[i] = log
+            if on_finished is not None and log is not None:
+                on_finished(i, log)
+
+        # conversations waiting for the next agent turn, and ended ones waiting for the agent's closing turn
+        active = list(range(count))
+        closing = set()
+        round_index = 0
+        while active or closing:
+            round_index += 1
+            talking = active + sorted(closing)
+            messages = await asyncio.gather(*(
+                self._agent_messages(agent_script, histories[i], context_states[i]) for i in talking
+            ))
+            replies = await self.llm.chat_batch(
+                [{"model": "gpt-4o-mini", "messages": m} for m in messages],
+                stage="agent_turn",
+                personas=[personas[i] for i in talking],
+                check_budget=False,
+            )
+            for i, reply in zip(talking, replies):
+                if reply is None:
+                    _finish(i, None)
+                    continue
+                histories[i].append({"role": "assistant", "content": reply.choices[0].message.content})
+                if i in closing:
+                    _finish(i, ConversationLog(histories[i], outcome=states[i].summary()))
+            active = [i for i in active if i not in ended]
+            closing = set()
+            if not active:
+                break
+
+            messages = await asyncio.gather(*(
+                self._persona_messages(personalities[i], histories[i], context_states[i]) for i in active
+            ))
+            replies = await self.llm.chat_batch(
+                [{"model": "gpt-4o-mini", "messages": m} for m in messages],
+                stage="persona_turn",
+                personas=[personas[i] for i in active],
+                check_budget=False,
+            )
+            for i, reply in zip(active, replies):
+                if reply is None:
+                    _finish(i, None)
+                    continue
+                content = reply.choices[0].message.content
+                histories[i].append({"role": "user", "content": content})
+                states[i].observe(content)
+                if states[i].needs_closing_turn():
+                    closing.add(i)
+                elif states[i].finished():
+                    _finish(i, ConversationLog(histories[i], outcome=states[i].summary()))
+            active = [i for i in active if i not in ended and i not in closing]
+            logging.info(f"lockstep round {round_index}: {len(active)} conversations going on, {len(closing)} closing")
+
+        failed = sum(1 for log in results if log is None)
+        if failed:
+            logging.warning(f"{failed}/{count} lockstep conversations dropped after failed batch requests")
+        return results
+
+    async def _agent_messages(self, agent_script: str, history: list, context_state: dict) -> list:
+        messages = await self.context_strategy.build(agent_script, history, context_state)
+        self.token_usage["agent"] += count_tokens(messages)
+        self.token_usage["calls"] += 1
+        return messages
+
+    async def _persona_messages(self, personality: str, history: list, context_state: dict) -> list:
         prompt = f"""
         You are role-playing as the following person:
         {personality}
-        
+
         Based on this personality, what is your next response in the conversation?
-        Keep your response short and realistic.
+        Keep your response short and realistic. If you would hang up now, say goodbye.
         """
-        response = await self.client.chat.completions.create(
+        messages = await self.context_strategy.build(prompt, history, context_state)
+        self.token_usage["persona"] += count_tokens(messages)
+        self.token_usage["calls"] += 1
+        return messages
+
+    async def _get_agent_response(self, agent_script: str, history: list, context_state: dict, persona: str | None = None) -> str:
+        """Gets the agent's response based on the conversation history."""
+        messages = await self._agent_messages(agent_script, history, context_state)
+        response = await self.llm.chat(
+            stage="agent_turn",
+            persona=persona,
+            check_budget=False,
+            model="gpt-4o-mini",
+            messages=messages
+        )
+        return response.choices[0].message.content
+
+    async def _get_user_response(self, personality: str, history: list, context_state: dict, persona: str | None = None) -> str:
+        """Gets the user's response based on their personality and the history."""
+        messages = await self._persona_messages(personality, history, context_state)
+        response = await self.llm.chat(
+            stage="persona_turn",
+            persona=persona,
+            check_budget=False,
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": prompt},
-                *history
-            ]
+            messages=messages
         )
         return response.choices[0].message.content
@@ -0,0 +1,133 @@
+import functools
+import logging
+import tiktoken
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# tokens the chat format adds around every message
+MESSAGE_OVERHEAD = 4
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken downloads its vocabulary on first use; offline replay must still work
+        logging.warning(f"tokenizer unavailable ({e}), estimating 4 characters per token")
+        return None
+
+
+def count_tokens(messages: list, model: str = "gpt-4o-mini") -> int:
+    """Counts prompt tokens of a chat request locally."""
+    encoding = _encoding(model)
+    total = 0
+    for msg in messages:
+        content = str(msg.get("content") or "")
+        total += MESSAGE_OVERHEAD + (len(encoding.encode(content)) if encoding else len(content) // 4)
+    return total
+
+
+class ContextStrategy:
+    """Full history, trimmed from the oldest turn only when it exceeds the token budget."""
+
+    name = "full"
+
+    def __init__(self, budget_tokens: int | None = None, model: str = "gpt-4o-mini"):
+        self.budget_tokens = budget_tokens
+        self.model = model
+
+    async def build(self, system_prompt: str, history: list, state: dict) -> list:
+        """Returns the messages to send for one call.
+
+        `state` is owned by the caller and kept for the length of one conversation.
+        """
+        return self._fit(system_prompt, history)
+
+    def _fit(self, system_prompt: str, history: list, prefix: list | None = None) -> list:
+        """Keeps the newest messages of `history` that fit in the budget (always at least one)."""
+        head = [{"role": "system", "content": system_prompt}, *(prefix or [])]
+        if self.budget_tokens is None:
+            return [*head, *history]
+
+        remaining = self.budget_tokens - count_tokens(head, self.model)
+        kept = []
+        for msg in reversed(history):
+            cost = count_tokens([msg], self.model)
+            if kept and cost > remaining:
+                break
+            kept.append(msg)
+            remaining -= cost
+        return [*head, *reversed(kept)]
+
+
+class SlidingWindow(ContextStrategy):
+    """Only the last `window` messages, further trimmed to the token budget."""
+
+    name = "window"
+
+    def __init__(self, budget_tokens: int | None = None, window: int = 8, model: str = "gpt-4o-mini"):
+        super().__init__(budget_tokens, model)
+        self.window = window
+
+    async def build(self, system_prompt: str, history: list, state: dict) -> list:
+        return self._fit(system_prompt, history[-self.window:])
+
+
+class RollingSummary(ContextStrategy):
+    """Recent messages verbatim, everything older folded into a running summary.
+
+    Messages are folded in chunks once more than 2 * `keep_recent` are pending, so the
+    summary is refreshed every few turns rather than on every call.
+    """
+
+    name = "summary"
+
+    def __init__(self, llm, budget_tokens: int | None = None, keep_recent: int = 6, model: str = "gpt-4o-mini"):
+        super().__init__(budget_tokens, model)
+        self.llm = llm
+        self.keep_recent = keep_recent
+        self.summary_prompt_tokens = 0
+
+    async def build(self, system_prompt: str, history: list, state: dict) -> list:
+        summarized = state.get("summarized", 0)
+        if len(history) - summarized > 2 * self.keep_recent:
+            cutoff = len(history) - self.keep_recent
+            state["summary"] = await self._summarize(state.get("summary", ""), history[summarized:cutoff])
+            state["summarized"] = summarized = cutoff
+
+        prefix = []
+        if state.get("summary"):
+            prefix.append({"role": "system", "content": f"Summary of the conversation so far: {state['summary']}"})
+        return self._fit(system_prompt, history[summarized:], prefix)
+
+    async def _summarize(self, summary: str, messages: list) -> str:
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        prompt = f"""
+        Update the running summary of a debt collection phone call with the new messages.
+        Keep every fact that matters later: identity verification, amounts, payment options offered,
+        commitments, disputes and requests. Answer with the updated summary only, in a few sentences.
+
+        Current summary:
+        {summary or "(none)"}
+
+        New messages:
+        {transcript}
+        """
+        request = [{"role": "system", "content": prompt}]
+        self.summary_prompt_tokens += count_tokens(request, self.model)
+        response = await self.llm.chat(stage="summary", check_budget=False, model=self.model, messages=request)
+        return response.choices[0].message.content
+
+
+def make_context_strategy(name: str, llm, budget_tokens: int | None = None) -> ContextStrategy:
+    if name == "full":
+        return ContextStrategy(budget_tokens)
+    if name == "window":
+        return SlidingWindow(budget_tokens)
+    if name == "summary":
+        return RollingSummary(llm, budget_tokens)
+    raise ValueError(f"unknown context strategy {name!r}")
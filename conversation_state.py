@@ -0,0 +1,94 @@
+import logging
+import re
+from transcript_features import OUTCOME_PATTERNS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# debtor phrases that end a call, checked in this order: the stronger outcome wins when a turn has several.
+# Commitment is stricter than the transcript feature's, since a false match here cuts the call short.
+TERMINAL_PATTERNS = {
+    "do_not_call": OUTCOME_PATTERNS["do_not_call"],
+    "dispute": OUTCOME_PATTERNS["dispute"],
+    "commitment": re.compile(
+        r"\bi(?:'ll| will| can) (pay|make (a|the) payment|set (that|it) up)\b(?! later)|"
+        r"\b(sounds good|let'?s do (it|that)|i agree|(it'?s a|that'?s a) deal)\b",
+        re.I,
+    ),
+    "callback": re.compile(
+        r"call (me )?(back|later|tomorrow|another time|next week)|not a good time|(busy|at work|driving) right now", re.I
+    ),
+    "hang_up": re.compile(
+        r"\b(good ?bye|bye( now)?|i'?m hanging up|gotta go|have to go)\b|[*\[(]\s*(hangs up|click|call ends)", re.I
+    ),
+}
+TERMINAL_OUTCOMES = tuple(TERMINAL_PATTERNS)
+
+# debtor talking about terms: the call is still being negotiated and worth a few more turns
+NEGOTIATION_PATTERN = re.compile(
+    r"payment plan|installments?|monthly|how much|afford|lower (the )?(amount|payment)|minimum|discount|"
+    r"waive|interest|\$\s?\d|\d+ dollars|what if i|can i (pay|do)",
+    re.I,
+)
+
+
+class ConversationLog(list):
+    """A conversation's messages (a plain list everywhere it is read) with its structured outcome attached."""
+
+    def __init__(self, messages=(), outcome: dict | None = None):
+        super().__init__(messages)
+        self.outcome = outcome or {}
+
+
+class ConversationState:
+    """Tracks a simulated call turn by turn and decides when it is over.
+
+    `observe` looks at every debtor reply. A terminal outcome (payment commitment,
+    dispute, do-not-call, callback request or hang-up) ends the call: after a hang-up
+    immediately, otherwise after one closing agent turn. While the debtor is still
+    talking about terms when the turn limit is reached, the limit grows one turn at
+    a time, up to `max_extra_turns`.
+    """
+
+    def __init__(self, max_turns: int, max_extra_turns: int = 0):
+        self.max_turns = max_turns
+        self.max_extra_turns = max_extra_turns
+        self.limit = max_turns
+        self.turns = 0
+        self.outcome = "none"
+        self.evidence = None
+        self.negotiating = False
+
+    @property
+    def terminal(self) -> bool:
+        return self.outcome != "none"
+
+    def observe(self, persona_reply: str):
+        """Records one completed agent/persona exchange."""
+        self.turns += 1
+        for outcome, pattern in TERMINAL_PATTERNS.items():
+            match = pattern.search(persona_reply or "")
+            if match:
+                self.outcome = outcome
+                self.evidence = match.group(0)
+                break
+        self.negotiating = not self.terminal and bool(NEGOTIATION_PATTERN.search(persona_reply or ""))
+        if self.turns >= self.limit and self.negotiating and self.limit < self.max_turns + self.max_extra_turns:
+            self.limit += 1
+
+    def needs_closing_turn(self) -> bool:
+        """Whether the agent still gets to wrap up: not after a hang-up or a plain turn limit."""
+        return self.terminal and self.outcome != "hang_up"
+
+    def finished(self) -> bool:
+        return self.terminal or self.turns >= self.limit
+
+    def summary(self) -> dict:
+        return {
+            "outcome": self.outcome,
+            "ended_by": "outcome" if self.terminal else "turn_limit",
+            "turns": self.turns,
+            "extra_turns": max(0, self.limit - self.max_turns),
+            "still_negotiating": self.negotiating,
+            "evidence": self.evidence,
+        }
@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from livekit import rtc
+from livekit.agents import AgentSession, llm, tts
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_AUDIO_CACHE_DIR = "audio_cache"
+# audio is handed to the session in 20 ms frames, so an interruption cuts it off promptly
+FRAME_MS = 20
+
+OPENING_LINE = "Hi, I'm Alex from the Bank of America."
+# the part of the greeting written for the customer, generated while the phone rings
+GREETING_INSTRUCTIONS = (
+    "You have just said \"" + OPENING_LINE + "\" to the person who picked up. In one short sentence, ask if you "
+    "are speaking with {customer_name} to verify their identity before proceeding. Reply with that sentence only."
+)
+# the whole greeting, for when nothing was prepared in time
+FALLBACK_GREETING_INSTRUCTIONS = (
+    "Introduce yourself with this greeting: 'Hi, I'm Alex from the Bank of America'. "
+    "Then, ask if you are speaking with {customer_name} to verify their identity before proceeding."
+)
+VERIFY_INSTRUCTIONS = "Ask if you are speaking with {customer_name} to verify their identity before proceeding."
+
+# lines the agent says word for word; synthesized once per campaign instead of on every call
+FIXED_PHRASES = (
+    OPENING_LINE,
+    "Okay, let me set that plan up for you, one moment.",
+    "Sure, let me put that in the calendar.",
+    "Thanks, I'm processing that payment now, it'll just take a moment.",
+    "I understand, let me note that down on your account.",
+)
+
+
+async def play_frames(frames: list):
+    """`frames` as the async iterable `AgentSession.say(audio=...)` takes."""
+    for frame in frames:
+        yield frame
+
+
+def split_frames(frame: rtc.AudioFrame) -> list:
+    """Cuts one long frame into FRAME_MS frames."""
+    step = frame.sample_rate * FRAME_MS // 1000 * frame.num_channels * 2
+    data = bytes(frame.data)
+    return [
+        rtc.AudioFrame(
+            data[start:start + step],
+            frame.sample_rate,
+            frame.num_channels,
+            len(data[start:start + step]) // (2 * frame.num_channels),
+        )
+        for start in range(0, len(data), step)
+    ]
+
+
+async def synthesize(engine: tts.TTS, text: str) -> rtc.AudioFrame:
+    """The whole audio of `text` as one frame."""
+    frames = []
+    async with engine.synthesize(text) as stream:
+        async for audio in stream:
+            frames.append(audio.frame)
+    if not frames:
+        raise RuntimeError(f"TTS returned no audio for {text!r}")
+    return rtc.combine_audio_frames(frames)
+
+
+class PhraseAudioCache:
+    """Synthesized audio of fixed phrases for one campaign, on disk and in process memory.
+
+    Each phrase is stored as raw 16-bit PCM (`<hash>.pcm`, with a `.json` sidecar for
+    its format and length) under `<directory>/<campaign>/`, keyed by the voice and the
+    exact text, so a new voice or wording is synthesized again and nothing else is.
+    Files are written atomically; several worker processes may fill the same directory.
+    """
+
+    def __init__(self, directory: str, campaign: str, voice: str):
+        self.directory = os.path.join(directory, re.sub(r"[^\w.-]", "_", campaign) or "default")
+        self.voice = voice
+        self._frames = {}
+        # text -> synthesis in progress, so concurrent calls of the process share it
+        self._synthesizing = {}
+        self._warming = None
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, text: str) -> str:
+        digest = hashlib.sha256(f"{self.voice}|{text}".encode()).hexdigest()[:24]
+        return os.path.join(self.directory, digest)
+
+    def cached(self, text: str) -> list | None:
+        """Frames of `text` from memory or disk, or None if it was never synthesized."""
+        if text in self._frames:
+            return self._frames[text]
+        path = self._path(text)
+        try:
+            with open(f"{path}.json", "r") as f:
+                meta = json.load(f)
+            with open(f"{path}.pcm", "rb") as f:
+                data = f.read()
+        except (OSError, json.JSONDecodeError):
+            return None
+        if len(data) != meta.get("bytes"):
+            # the audio and its sidecar are from different writes (or the audio is cut short)
+            return None
+        frame = rtc.AudioFrame(data, meta["sample_rate"], meta["num_channels"], len(data) // (2 * meta["num_channels"]))
+        self._frames[text] = split_frames(frame)
+        return self._frames[text]
+
+    async def get(self, text: str, engine: tts.TTS) -> list:
+        """Frames of `text`, synthesizing and storing them on a miss."""
+        frames = self.cached(text)
+        if frames is not None:
+            self.hits += 1
+            return frames
+        task = self._synthesizing.get(text)
+        if task is None:
+            self.misses += 1
+            task = self._synthesizing[text] = asyncio.ensure_future(self._synthesize(text, engine))
+            task.add_done_callback(lambda _: self._synthesizing.pop(text, None))
+        # a call that gives up waiting must not cancel the synthesis for the others
+        return await asyncio.shield(task)
+
+    async def _synthesize(self, text: str, engine: tts.TTS) -> list:
+        frame = await synthesize(engine, text)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(text)
+        data = bytes(frame.data)
+        meta = {"text": text, "sample_rate": frame.sample_rate, "num_channels": frame.num_channels, "bytes": len(data)}
+        for suffix, content in ((".pcm", data), (".json", json.dumps(meta).encode())):
+            # a temporary file of its own, as other worker processes may be writing the same phrase
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, f"{path}{suffix}")
+        self._frames[text] = split_frames(frame)
+        return self._frames[text]
+
+    def start_warming(self, engine: tts.TTS):
+        """Warms the cache in the background, once per process."""
+        if self._warming is None:
+            self._warming = asyncio.create_task(self.warm(engine))
+
+    async def warm(self, engine: tts.TTS, phrases=FIXED_PHRASES):
+        """Synthesizes the phrases that are not cached yet; failures are logged and retried on next use."""
+        for text in phrases:
+            try:
+                await self.get(text, engine)
+            except Exception as e:
+                logging.warning(f"could not pre-synthesize {text!r}: {e}")
+
+
+class SpeculativeGreeting:
+    """A call's opening turn, prepared while the phone rings so it plays right at pickup.
+
+    `start()` (called when dialing) loads the cached audio of OPENING_LINE and, in
+    parallel, has the LLM write the customer-specific rest of the greeting and
+    synthesizes it. `play()` then starts the opening line at once and follows it with
+    the prepared part. If the call is not answered the work is simply thrown away:
+    one short LLM reply and one TTS request.
+    """
+
+    def __init__(
+        self,
+        engine: tts.TTS,
+        model: llm.LLM,
+        phrases: PhraseAudioCache,
+        instructions: str,
+        customer_name: str,
+        ready_timeout: float = 3.0,
+    ):
+        self.tts = engine
+        self.llm = model
+        self.phrases = phrases
+        self.instructions = instructions
+        self.customer_name = customer_name
+        # how long playback waits at pickup for work that is still running
+        self.ready_timeout = ready_timeout
+        self._opener = None
+        self._personal = None
+        # whether the customer-specific part was spoken; if not, the caller asks for it
+        self.personalized = False
+
+    def start(self):
+        self._opener = asyncio.create_task(self.phrases.get(OPENING_LINE, self.tts))
+        self._personal = asyncio.create_task(self._prepare_personal())
+
+    def cancel(self):
+        for task in (self._opener, self._personal):
+            if task is not None:
+                task.cancel()
+
+    async def aclose(self):
+        self.cancel()
+        await asyncio.gather(*(t for t in (self._opener, self._personal) if t is not None), return_exceptions=True)
+
+    async def _prepare_personal(self) -> tuple[str, list]:
+        chat_ctx = llm.ChatContext.empty()
+        chat_ctx.add_message(role="system", content=self.instructions)
+        chat_ctx.add_message(role="system", content=GREETING_INSTRUCTIONS.format(customer_name=self.customer_name))
+        parts = []
+        async with self.llm.chat(chat_ctx=chat_ctx) as stream:
+            async for chunk in stream:
+                if chunk.delta and chunk.delta.content:
+                    parts.append(chunk.delta.content)
+        text = "".join(parts).strip()
+        if not text:
+            raise RuntimeError("empty greeting")
+        return text, split_frames(await synthesize(self.tts, text))
+
+    async def _ready(self, task: asyncio.Task):
+        """The task's result, or None if it failed or is not done within ready_timeout."""
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.ready_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"speculative greeting not ready: {e!r}")
+            return None
+
+    async def play(self, session: AgentSession):
+        """Speaks the prepared greeting; returns its SpeechHandle, or None if nothing could be played."""
+        opener = await self._ready(self._opener)
+        if opener is None:
+            self._personal.cancel()
+            return None
+
+        # waited for once, by whichever of the text and audio streams gets there first
+        personal = asyncio.ensure_future(self._ready(self._personal))
+
+        async def _text():
+            yield OPENING_LINE
+            result = await personal
+            if result is not None:
+                yield " " + result[0]
+
+        async def _audio():
+            for frame in opener:
+                yield frame
+            result = await personal
+            if result is not None:
+                self.personalized = True
+                for frame in result[1]:
+                    yield frame
+
+        return session.say(_text(), audio=_audio())
@@ -0,0 +1,160 @@
+import logging
+import math
+import statistics
+from chat_simulator import ChatSimulator
+from scheduler import SimulationScheduler
+from script_optimizer import METRICS, ScriptOptimizer, aggregate_scores
+from usage_tracker import BudgetExceededError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class IterativeOptimizer:
+    """Self-improvement loop: propose candidate scripts, race them with successive halving, keep the best.
+
+    Every candidate is evaluated on the same fixed persona set, in the same order, so
+    candidates are always compared on identical personas. A candidate's results are kept
+    per persona, which means the incumbent script is never re-simulated.
+    """
+
+    def __init__(
+        self,
+        chat_sim: ChatSimulator,
+        script_opt: ScriptOptimizer,
+        scheduler: SimulationScheduler,
+        max_turns: int = 7,
+        max_extra_turns: int = 3,
+        candidates_per_round: int = 4,
+        min_personas: int = 2,
+        eta: int = 2,
+        min_improvement: float = 0.1,
+        patience: int = 2,
+        max_simulations: int | None = None,
+    ):
+        self.chat_sim = chat_sim
+        self.script_opt = script_opt
+        self.scheduler = scheduler
+        self.max_turns = max_turns
+        self.max_extra_turns = max_extra_turns
+        self.candidates_per_round = candidates_per_round
+        self.min_personas = min_personas
+        self.eta = eta
+        self.min_improvement = min_improvement
+        self.patience = patience
+        self.max_simulations = max_simulations
+        self.simulations_used = 0
+        # script -> {persona index: score record}
+        self._records = {}
+
+    async def run(self, script: str, personalities: list, iterations: int, output_path: str | None = None) -> dict:
+        """Runs up to `iterations` rounds and returns the best script with its score history."""
+        best_script = script
+        await self._evaluate([best_script], personalities, len(personalities))
+        best_score = self._score(best_script)
+        history = [best_score]
+        stale = 0
+        logging.info(f"iteration 0: incumbent score {best_score:.2f}")
+
+        for iteration in range(1, iterations + 1):
+            if self._budget_left() <= 0:
+                logging.info("simulation budget exhausted, stopping")
+                break
+
+            digest = aggregate_scores(list(self._records[best_script].values()))
+            try:
+                candidates = await self.script_opt.propose_scripts(best_script, digest, self.candidates_per_round)
+            except BudgetExceededError as e:
+                logging.info(f"iteration {iteration}: {e}, stopping")
+                break
+            if not candidates:
+                logging.warning(f"iteration {iteration}: no candidate scripts, stopping")
+                break
+
+            winner = await self._successive_halving([best_script, *candidates], personalities)
+            winner_score = self._score(winner)
+            improvement = winner_score - best_score
+            logging.info(
+                f"iteration {iteration}: best candidate {winner_score:.2f} vs incumbent {best_score:.2f} "
+                f"({self.simulations_used} simulations used)"
+            )
+
+            if winner != best_script and improvement > 0:
+                best_script, best_score = winner, winner_score
+                if output_path:
+                    self._write(best_script, output_path)
+            history.append(best_score)
+
+            stale = stale + 1 if improvement < self.min_improvement else 0
+            if stale >= self.patience:
+                logging.info(f"scores plateaued for {stale} iterations, stopping")
+                break
+
+        return {
+            "best_script": best_script,
+            "best_score": best_score,
+            "score_history": history,
+            "simulations_used": self.simulations_used,
+        }
+
+    async def _successive_halving(self, candidates: list, personalities: list) -> str:
+        """Evaluates candidates on growing persona prefixes, keeping the top 1/eta after each rung."""
+        alive = list(candidates)
+        rung = self.min_personas
+        while True:
+            evaluated = min(rung, len(personalities))
+            await self._evaluate(alive, personalities, evaluated)
+            if len(alive) == 1 or evaluated == len(personalities) or self._budget_left() <= 0:
+                break
+            alive.sort(key=lambda s: self._score(s, evaluated), reverse=True)
+            alive = alive[:max(1, math.ceil(len(alive) / self.eta))]
+            rung *= self.eta
+        # only compare on personas every survivor has been evaluated on
+        common = min(len(self._records.get(s, {})) for s in alive)
+        return max(alive, key=lambda s: self._score(s, common))
+
+    async def _evaluate(self, scripts: list, personalities: list, count: int):
+        """Simulates and scores each script on the first `count` personas it has not seen yet."""
+        jobs = []
+        for script in scripts:
+            records = self._records.setdefault(script, {})
+            for index in range(count):
+                if index not in records and len(jobs) < self._budget_left():
+                    jobs.append((script, index))
+        if not jobs:
+            return
+
+        logs = await self.scheduler.run([
+            lambda script=script, index=index: self.chat_sim.simulate(
+                script, personalities[index], max_turns=self.max_turns, max_extra_turns=self.max_extra_turns
+            )
+            for script, index in jobs
+        ])
+        self.simulations_used += len(jobs)
+
+        finished = [(job, log) for job, log in zip(jobs, logs) if log is not None]
+        scored = await self.script_opt.score_conversations([log for _, log in finished], keep_failed=True)
+        for (script, index), record in zip((job for job, _ in finished), scored):
+            if record is not None:
+                self._records[script][index] = record
+
+    def _score(self, script: str, count: int | None = None) -> float:
+        """Mean metric score of a script over the personas it was evaluated on (or the first `count`)."""
+        records = [
+            record for index, record in self._records.get(script, {}).items()
+            if count is None or index < count
+        ]
+        if not records:
+            return float("-inf")
+        return statistics.fmean(statistics.fmean(r[metric] for metric in METRICS) for r in records)
+
+    def _budget_left(self) -> float:
+        if self.max_simulations is None:
+            return math.inf
+        return self.max_simulations - self.simulations_used
+
+    @staticmethod
+    def _write(script: str, output_path: str):
+        with open(output_path, "w") as f:
+            f.write(script)
+        logging.info(f"wrote improved script to {output_path}")
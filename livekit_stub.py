@@ -0,0 +1,104 @@
+import asyncio
+import json
+import logging
+import random
+from livekit import api
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# SIP status code the simulated agent reports for each unanswered outcome
+OUTCOME_SIP_CODES = {"busy": "486", "no_answer": "480", "failed": "500"}
+
+
+class _FakeRoomService:
+    def __init__(self, rooms: dict):
+        self.rooms = rooms
+
+    async def create_room(self, create: api.CreateRoomRequest) -> api.Room:
+        room = api.Room(name=create.name, metadata=create.metadata)
+        self.rooms[create.name] = room
+        return room
+
+    async def list_rooms(self, list: api.ListRoomsRequest) -> api.ListRoomsResponse:
+        names = set(list.names)
+        return api.ListRoomsResponse(rooms=[
+            room for name, room in self.rooms.items() if not names or name in names
+        ])
+
+    async def delete_room(self, delete: api.DeleteRoomRequest) -> api.DeleteRoomResponse:
+        self.rooms.pop(delete.room, None)
+        return api.DeleteRoomResponse()
+
+    async def update_room_metadata(self, update: api.UpdateRoomMetadataRequest) -> api.Room:
+        room = self.rooms[update.room]
+        room.metadata = update.metadata
+        return room
+
+
+class _FakeAgentDispatchService:
+    def __init__(self, stub: "FakeLiveKitAPI"):
+        self.stub = stub
+
+    async def create_dispatch(self, req: api.CreateAgentDispatchRequest) -> api.AgentDispatch:
+        self.stub.dispatched.append(req)
+        task = asyncio.create_task(self.stub._simulate_call(req.room, json.loads(req.metadata or "{}")))
+        self.stub._tasks.add(task)
+        task.add_done_callback(self.stub._tasks.discard)
+        return api.AgentDispatch(agent_name=req.agent_name, room=req.room, metadata=req.metadata)
+
+
+class FakeLiveKitAPI:
+    """Local stand-in for the parts of `api.LiveKitAPI` the campaign runner uses.
+
+    Each dispatch simulates the agent job: it reports `dialing`, then after a random ring
+    time either `answered` (and deletes the room when the simulated conversation ends,
+    like `VasooliMan.hangup`) or a `sip_error` with a busy/no-answer/failure status code.
+    """
+
+    def __init__(
+        self,
+        outcomes: dict | None = None,
+        ring_time: tuple = (0.05, 0.2),
+        talk_time: tuple = (0.1, 0.5),
+        seed: int | None = None,
+    ):
+        self.outcomes = outcomes or {"answered": 0.6, "busy": 0.15, "no_answer": 0.2, "failed": 0.05}
+        self.ring_time = ring_time
+        self.talk_time = talk_time
+        self.rng = random.Random(seed)
+        self.rooms = {}
+        self.room = _FakeRoomService(self.rooms)
+        self.agent_dispatch = _FakeAgentDispatchService(self)
+        self.dispatched = []
+        # trunk id -> calls currently in progress / most ever in progress
+        self.active = {}
+        self.peak = {}
+        self._tasks = set()
+
+    async def _simulate_call(self, room_name: str, metadata: dict):
+        trunk_id = metadata.get("sip_trunk_id")
+        self.active[trunk_id] = self.active.get(trunk_id, 0) + 1
+        self.peak[trunk_id] = max(self.peak.get(trunk_id, 0), self.active[trunk_id])
+        try:
+            await self._report(room_name, {"call_status": "dialing"})
+            await asyncio.sleep(self.rng.uniform(*self.ring_time))
+            outcome = self.rng.choices(list(self.outcomes), weights=list(self.outcomes.values()))[0]
+            if outcome == "answered":
+                await self._report(room_name, {"call_status": "answered", "script_version": "v1"})
+                await asyncio.sleep(self.rng.uniform(*self.talk_time))
+                await self.room.delete_room(api.DeleteRoomRequest(room=room_name))
+            else:
+                await self._report(room_name, {"call_status": "sip_error", "sip_status_code": OUTCOME_SIP_CODES[outcome]})
+        finally:
+            self.active[trunk_id] -= 1
+
+    async def _report(self, room_name: str, status: dict):
+        if room_name in self.rooms:
+            await self.room.update_room_metadata(
+                api.UpdateRoomMetadataRequest(room=room_name, metadata=json.dumps(status))
+            )
+
+    async def aclose(self):
+        for task in list(self._tasks):
+            task.cancel()
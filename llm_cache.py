@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from openai.types.chat import ChatCompletion
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_CACHE_PATH = ".pipeline_cache/responses.sqlite"
+
+# off: no caching, read-through: serve hits and store misses,
+# record: always call the API and store, replay: serve hits and fail on misses
+CACHE_MODES = ("off", "read-through", "record", "replay")
+
+
+class CacheMissError(RuntimeError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+class ResponseCache:
+    """Content-addressed SQLite store of chat completions with size/age based LRU eviction."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        mode: str = "read-through",
+        max_bytes: int = 512 * 1024 * 1024,
+        max_age_days: float = 30,
+        evict_every: int = 100,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"unknown cache mode {mode!r}, expected one of {CACHE_MODES}")
+        self.path = path
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.evict_every = evict_every
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+            """
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used_at)")
+        self.db.commit()
+
+    @staticmethod
+    def key(request: dict, salt: str | None = None) -> str:
+        """Hash of the model, messages and every sampling parameter of a request."""
+        payload = json.dumps({"request": request, "salt": salt}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def lookup(self, key: str) -> ChatCompletion | None:
+        """Returns the stored response for `key`, or None if the API should be called."""
+        if self.mode == "record":
+            return None
+        row = self.db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            if self.mode == "replay":
+                raise CacheMissError(f"no recorded response for request {key[:12]} (replay mode)")
+            return None
+
+        self.hits += 1
+        self.db.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (time.time(), key))
+        self.db.commit()
+        return ChatCompletion.model_validate_json(row[0])
+
+    def store(self, key: str, model: str, response: ChatCompletion):
+        """Stores a fresh response and periodically evicts stale entries."""
+        if self.mode not in ("read-through", "record"):
+            return
+        body = response.model_dump_json()
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, body, len(body), now, now),
+        )
+        self.db.commit()
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self.evict()
+
+    def evict(self):
+        """Drops entries older than max_age, then least recently used ones until under max_bytes."""
+        removed = self.db.execute(
+            "DELETE FROM responses WHERE last_used_at < ?", (time.time() - self.max_age,)
+        ).rowcount
+
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            stale = []
+            for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used_at"):
+                if total <= self.max_bytes:
+                    break
+                stale.append((key,))
+                total -= size
+            self.db.executemany("DELETE FROM responses WHERE key = ?", stale)
+            removed += len(stale)
+
+        self.db.commit()
+        if removed:
+            logging.info(f"response cache evicted {removed} entries")
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import os
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from openai.types.chat import ChatCompletion
+from usage_tracker import STAGES
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# completion tokens reserved per call when the request does not set max_tokens
+DEFAULT_COMPLETION_ESTIMATE = 512
+
+# connection pool of the shared HTTP client
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE = 50
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+
+# Batch API jobs: how often a running job is polled, and the completion window it is submitted with
+DEFAULT_BATCH_POLL_INTERVAL = 30.0
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+# jobs per chat_batch call: requests a job failed or did not finish are resubmitted in the next one
+BATCH_ATTEMPTS = 3
+
+
+def estimate_tokens(messages: list, max_tokens: int | None = None) -> int:
+    """Rough token estimate (~4 characters per token) used to pre-charge the rate limiter."""
+    prompt_chars = sum(len(str(msg.get("content") or "")) for msg in messages)
+    return prompt_chars // 4 + (max_tokens or DEFAULT_COMPLETION_ESTIMATE)
+
+
+def make_http_client(
+    max_connections: int = DEFAULT_MAX_CONNECTIONS,
+    max_keepalive: int = DEFAULT_MAX_KEEPALIVE,
+    keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+    http2: bool = True,
+) -> httpx.AsyncClient:
+    """The one pooled HTTP client every endpoint's OpenAI client is built on.
+
+    Idle connections are kept alive for `keepalive_expiry` seconds so bursts of
+    simulation turns reuse them, and HTTP/2 (when `h2` is installed) multiplexes
+    concurrent requests to the same host over a few connections.
+    """
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logging.warning("h2 is not installed, using HTTP/1.1 (pip install 'httpx[http2]' for HTTP/2)")
+            http2 = False
+    return DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        http2=http2,
+    )
+
+
+class Route:
+    """Where the calls of one stage go: another model, another OpenAI-compatible endpoint, or both."""
+
+    def __init__(self, model: str | None = None, base_url: str | None = None, api_key: str | None = None):
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+
+    def __repr__(self):
+        return f"Route(model={self.model!r}, base_url={self.base_url!r})"
+
+
+def parse_routes(overrides: list, path: str | None = None) -> dict:
+    """Builds the stage -> Route table from a JSON file and `STAGE=MODEL[@BASE_URL]` overrides.
+
+    The file maps stages to `{"model": ..., "base_url": ..., "api_key_env": ...}`; the
+    overrides win over it. Stages without a route keep the model the component asks for.
+    """
+    routes = {}
+    if path:
+        with open(path, "r") as f:
+            for stage, route in json.load(f).items():
+                api_key = os.getenv(route["api_key_env"]) if route.get("api_key_env") else None
+                routes[stage] = Route(route.get("model"), route.get("base_url"), api_key)
+    for value in overrides:
+        stage, _, target = value.partition("=")
+        model, _, base_url = target.partition("@")
+        routes[stage] = Route(model or None, base_url or None)
+    unknown = set(routes) - set(STAGES)
+    if unknown:
+        raise ValueError(f"unknown stages in routes: {', '.join(sorted(unknown))}, expected some of {STAGES}")
+    return routes
+
+
+class LLMClient:
+    """Chat-completions entry point shared by the pipeline components."""
+
+    def __init__(
+        self,
+        api_key: str,
+        rate_limiter=None,
+        cache=None,
+        base_url: str | None = None,
+        usage=None,
+        routes: dict | None = None,
+        http_client: httpx.AsyncClient | None = None,
+        batch_poll_interval: float = DEFAULT_BATCH_POLL_INTERVAL,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.http_client = http_client or make_http_client()
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        # UsageTracker that accounts and budgets every API call
+        self.usage = usage
+        # stage -> Route; one OpenAI client per endpoint, all on the same connection pool
+        self.routes = dict(routes or {})
+        self._clients = {}
+        self.client = self._client_for(base_url, api_key)
+        self.batch_poll_interval = batch_poll_interval
+
+    def _client_for(self, base_url: str | None, api_key: str | None = None) -> AsyncOpenAI:
+        if base_url not in self._clients:
+            self._clients[base_url] = AsyncOpenAI(
+                api_key=api_key or self.api_key,
+                base_url=base_url,
+                http_client=self.http_client,
+                # when a rate limiter is set it owns retries, so the SDK must not retry on its own
+                max_retries=0 if self.rate_limiter else 2,
+            )
+        return self._clients[base_url]
+
+    def model_for(self, stage: str, default: str) -> str:
+        """The model calls of `stage` actually use."""
+        route = self.routes.get(stage)
+        return route.model if route is not None and route.model else default
+
+    def _route_client(self, stage: str) -> AsyncOpenAI:
+        route = self.routes.get(stage)
+        if route is not None and route.base_url and route.base_url != self.base_url:
+            return self._client_for(route.base_url, route.api_key)
+        return self.client
+
+    def _cache_key(self, stage: str, request: dict, salt: str | None) -> str:
+        # another endpoint (the mock server, a local model) may answer the same request differently
+        route = self.routes.get(stage)
+        endpoint = route.base_url if route is not None and route.base_url else self.base_url
+        return self.cache.key({**request, "base_url": endpoint or "default"}, salt=salt)
+
+    async def chat(
+        self,
+        cache_salt: str | None = None,
+        stage: str = "other",
+        persona: str | None = None,
+        check_budget: bool = True,
+        **kwargs,
+    ):
+        """Creates a chat completion, served from the response cache when possible.
+
+        `cache_salt` is mixed into the cache key only, so callers that deliberately
+        repeat a request (e.g. asking for another batch of personas) get distinct entries.
+        `stage` picks the route the call takes and, with `persona`, labels it for usage
+        accounting and budgets; `check_budget=False` makes the call even if the budget
+        is spent (e.g. to finish a conversation whose budget was checked when it started).
+        """
+        kwargs["model"] = self.model_for(stage, kwargs["model"])
+        client = self._route_client(stage)
+        if self.cache is None:
+            return await self._create(client, stage, persona, check_budget, **kwargs)
+
+        key = self._cache_key(stage, kwargs, cache_salt)
+        cached = self.cache.lookup(key)
+        if cached is not None:
+            if self.usage is not None:
+                self.usage.record_cache_hit(stage)
+            return cached
+        response = await self._create(client, stage, persona, check_budget, **kwargs)
+        self.cache.store(key, kwargs["model"], response)
+        return response
+
+    async def chat_batch(
+        self,
+        requests: list,
+        stage: str = "other",
+        personas: list | None = None,
+        cache_salts: list | None = None,
+        check_budget: bool = True,
+    ) -> list:
+        """Creates the chat completions of `requests` (chat() keyword arguments) through the Batch API.
+
+        Requests found in the response cache are not submitted. The rest go into one
+        JSONL file that is uploaded, run as a batch against `/v1/chat/completions` and
+        polled every `batch_poll_interval` seconds until it finishes, which can take up
+        to the completion window; failed requests are resubmitted up to BATCH_ATTEMPTS
+        jobs in all. Returns the responses in request order, None for requests that
+        never succeeded. The budget is checked once per call.
+        """
+        client = self._route_client(stage)
+        personas = personas or [None] * len(requests)
+        cache_salts = cache_salts or [None] * len(requests)
+        responses = [None] * len(requests)
+        keys = [None] * len(requests)
+        pending = []
+        for i, request in enumerate(requests):
+            request = {**request, "model": self.model_for(stage, request["model"])}
+            if self.cache is not None:
+                keys[i] = self._cache_key(stage, request, cache_salts[i])
+                responses[i] = self.cache.lookup(keys[i])
+                if responses[i] is not None:
+                    if self.usage is not None:
+                        self.usage.record_cache_hit(stage)
+                    continue
+            pending.append((i, request))
+        if not pending:
+            return responses
+        if self.usage is not None and check_budget:
+            self.usage.check(stage)
+
+        submitted = dict(pending)
+        for attempt in range(BATCH_ATTEMPTS):
+            completions = await self._run_batch(client, stage, pending)
+            for i, completion in completions.items():
+                responses[i] = completion
+                model = submitted[i]["model"]
+                if self.usage is not None:
+                    self.usage.record(stage, model, completion.usage, persona=personas[i], batch=True)
+                if self.cache is not None:
+                    self.cache.store(keys[i], model, completion)
+            pending = [(i, request) for i, request in pending if i not in completions]
+            if not pending:
+                break
+            if attempt + 1 < BATCH_ATTEMPTS:
+                logging.warning(f"resubmitting {len(pending)} failed {stage} requests")
+        return responses
+
+    async def _run_batch(self, client: AsyncOpenAI, stage: str, pending: list) -> dict:
+        """Runs one batch job of (index, request) pairs; returns the completions it produced by index."""
+        lines = "".join(
+            json.dumps({"custom_id": str(i), "method": "POST", "url": "/v1/chat/completions", "body": request}) + "\n"
+            for i, request in pending
+        )
+        input_file = await client.files.create(file=(f"{stage}.jsonl", lines.encode()), purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=BATCH_COMPLETION_WINDOW,
+            metadata={"stage": stage},
+        )
+        logging.info(f"submitted {stage} batch {batch.id} with {len(pending)} requests")
+        while batch.status not in BATCH_FINAL_STATUSES:
+            await asyncio.sleep(self.batch_poll_interval)
+            batch = await client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        logging.info(
+            f"{stage} batch {batch.id} {batch.status}: "
+            f"{counts.completed if counts else '?'} completed, {counts.failed if counts else '?'} failed"
+        )
+        if not batch.output_file_id:
+            return {}
+
+        completions = {}
+        output = await client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") == 200:
+                completions[int(result["custom_id"])] = ChatCompletion.model_validate(response["body"])
+        return completions
+
+    async def _create(self, client: AsyncOpenAI, stage: str, persona: str | None, check_budget: bool, **kwargs):
+        """Calls the API, going through the rate limiter when one is set."""
+        if self.usage is not None and check_budget:
+            # raises BudgetExceededError once the stage or the run has spent its budget
+            self.usage.check(stage)
+        if self.rate_limiter is None:
+            response = await client.chat.completions.create(**kwargs)
+        else:
+            response = await self.rate_limiter.call(
+                lambda: client.chat.completions.create(**kwargs),
+                estimated_tokens=estimate_tokens(kwargs["messages"], kwargs.get("max_tokens")),
+            )
+        if self.usage is not None:
+            self.usage.record(stage, kwargs["model"], getattr(response, "usage", None), persona=persona)
+        return response
+
+    async def aclose(self):
+        await self.http_client.aclose()
@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+import types
+from livekit.agents import AgentSession
+from livekit.plugins import openai
+from agent import VasooliMan
+from backend_client import BackendClient
+from backend_stub import StubBackend
+from mock_openai import MockOpenAI
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# caller lines replayed in order; they trigger the payment plan, callback and payment tools on the mock
+USER_LINES = (
+    "Hello?",
+    "Yes, speaking. What is this about?",
+    "I can't pay the whole thing, can we set up a payment plan?",
+    "Actually I'm busy right now, can you call me back tomorrow?",
+    "Fine, I'll pay it now with my card.",
+    "Okay, thanks. Bye.",
+)
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class LoopMonitor:
+    """Samples event-loop lag (how late a timer fires) and memory while the load test runs."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lags = []
+        self.peak_rss = 0
+        self.peak_sessions = 0
+        self.active_sessions = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+            self.peak_sessions = max(self.peak_sessions, self.active_sessions)
+
+
+async def run_session(index: int, llm: openai.LLM, backend: BackendClient, turns: int, monitor: LoopMonitor):
+    """One text-only call: the real VasooliMan agent, its instructions and tools, without audio or a room."""
+    agent = VasooliMan(
+        customer_name=f"Customer {index}",
+        account_number=f"LT{index + 1:06d}",
+        outstanding_amount="1200",
+        due_date="September 30, 2025",
+        card_type="Visa",
+        dial_info={"phone_number": f"+1555{index:07d}"},
+        backend=backend,
+        call_id=f"load-test-{index}",
+    )
+    # no audio to screen for voicemail, and the tools only need the caller's identity
+    agent.screening = False
+    agent.set_participant(types.SimpleNamespace(identity=f"+1555{index:07d}"))
+
+    session = AgentSession(llm=llm)
+    monitor.active_sessions += 1
+    try:
+        await session.start(agent)
+        tool_calls = 0
+        for line in USER_LINES[:turns]:
+            result = await session.run(user_input=line)
+            tool_calls += sum(1 for event in result.events if event.type == "function_call")
+        return tool_calls
+    finally:
+        monitor.active_sessions -= 1
+        await session.aclose()
+
+
+async def main(args):
+    # per-request HTTP logs would dominate the output and the event loop
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("outbound-caller").setLevel(logging.WARNING)
+
+    mock = MockOpenAI(latency=args.llm_min_latency, jitter=args.llm_max_latency - args.llm_min_latency)
+    stub = StubBackend(latency=(args.backend_min_latency, args.backend_max_latency), failure_rate=args.backend_failure_rate)
+    # an external stand-in keeps the mock's own CPU use off the measured event loop
+    llm_url = args.llm_url or await mock.start()
+    backend_url = await stub.start()
+    # shared like in a prewarmed worker process
+    llm = openai.LLM(model="gpt-4o-mini", base_url=llm_url, api_key="load-test")
+    backend = BackendClient(backend_url)
+
+    monitor = LoopMonitor()
+    # one warm-up session first, so lazy imports and first-use caches are not counted per session
+    await run_session(-1, llm, backend, 1, monitor)
+    requests_before, backend_requests_before = mock.requests, stub.requests
+    baseline_rss = rss_bytes()
+    monitor.start()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    session_seconds = []
+
+    async def _bounded(index: int):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                return await run_session(index, llm, backend, args.turns, monitor)
+            except Exception as e:
+                logging.error(f"session {index} failed: {e!r}")
+                return None
+            finally:
+                session_seconds.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_bounded(i) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    monitor.stop()
+    await backend.aclose()
+    await mock.stop()
+    await stub.stop()
+
+    succeeded = [r for r in results if r is not None]
+    lags = sorted(monitor.lags) or [0.0]
+    report = {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "turns": args.turns,
+        "succeeded": len(succeeded),
+        "wall_seconds": round(elapsed, 2),
+        "sessions_per_second": round(len(succeeded) / elapsed, 2),
+        "mean_session_seconds": round(statistics.fmean(session_seconds), 3),
+        "llm_requests": mock.requests - requests_before if not args.llm_url else None,
+        "tool_calls": sum(succeeded),
+        "backend_requests": stub.requests - backend_requests_before,
+        "loop_lag_ms": {
+            "p50": round(lags[len(lags) // 2] * 1000, 1),
+            "p99": round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 1),
+            "max": round(lags[-1] * 1000, 1),
+        },
+        "peak_concurrent_sessions": monitor.peak_sessions,
+        "memory_per_session_kb": round((monitor.peak_rss - baseline_rss) / max(1, monitor.peak_sessions) / 1024, 1),
+    }
+    print(json.dumps(report, indent=4))
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run many headless VasooliMan sessions in one process against local LLM and backend stand-ins."
+    )
+    parser.add_argument("--sessions", type=int, default=200, help="sessions to run in total")
+    parser.add_argument("--concurrency", type=int, default=50, help="sessions running at the same time")
+    parser.add_argument("--turns", type=int, default=len(USER_LINES), help=f"caller turns per session (max {len(USER_LINES)})")
+    parser.add_argument("--llm-url", default=None,
+                        help="base URL of an OpenAI-compatible stand-in running elsewhere (default: one in this process)")
+    parser.add_argument("--llm-min-latency", type=float, default=0.2, help="mock LLM time to first token, lower bound")
+    parser.add_argument("--llm-max-latency", type=float, default=0.6, help="mock LLM time to first token, upper bound")
+    parser.add_argument("--backend-min-latency", type=float, default=0.05)
+    parser.add_argument("--backend-max-latency", type=float, default=0.3)
+    parser.add_argument("--backend-failure-rate", type=float, default=0.0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
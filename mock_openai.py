@@ -0,0 +1,398 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+import uuid
+import zlib
+from aiohttp import web
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# user phrases that make the mock call one of the agent's tools, with the arguments it passes
+TOOL_TRIGGERS = (
+    (re.compile(r"\bpay(ment)? plan|installments?\b", re.I),
+     "setup_payment_plan", {"monthly_amount": "100", "duration_months": "6"}),
+    (re.compile(r"\b(pay|paying) (it|now|today|the)\b", re.I),
+     "process_payment", {"amount": "250", "payment_method": "credit_card"}),
+    (re.compile(r"\bcall (me )?back|busy\b", re.I),
+     "schedule_callback", {"callback_date": "tomorrow", "callback_time": "5pm"}),
+    (re.compile(r"not my (debt|card)|already paid|dispute", re.I),
+     "handle_payment_dispute", {"dispute_reason": "already paid"}),
+)
+
+FIRST_NAMES = ("Maria", "James", "Aisha", "Wei", "Carlos", "Priya", "Tom", "Fatima", "Olga", "Kwame", "Lucy", "Ravi")
+OCCUPATIONS = ("teacher", "truck driver", "nurse", "barista", "electrician", "student", "retail manager", "chef")
+CAUSES = ("lost their job", "had a medical emergency", "went through a divorce", "overspent after a move")
+ATTITUDES = ("cooperative", "evasive", "anxious", "hostile", "apologetic")
+
+# simulated debtors: neutral and negotiating lines, then one way of ending the call
+PERSONA_LINES = ("Who is this?", "Okay, go on.", "I don't have much money right now.")
+NEGOTIATION_LINE = "How much would the monthly payment be if I set up a plan?"
+PERSONA_ENDINGS = (
+    "Okay, I'll pay $100 this Friday.",
+    "Please stop calling me.",
+    "That's not my card, I already paid it.",
+    "I'm at work right now, call me back tomorrow.",
+    "I have to go. Bye.",
+    None,  # never ends the call on their own
+)
+
+REPLY_WORDS = (
+    "I understand your situation and I want to help you find a way to settle the balance "
+    "on your account today with an option that fits your budget"
+).split()
+
+
+class MockOpenAI:
+    """Local OpenAI-compatible `/v1/chat/completions` endpoint for load tests, benchmarks and offline runs.
+
+    Replies after `latency` plus up to `jitter` seconds, fails `error_rate` of the requests
+    with a 429 or 500, streams when asked to and reports token usage. It also stands in
+    for the Batch API (`/v1/files`, `/v1/batches`): an uploaded JSONL batch of chat
+    completions finishes `batch_latency` seconds after it was created, with `error_rate`
+    of its requests failed. It answers the
+    pipeline's prompts (persona batches, scoring, optimization, candidate scripts) with
+    well-formed JSON, simulated debtors with lines that end most calls early, other
+    turns with `reply_words` words, and calls the agent's tools
+    when the user's last message matches one of `TOOL_TRIGGERS` and the request offers that tool.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.15,
+        error_rate: float = 0.0,
+        reply_words: int = 20,
+        seed: int | None = None,
+        batch_latency: float = 0.5,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.reply_words = reply_words
+        self.batch_latency = batch_latency
+        self.seed = seed
+        # latency and injected failures; the content of replies comes from `_request_rng`
+        self.rng = random.Random(seed)
+        # request hash -> times it was answered
+        self._answered = {}
+        # requests received (failed ones included), injected failures, tokens reported in `usage`
+        self.requests = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # batch jobs created and the requests they held
+        self.batches_created = 0
+        self.batch_requests = 0
+        self.files = {}
+        self.batches = {}
+        self.app = web.Application()
+        self.app.add_routes([
+            web.post("/v1/chat/completions", self._chat_completions),
+            web.get("/v1/models", self._models),
+            web.post("/v1/files", self._upload_file),
+            web.get("/v1/files/{file_id}/content", self._file_content),
+            web.post("/v1/batches", self._create_batch),
+            web.get("/v1/batches/{batch_id}", self._retrieve_batch),
+        ])
+        self._runner = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Starts serving and returns the base URL to pass as the OpenAI `base_url`."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{self._runner.addresses[0][1]}/v1"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _models(self, request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "mock"}]})
+
+    def _request_rng(self, body: dict) -> random.Random:
+        """Randomness for one reply, derived from the request, so concurrent runs get the same
+        answers whatever order their requests arrive in."""
+        key = zlib.crc32(json.dumps([body.get("model"), body.get("messages", [])], sort_keys=True).encode())
+        # the same request sent again (several persona batches from one prompt) gets a new answer
+        count = self._answered[key] = self._answered.get(key, 0) + 1
+        return random.Random(f"{self.seed}:{key}:{count}")
+
+    def _reply(self, body: dict) -> tuple[str | None, dict | None]:
+        """(text, tool call) the mock answers with."""
+        messages = body.get("messages", [])
+        prompt = messages[0].get("content", "") if messages and isinstance(messages[0].get("content"), str) else ""
+        pipeline_reply = self._pipeline_reply(prompt, self._request_rng(body))
+        if pipeline_reply is not None:
+            return json.dumps(pipeline_reply), None
+        if "You are role-playing as" in prompt:
+            return self._persona_reply(prompt, messages), None
+        tools = {t["function"]["name"] for t in body.get("tools", []) if t.get("type") == "function"}
+        last = messages[-1] if messages else {}
+        if last.get("role") == "user" and tools:
+            content = last.get("content")
+            text = content if isinstance(content, str) else " ".join(
+                part.get("text", "") for part in content or [] if isinstance(part, dict)
+            )
+            for pattern, name, arguments in TOOL_TRIGGERS:
+                if name in tools and pattern.search(text):
+                    return None, {"id": f"call_{uuid.uuid4().hex[:12]}", "name": name, "arguments": json.dumps(arguments)}
+        return " ".join(REPLY_WORDS[:self.reply_words]) + ".", None
+
+    @staticmethod
+    def _persona_reply(prompt: str, messages: list) -> str:
+        """A simulated debtor's next line; the same persona always ends its call the same way at the same turn."""
+        seed = zlib.crc32(prompt.encode())
+        ending = PERSONA_ENDINGS[seed % len(PERSONA_ENDINGS)]
+        ending_turn = 1 + seed // len(PERSONA_ENDINGS) % 6
+        turn = sum(1 for m in messages if m.get("role") == "assistant")
+        if ending is None:
+            return PERSONA_LINES[turn % len(PERSONA_LINES)]
+        if turn >= ending_turn:
+            return ending
+        if ending_turn - turn <= 2:
+            return NEGOTIATION_LINE
+        return PERSONA_LINES[turn % len(PERSONA_LINES)]
+
+    def _pipeline_reply(self, prompt: str, rng: random.Random) -> dict | None:
+        """JSON answers to the pipeline's structured prompts, recognised by their wording."""
+        batch = re.search(r"Create (\d+) brief", prompt)
+        if batch:
+            # stratified batches list one numbered target per profile; follow them like a model would
+            targets = dict(re.findall(r"^\s*(\d+)\. (attitude: .+)$", prompt, re.M))
+            personalities = []
+            for i in range(int(batch.group(1))):
+                traits = dict(part.split(": ", 1) for part in targets[str(i + 1)].split("; ")) if targets else {}
+                personalities.append({
+                    "name": f"{rng.choice(FIRST_NAMES)} {uuid.UUID(int=rng.getrandbits(128)).hex[:6]}",
+                    "age": rng.randint(21, 70),
+                    "occupation": rng.choice(OCCUPATIONS),
+                    "background": f"They {traits.get('hardship cause') or rng.choice(CAUSES)} and fell behind on payments.",
+                    "financial_situation": traits.get("financial situation") or "Struggling to cover rent and groceries.",
+                    "attitude": traits.get("attitude") or rng.choice(ATTITUDES),
+                    "starting_line": "Hello? Who is this?",
+                })
+            return {"personalities": personalities}
+        if "You are grading one conversation" in prompt:
+            return {
+                "negotiation_effectiveness": rng.randint(3, 9),
+                "response_relevance": rng.randint(3, 9),
+                "outcome": rng.choice(("payment_plan", "callback", "refused", "unresolved")),
+                "failure_reasons": rng.sample(("too_pushy", "too_verbose", "no_payment_options", "repetitive"), 1),
+                "worst_moment": "The agent repeated the balance twice.",
+            }
+        if '{"scripts":' in prompt:
+            count = int(re.search(r"Produce (\d+)", prompt).group(1))
+            return {"scripts": [
+                f"You are Alex, a polite collections agent. Revision {i + 1}: offer a payment plan early. "
+                "You are speaking with {customer_name} about account {account_number}."
+                for i in range(count)
+            ]}
+        if "Estimate the impact" in prompt:
+            reply = {
+                "suggestions": [{"suggestion": "Offer a payment plan earlier.", "reason": "Most calls ended unresolved."}],
+                "expected_scores_after_improvement": {"negotiation_effectiveness": 8, "response_relevance": 8},
+            }
+            if "Rate the agent's performance" in prompt:
+                reply["current_scores"] = {"negotiation_effectiveness": 6, "response_relevance": 7}
+            return reply
+        return None
+
+    @staticmethod
+    def _usage(body: dict, text: str | None) -> dict:
+        prompt = sum(len(json.dumps(m)) for m in body.get("messages", [])) // 4
+        completion = len(text or "") // 4 + 1
+        return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+    def _completion(self, body: dict) -> dict:
+        """Non-streaming chat completion for `body`, with its usage counted."""
+        text, tool_call = self._reply(body)
+        usage = self._usage(body, text)
+        self.prompt_tokens += usage["prompt_tokens"]
+        self.completion_tokens += usage["completion_tokens"]
+        message = {"role": "assistant", "content": text}
+        if tool_call:
+            message["tool_calls"] = [{
+                "id": tool_call["id"],
+                "type": "function",
+                "function": {"name": tool_call["name"], "arguments": tool_call["arguments"]},
+            }]
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+            "usage": usage,
+        }
+
+    def _file(self, content: bytes, filename: str, purpose: str) -> dict:
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        self.files[file_id] = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+            "content": content,
+        }
+        return self.files[file_id]
+
+    @staticmethod
+    def _file_object(file: dict) -> dict:
+        return {key: value for key, value in file.items() if key != "content"}
+
+    async def _upload_file(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        upload = form["file"]
+        return web.json_response(self._file_object(self._file(upload.file.read(), upload.filename, form.get("purpose", "batch"))))
+
+    async def _file_content(self, request: web.Request) -> web.Response:
+        file = self.files.get(request.match_info["file_id"])
+        if file is None:
+            return web.json_response({"error": {"message": "no such file", "type": "invalid_request_error"}}, status=404)
+        return web.Response(body=file["content"], content_type="application/octet-stream")
+
+    async def _create_batch(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if body.get("input_file_id") not in self.files:
+            return web.json_response({"error": {"message": "no such file", "type": "invalid_request_error"}}, status=400)
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        self.batches_created += 1
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body["completion_window"],
+            "status": "validating",
+            "created_at": int(time.time()),
+            "metadata": body.get("metadata"),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+        }
+        asyncio.get_running_loop().create_task(self._run_batch(batch_id))
+        return web.json_response(self.batches[batch_id])
+
+    async def _run_batch(self, batch_id: str):
+        batch = self.batches[batch_id]
+        lines = [json.loads(line) for line in self.files[batch["input_file_id"]]["content"].splitlines() if line.strip()]
+        batch["status"] = "in_progress"
+        batch["request_counts"]["total"] = len(lines)
+        self.batch_requests += len(lines)
+        await asyncio.sleep(self.batch_latency)
+        outputs, errors = [], []
+        for line in lines:
+            result = {"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": line["custom_id"]}
+            if self.rng.random() < self.error_rate:
+                errors.append({**result, "response": {"status_code": 500, "body": {
+                    "error": {"message": "injected failure", "type": "server_error"}
+                }}, "error": None})
+                continue
+            completion = self._completion(line["body"])
+            outputs.append({**result, "response": {"status_code": 200, "request_id": completion["id"], "body": completion}, "error": None})
+
+        def _jsonl(records: list) -> bytes:
+            return "".join(json.dumps(record) + "\n" for record in records).encode()
+
+        batch["output_file_id"] = self._file(_jsonl(outputs), f"{batch_id}_output.jsonl", "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = self._file(_jsonl(errors), f"{batch_id}_error.jsonl", "batch_output")["id"]
+        batch["request_counts"].update(completed=len(outputs), failed=len(errors))
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+
+    async def _retrieve_batch(self, request: web.Request) -> web.Response:
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            return web.json_response({"error": {"message": "no such batch", "type": "invalid_request_error"}}, status=404)
+        return web.json_response(batch)
+
+    async def _chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        body = await request.json()
+        await asyncio.sleep(self.latency + self.rng.uniform(0, self.jitter))
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            status = self.rng.choice((429, 500))
+            return web.json_response(
+                {"error": {"message": "injected failure", "type": "server_error"}},
+                status=status,
+                headers={"Retry-After": "0"} if status == 429 else None,
+            )
+        if not body.get("stream"):
+            return web.json_response(self._completion(body))
+
+        text, tool_call = self._reply(body)
+        usage = self._usage(body, text)
+        self.prompt_tokens += usage["prompt_tokens"]
+        self.completion_tokens += usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "gpt-4o-mini")
+        finish_reason = "tool_calls" if tool_call else "stop"
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(choices: list, **extra):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+                **extra,
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        if tool_call:
+            await send([{"index": 0, "delta": {"role": "assistant", "tool_calls": [{
+                "index": 0,
+                "id": tool_call["id"],
+                "type": "function",
+                "function": {"name": tool_call["name"], "arguments": tool_call["arguments"]},
+            }]}, "finish_reason": None}])
+        else:
+            for i, word in enumerate(text.split(" ")):
+                delta = {"content": word if i == 0 else f" {word}"}
+                if i == 0:
+                    delta["role"] = "assistant"
+                await send([{"index": 0, "delta": delta, "finish_reason": None}])
+        await send([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+        if body.get("stream_options", {}).get("include_usage"):
+            await send([], usage=usage)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible chat completions stand-in.")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before every reply")
+    parser.add_argument("--jitter", type=float, default=0.15, help="random extra latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failed with 429/500")
+    parser.add_argument("--reply-words", type=int, default=20, help="words per plain-text reply")
+    parser.add_argument("--batch-latency", type=float, default=0.5, help="seconds a batch job takes to complete")
+    return parser.parse_args()
+
+
+async def main(args):
+    mock = MockOpenAI(args.latency, args.jitter, args.error_rate, args.reply_words, batch_latency=args.batch_latency)
+    url = await mock.start(port=args.port)
+    logging.info(f"mock OpenAI listening on {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await mock.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,62 @@
+import hashlib
+import json
+import logging
+import os
+import random
+from personality_generator import PersonalityGenerator, personality_fingerprint
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_POOL_PATH = ".pipeline_cache/persona_pool.jsonl"
+
+
+class PersonaPool:
+    """Append-only JSONL store of generated personalities, keyed by generator prompt and version."""
+
+    def __init__(self, path: str = DEFAULT_POOL_PATH):
+        self.path = path
+
+    @staticmethod
+    def pool_key(generator: PersonalityGenerator) -> str:
+        return hashlib.sha256(generator.prompt_id.encode()).hexdigest()[:16]
+
+    def load(self, key: str) -> list:
+        """Returns every pooled personality (as a dict) stored under `key`."""
+        if not os.path.exists(self.path):
+            return []
+        personalities = []
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a crash mid-append can leave a partial last line
+                    continue
+                if record.get("key") == key:
+                    personalities.append(record["personality"])
+        return personalities
+
+    def add(self, key: str, personalities: list):
+        """Appends personalities (JSON strings) to the pool."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            for personality in personalities:
+                f.write(json.dumps({"key": key, "personality": json.loads(personality)}) + "\n")
+
+    async def get(self, generator: PersonalityGenerator, n: int, seed: int | None = None) -> list:
+        """Samples `n` personalities (as JSON strings), generating only the shortfall."""
+        key = self.pool_key(generator)
+        pooled = self.load(key)
+        logging.info(f"persona pool has {len(pooled)} personalities for key {key}")
+
+        if len(pooled) < n:
+            fresh = await generator.generate_many(
+                n - len(pooled),
+                exclude={personality_fingerprint(p) for p in pooled},
+            )
+            self.add(key, fresh)
+            pooled.extend(json.loads(p) for p in fresh)
+
+        sample = random.Random(seed).sample(pooled, min(n, len(pooled)))
+        return [json.dumps(p) for p in sample]
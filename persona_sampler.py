@@ -0,0 +1,223 @@
+import hashlib
+import itertools
+import json
+import logging
+import math
+import random
+from collections import Counter
+import numpy as np
+from persona_pool import PersonaPool
+from personality_generator import PersonalityGenerator
+from transcript_features import hashed_bow
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# behavioural dimensions personas are stratified over
+DIMENSIONS = {
+    "attitude": ("cooperative", "evasive", "anxious", "apologetic", "defensive", "indifferent"),
+    "hardship_cause": (
+        "job_loss", "medical_emergency", "divorce_or_separation", "business_failure",
+        "overspending", "caring_for_family", "fraud_or_identity_theft",
+    ),
+    "financial_situation": ("can_pay_in_full_soon", "can_pay_partially", "no_income_right_now", "juggling_multiple_debts"),
+    "language_style": ("brief_and_terse", "rambling", "formal", "slang_heavy", "non_native_speaker"),
+    "hostility": ("calm", "irritated", "hostile"),
+}
+
+# cosine similarity of two personas' hashed bag-of-words above which the newer one is a near-duplicate
+DEFAULT_SIMILARITY_THRESHOLD = 0.9
+# random trait combinations scored for every planned persona
+CANDIDATES_PER_PICK = 256
+
+
+def persona_text(personality: dict) -> str:
+    """What the model wrote for a persona, minus the name: two personas this similar play out the same."""
+    return " ".join(str(v) for k, v in personality.items() if k not in ("name", "traits"))
+
+
+class PersonaSampler:
+    """Plans personas over DIMENSIONS so every conversation covers as much new behaviour as possible.
+
+    Each dimension value has a target share (uniform unless `quotas` says otherwise,
+    e.g. `{"hostility": {"hostile": 0.5, "irritated": 0.3, "calm": 0.2}}`). Personas are
+    picked greedily: the trait combination that fills the largest quota deficits and
+    the most still-empty cells (value pairs of two dimensions) comes next. Generated
+    personas too similar to one already kept are rejected and re-generated.
+    """
+
+    def __init__(
+        self,
+        dimensions: dict | None = None,
+        quotas: dict | None = None,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        seed: int | None = None,
+    ):
+        self.dimensions = dimensions or DIMENSIONS
+        self.quotas = quotas or {}
+        unknown = set(self.quotas) - set(self.dimensions)
+        if unknown:
+            raise ValueError(f"quotas for unknown dimensions: {', '.join(sorted(unknown))}")
+        for dim, shares in self.quotas.items():
+            unknown = set(shares) - set(self.dimensions[dim])
+            if unknown:
+                raise ValueError(
+                    f"quotas for unknown {dim} values: {', '.join(sorted(unknown))} "
+                    f"(expected {', '.join(self.dimensions[dim])})"
+                )
+            if any(share < 0 for share in shares.values()) or sum(shares.values()) <= 0:
+                raise ValueError(f"quotas for {dim} must be non-negative and not all zero")
+        self.similarity_threshold = similarity_threshold
+        self.rng = random.Random(seed)
+        self.duplicates_rejected = 0
+
+    def targets(self, n: int) -> dict:
+        """Target count of every dimension value for `n` personas."""
+        targets = {}
+        for dim, values in self.dimensions.items():
+            shares = self.quotas.get(dim) or {value: 1.0 for value in values}
+            total = sum(shares.get(value, 0.0) for value in values) or 1.0
+            targets[dim] = {value: n * shares.get(value, 0.0) / total for value in values}
+        return targets
+
+    def plan(self, n: int) -> list:
+        """Trait dicts for `n` personas."""
+        targets = self.targets(n)
+        counts = {dim: Counter() for dim in self.dimensions}
+        covered = set()
+        planned = []
+        for _ in range(n):
+            best = self._pick(targets, counts, covered)
+            planned.append(best)
+            for dim, value in best.items():
+                counts[dim][value] += 1
+            covered.update(self._cells(best))
+        return planned
+
+    def _pick(self, targets: dict, counts: dict, covered: set, exclude: tuple | None = None) -> dict:
+        """The best of CANDIDATES_PER_PICK random trait combinations (other than `exclude`)."""
+        allowed = self._allowed()
+        candidates = [
+            {dim: self.rng.choice(values) for dim, values in allowed.items()}
+            for _ in range(CANDIDATES_PER_PICK)
+        ]
+        candidates = [c for c in candidates if self._traits_key(c) != exclude] or candidates
+        return max(candidates, key=lambda traits: self._gain(traits, targets, counts, covered))
+
+    def _allowed(self) -> dict:
+        """Values of every dimension whose quota is not zero."""
+        targets = self.targets(1)
+        return {dim: [v for v in values if targets[dim][v] > 0] for dim, values in self.dimensions.items()}
+
+    def _gain(self, traits: dict, targets: dict, counts: dict, covered: set) -> float:
+        deficit = sum(max(0.0, targets[dim][value] - counts[dim][value]) for dim, value in traits.items())
+        # a value already at its quota costs, so quotas hold even once every cell is covered
+        excess = sum(max(0.0, counts[dim][value] + 1 - targets[dim][value]) for dim, value in traits.items())
+        new_cells = sum(cell not in covered for cell in self._cells(traits))
+        return deficit - excess + 0.5 * new_cells
+
+    @staticmethod
+    def _cells(traits: dict) -> list:
+        return [((a, traits[a]), (b, traits[b])) for a, b in itertools.combinations(sorted(traits), 2)]
+
+    def pool_key(self, generator: PersonalityGenerator) -> str:
+        spec = json.dumps({"prompt": generator.stratified_prompt_id, "dimensions": self.dimensions}, sort_keys=True)
+        return hashlib.sha256(spec.encode()).hexdigest()[:16]
+
+    async def sample(self, generator: PersonalityGenerator, pool: PersonaPool, n: int, max_rounds: int = 5) -> list:
+        """`n` personalities (as JSON strings) following the plan, reusing pooled ones with the same traits."""
+        key = self.pool_key(generator)
+        pooled = pool.load(key)
+        available = {}
+        for personality in pooled:
+            available.setdefault(self._traits_key(personality.get("traits", {})), []).append(personality)
+        for matches in available.values():
+            self.rng.shuffle(matches)
+
+        planned = self.plan(n)
+        chosen = [None] * n
+        for i, traits in enumerate(planned):
+            matches = available.get(self._traits_key(traits))
+            if matches:
+                chosen[i] = matches.pop()
+        reused = sum(p is not None for p in chosen)
+
+        kept = [p for p in chosen if p is not None]
+        embeddings = hashed_bow([persona_text(p) for p in kept]) if kept else np.zeros((0, 1))
+        for round_index in range(max_rounds):
+            missing = [i for i, p in enumerate(chosen) if p is None]
+            if not missing:
+                break
+            fresh = await generator.generate_for_traits(
+                [planned[i] for i in missing], cache_salt=f"{key}:{len(pooled)}:{round_index}"
+            )
+            accepted = []
+            for i, personality in zip(missing, fresh):
+                if personality is None:
+                    continue
+                vector = hashed_bow([persona_text(personality)])
+                if len(embeddings) and float((embeddings @ vector[0]).max()) >= self.similarity_threshold:
+                    # the model keeps writing the same persona for this combination: try another one
+                    self.duplicates_rejected += 1
+                    planned[i] = self._replan(planned, chosen, i)
+                    continue
+                embeddings = np.vstack([embeddings, vector]) if len(embeddings) else vector
+                chosen[i] = personality
+                accepted.append(personality)
+            pool.add(key, [json.dumps(p) for p in accepted])
+
+        personalities = [p for p in chosen if p is not None]
+        logging.info(
+            f"persona sampler: {reused} reused from the pool, {len(personalities) - reused} generated, "
+            f"{self.duplicates_rejected} near-duplicates rejected"
+        )
+        if len(personalities) < n:
+            logging.warning(f"Only sampled {len(personalities)}/{n} personalities")
+        return [json.dumps(p) for p in personalities]
+
+    def _replan(self, planned: list, chosen: list, index: int) -> dict:
+        """A new trait combination for slot `index`, given what the other slots already hold."""
+        others = [chosen[i] and chosen[i].get("traits") or planned[i] for i in range(len(planned)) if i != index]
+        counts = {dim: Counter(t[dim] for t in others) for dim in self.dimensions}
+        covered = {cell for t in others for cell in self._cells(t)}
+        return self._pick(self.targets(len(planned)), counts, covered, exclude=self._traits_key(planned[index]))
+
+    def _traits_key(self, traits: dict) -> tuple:
+        return tuple(traits.get(dim) for dim in self.dimensions)
+
+    def coverage(self, personalities: list) -> dict:
+        """Which dimension values and value pairs the personas (JSON strings or dicts) cover, and which are empty."""
+        traits = [(json.loads(p) if isinstance(p, str) else p).get("traits", {}) for p in personalities]
+        targets = self.targets(len(traits))
+        dimensions = {}
+        for dim, values in self.dimensions.items():
+            counts = Counter(t.get(dim) for t in traits)
+            dimensions[dim] = {
+                value: {"count": counts[value], "target": math.ceil(targets[dim][value])} for value in values
+            }
+        covered = {cell for t in traits if len(t) == len(self.dimensions) for cell in self._cells(t)}
+        allowed = self._allowed()
+        all_cells = [
+            ((a, va), (b, vb))
+            for a, b in itertools.combinations(sorted(allowed), 2)
+            for va in allowed[a] for vb in allowed[b]
+        ]
+        empty = [f"{a}={va} & {b}={vb}" for (a, va), (b, vb) in all_cells if ((a, va), (b, vb)) not in covered]
+        return {
+            "personas": len(traits),
+            "dimensions": dimensions,
+            "empty_values": [
+                f"{dim}={value}" for dim, values in dimensions.items() for value, c in values.items()
+                if not c["count"] and c["target"]
+            ],
+            "pair_cells": {"covered": len(all_cells) - len(empty), "total": len(all_cells)},
+            "empty_pair_cells": empty,
+            "duplicates_rejected": self.duplicates_rejected,
+        }
+
+
+def load_quotas(path: str | None) -> dict:
+    if not path:
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
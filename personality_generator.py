@@ -1,21 +1,26 @@
-
+import asyncio
+import json
 import logging
-from openai import AsyncOpenAI
+from llm_client import LLMClient
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-class PersonalityGenerator:
-    def __init__(self, api_key: str):
-        self.client = AsyncOpenAI(api_key=api_key)
+# bump whenever the prompts or the schema change so pooled personas are not mixed across versions
+GENERATOR_VERSION = "1"
 
-    async def generate(self):
-        """Generates a single, random debtor personality."""
-        logging.info("Generating a new debtor personality...")
-        
-        prompt = """
-        Create a brief, realistic personality profile for a credit card defaulter.
-        Include the following details:
+# field name -> expected type of every generated personality
+PERSONALITY_SCHEMA = {
+    "name": str,
+    "age": int,
+    "occupation": str,
+    "background": str,
+    "financial_situation": str,
+    "attitude": str,
+    "starting_line": str,
+}
+
+PERSONALITY_DETAILS = """
         - Name
         - Age
         - Occupation
@@ -23,16 +28,224 @@ class PersonalityGenerator:
         - Their current financial situation (e.g., struggling, looking for work).
         - Their attitude towards the debt (e.g., cooperative, evasive, anxious).
         - A starting line for the conversation (what they would say when they pick up the phone).
-        
+"""
+
+BATCH_PROMPT = """
+        Create {count} brief, realistic and clearly different personality profiles for credit card defaulters.
+        Vary age, occupation, the reason for defaulting and the attitude towards the debt.
+        Include the following details for each one:
+        {details}
+        Present the output as a JSON object of the form
+        {{"personalities": [{{"name": str, "age": int, "occupation": str, "background": str,
+        "financial_situation": str, "attitude": str, "starting_line": str}}, ...]}}
+        """
+
+STRATIFIED_PROMPT = """
+        Create {count} brief, realistic personality profiles for credit card defaulters, one per numbered
+        target below, in the same order. Each profile must clearly show its target's attitude, hardship cause,
+        financial situation, way of speaking and hostility in the background, the financial situation and
+        the starting line.
+        {targets}
+        Include the following details for each one:
+        {details}
+        Present the output as a JSON object of the form
+        {{"personalities": [{{"name": str, "age": int, "occupation": str, "background": str,
+        "financial_situation": str, "attitude": str, "starting_line": str}}, ...]}}
+        """
+
+
+def validate_personality(data) -> dict | None:
+    """Returns the personality normalised to PERSONALITY_SCHEMA, or None if it does not fit."""
+    if not isinstance(data, dict):
+        return None
+    personality = {}
+    for field, field_type in PERSONALITY_SCHEMA.items():
+        value = data.get(field)
+        if field_type is int:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                return None
+        elif not isinstance(value, str) or not value.strip():
+            return None
+        else:
+            value = value.strip()
+        personality[field] = value
+    return personality
+
+
+def personality_fingerprint(personality: dict) -> str:
+    """Key used to spot the same persona coming back twice."""
+    return "|".join(
+        " ".join(str(personality[field]).lower().split())
+        for field in ("name", "occupation", "background")
+    )
+
+
+class PersonalityGenerator:
+    def __init__(self, api_key: str, llm: LLMClient | None = None, batch_api: bool = False):
+        self.llm = llm or LLMClient(api_key)
+        # submit each round of persona batches as one Batch API job instead of concurrent calls
+        self.batch_api = batch_api
+
+    @property
+    def prompt_id(self) -> str:
+        """Identifies the prompt (as sent, with the persona details) and version the personas were produced with."""
+        return f"v{GENERATOR_VERSION}:{BATCH_PROMPT}:{PERSONALITY_DETAILS}"
+
+    @property
+    def stratified_prompt_id(self) -> str:
+        return f"v{GENERATOR_VERSION}:{STRATIFIED_PROMPT}:{PERSONALITY_DETAILS}"
+
+    async def generate(self):
+        """Generates a single, random debtor personality."""
+        logging.info("Generating a new debtor personality...")
+
+        prompt = f"""
+        Create a brief, realistic personality profile for a credit card defaulter.
+        Include the following details:
+        {PERSONALITY_DETAILS}
         Present the output as a JSON object.
         """
 
-        response = await self.client.chat.completions.create(
+        response = await self.llm.chat(
+            stage="persona",
             model="gpt-4o-mini",
             messages=[{"role": "system", "content": prompt}],
             response_format={"type": "json_object"}
         )
-        
+
         personality = response.choices[0].message.content
         logging.info(f"Generated personality: {personality}")
         return personality
+
+    async def generate_many(self, n: int, batch_size: int = 10, max_rounds: int = 5, exclude: set | None = None):
+        """Generates `n` distinct debtor personalities, `batch_size` per API call.
+
+        Returns them as JSON strings, like `generate()`. Profiles whose fingerprint is
+        already in `exclude` (or was produced earlier in this call) are dropped.
+        """
+        logging.info(f"Generating {n} debtor personalities in batches of {batch_size}...")
+        seen = set(exclude or ())
+        personalities = []
+
+        for round_index in range(max_rounds):
+            missing = n - len(personalities)
+            if missing <= 0:
+                break
+            sizes = [batch_size] * (missing // batch_size)
+            if missing % batch_size:
+                sizes.append(missing % batch_size)
+            salts = [f"{len(seen)}:{round_index}:{batch_index}" for batch_index in range(len(sizes))]
+            if self.batch_api:
+                responses = await self.llm.chat_batch(
+                    [self._batch_request(size) for size in sizes], stage="persona", cache_salts=salts
+                )
+                batches = [self._parse_batch(response) for response in responses]
+            else:
+                batches = await asyncio.gather(*(
+                    self._generate_batch(size, cache_salt=salt) for size, salt in zip(sizes, salts)
+                ))
+
+            for batch in batches:
+                for personality in batch:
+                    fingerprint = personality_fingerprint(personality)
+                    if fingerprint in seen:
+                        continue
+                    seen.add(fingerprint)
+                    personalities.append(personality)
+
+        if len(personalities) < n:
+            logging.warning(f"Only generated {len(personalities)}/{n} distinct personalities")
+        return [json.dumps(p) for p in personalities[:n]]
+
+    @staticmethod
+    def _batch_request(count: int) -> dict:
+        return dict(
+            model="gpt-4o-mini",
+            messages=[{
+                "role": "system",
+                "content": BATCH_PROMPT.format(count=count, details=PERSONALITY_DETAILS),
+            }],
+            response_format={"type": "json_object"}
+        )
+
+    async def _generate_batch(self, count: int, cache_salt: str | None = None) -> list:
+        """Asks for `count` profiles in one structured call and keeps the valid ones."""
+        # identical batch prompts must not all be answered by the same cached response
+        response = await self.llm.chat(cache_salt=cache_salt, stage="persona", **self._batch_request(count))
+        return self._parse_batch(response)
+
+    @staticmethod
+    def _parse_batch(response) -> list:
+        if response is None:
+            return []
+        try:
+            data = json.loads(response.choices[0].message.content)
+        except json.JSONDecodeError:
+            logging.warning("Discarding personality batch that is not valid JSON")
+            return []
+
+        raw = data.get("personalities", []) if isinstance(data, dict) else []
+        valid = [p for p in map(validate_personality, raw) if p is not None]
+        if len(valid) < len(raw):
+            logging.warning(f"Discarded {len(raw) - len(valid)} personalities that did not match the schema")
+        return valid
+
+    async def generate_for_traits(self, targets: list, batch_size: int = 10, cache_salt: str = "") -> list:
+        """Generates one personality (as a dict) per target trait dict, in the same order.
+
+        The traits are stored on the personality under "traits", so the simulated persona
+        plays them out. Entries whose profile was missing or invalid are None.
+        """
+        batches = [targets[i:i + batch_size] for i in range(0, len(targets), batch_size)]
+        if self.batch_api:
+            responses = await self.llm.chat_batch(
+                [self._traits_request(batch) for batch in batches],
+                stage="persona",
+                cache_salts=[f"{cache_salt}:{i}" for i in range(len(batches))],
+            )
+            results = [self._parse_traits_batch(batch, response) for batch, response in zip(batches, responses)]
+        else:
+            results = await asyncio.gather(*(
+                self._generate_traits_batch(batch, cache_salt=f"{cache_salt}:{i}") for i, batch in enumerate(batches)
+            ))
+        return [personality for batch in results for personality in batch]
+
+    @staticmethod
+    def _traits_request(targets: list) -> dict:
+        lines = "\n".join(
+            f"        {i + 1}. " + "; ".join(f"{dim.replace('_', ' ')}: {value.replace('_', ' ')}" for dim, value in traits.items())
+            for i, traits in enumerate(targets)
+        )
+        return dict(
+            model="gpt-4o-mini",
+            messages=[{
+                "role": "system",
+                "content": STRATIFIED_PROMPT.format(count=len(targets), targets=lines.strip(), details=PERSONALITY_DETAILS),
+            }],
+            response_format={"type": "json_object"}
+        )
+
+    async def _generate_traits_batch(self, targets: list, cache_salt: str | None = None) -> list:
+        response = await self.llm.chat(cache_salt=cache_salt, stage="persona", **self._traits_request(targets))
+        return self._parse_traits_batch(targets, response)
+
+    @staticmethod
+    def _parse_traits_batch(targets: list, response) -> list:
+        if response is None:
+            return [None] * len(targets)
+        try:
+            data = json.loads(response.choices[0].message.content)
+        except json.JSONDecodeError:
+            logging.warning("Discarding personality batch that is not valid JSON")
+            return [None] * len(targets)
+
+        raw = data.get("personalities", []) if isinstance(data, dict) else []
+        personalities = []
+        for traits, candidate in zip(targets, [*raw, *[None] * len(targets)]):
+            personality = validate_personality(candidate)
+            if personality is not None:
+                personality["traits"] = dict(traits)
+            personalities.append(personality)
+        return personalities
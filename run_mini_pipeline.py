@@ -1,11 +1,33 @@
-
+import argparse
 import asyncio
 import os
 import logging
+from collections import Counter
 from dotenv import load_dotenv
+from context_strategy import make_context_strategy
+from iterative_optimizer import IterativeOptimizer
+from llm_cache import CACHE_MODES, DEFAULT_CACHE_PATH, ResponseCache
+from llm_client import (
+    DEFAULT_BATCH_POLL_INTERVAL,
+    DEFAULT_KEEPALIVE_EXPIRY,
+    DEFAULT_MAX_CONNECTIONS,
+    LLMClient,
+    make_http_client,
+    parse_routes,
+)
+from persona_pool import DEFAULT_POOL_PATH, PersonaPool
+from run_store import DEFAULT_RUNS_DIR, RESUME_KEYS, RunStore
 from personality_generator import PersonalityGenerator
+from persona_sampler import DEFAULT_SIMILARITY_THRESHOLD, PersonaSampler, load_quotas
 from chat_simulator import ChatSimulator
 from script_optimizer import ScriptOptimizer
+from score_cache import DEFAULT_SCORE_CACHE_PATH, ScoreCache
+from script_registry import ScriptRegistry
+from scheduler import RateLimiter, SimulationScheduler
+from shard_runner import DEFAULT_SHARD_SIZE, run_sharded
+from transcript_sink import read_conversations
+from transcript_features import extract_features, select_for_judging, summarize_features
+from usage_tracker import STAGES, BudgetExceededError, UsageTracker, parse_stage_budgets
 import json
 
 # Configure logging
@@ -16,62 +38,345 @@ load_dotenv(".env.local")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 def get_original_script():
-    """Reads the original agent script from agent.py."""
-    # This is a simplified way to get the script.
-    # In a real application, you would parse the file more robustly.
-    with open("agent.py", "r") as f:
-        lines = f.readlines()
-        script_started = False
-        script_lines = []
-        for line in lines:
-            if "super().__init__(" in line:
-                script_started = True
-            if script_started:
-                script_lines.append(line)
-            if ")" in line and script_started and "super().__init__(" not in line:
-                break
-    return "".join(script_lines)
-
-async def main():
+    """Returns the template of the active agent script from the script registry."""
+    return ScriptRegistry().active().source
+
+def parse_args(argv: list | None = None):
+    parser = argparse.ArgumentParser(description="Simulate conversations and suggest script improvements.")
+    parser.add_argument("--num-simulations", type=int, default=5, help="number of personas to simulate")
+    parser.add_argument("--max-turns", type=int, default=7, help="agent/persona exchanges per simulation")
+    parser.add_argument("--max-extra-turns", type=int, default=3,
+                        help="exchanges a simulation may run past --max-turns while a negotiation is still going on")
+    parser.add_argument("--context-strategy", choices=("full", "window", "summary"), default="full",
+                        help="how much conversation history each simulated turn resends")
+    parser.add_argument("--context-budget", type=int, default=None, help="prompt token budget per simulated turn")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="simulations running at the same time")
+    parser.add_argument("--rpm", type=float, default=500, help="OpenAI requests per minute limit")
+    parser.add_argument("--tpm", type=float, default=200_000, help="OpenAI tokens per minute limit")
+    parser.add_argument("--persona-pool", default=DEFAULT_POOL_PATH, help="JSONL file personas are reused from")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for planning and sampling personas; a fixed seed keeps runs replayable from the cache")
+    parser.add_argument("--persona-sampling", choices=("stratified", "random"), default="stratified",
+                        help="plan personas over attitude, hardship, finances, language and hostility, or use one free prompt")
+    parser.add_argument("--persona-quotas", default=None,
+                        help='JSON file of target shares per dimension value, e.g. {"hostility": {"hostile": 0.5, ...}}')
+    parser.add_argument("--similarity-threshold", type=float, default=DEFAULT_SIMILARITY_THRESHOLD,
+                        help="reject generated personas at least this similar to one already kept")
+    parser.add_argument("--coverage-report", default=None, help="JSON file the persona coverage report is written to")
+    parser.add_argument("--scoring", choices=("single", "map-reduce"), default="map-reduce",
+                        help="score all transcripts in one prompt, or each separately and optimize on the digest")
+    parser.add_argument("--judge-limit", type=int, default=None,
+                        help="only send the N lowest pre-scored conversations to the LLM judge")
+    parser.add_argument("--score-cache", default=DEFAULT_SCORE_CACHE_PATH, help="JSONL file of per-conversation scores")
+    parser.add_argument("--iterations", type=int, default=0,
+                        help="self-improvement rounds; 0 only suggests improvements for the current script")
+    parser.add_argument("--candidates", type=int, default=4, help="candidate scripts proposed per round")
+    parser.add_argument("--max-simulation-budget", type=int, default=None,
+                        help="stop the self-improvement loop after this many simulations")
+    parser.add_argument("--output", default="optimized_script.txt", help="where the best script is written")
+    parser.add_argument("--production-transcripts", default=None,
+                        help="transcript directory of real calls (see transcript_sink.py) to score with the simulations")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"),
+                        help="OpenAI-compatible endpoint to use instead of the OpenAI API")
+    parser.add_argument("--route", action="append", default=[], metavar="STAGE=MODEL[@BASE_URL]",
+                        help=f"send one stage to another model and/or endpoint, repeatable; stages: {', '.join(STAGES)}")
+    parser.add_argument("--routes", default=None, help="JSON routing table, see README")
+    parser.add_argument("--max-connections", type=int, default=DEFAULT_MAX_CONNECTIONS,
+                        help="connection pool size of the shared HTTP client")
+    parser.add_argument("--keepalive-expiry", type=float, default=DEFAULT_KEEPALIVE_EXPIRY,
+                        help="seconds idle connections are kept open")
+    parser.add_argument("--no-http2", action="store_true", help="use HTTP/1.1 only")
+    parser.add_argument("--run-budget", type=float, default=None, help="USD the whole run may spend on API calls")
+    parser.add_argument("--stage-budget", action="append", default=[], metavar="STAGE=USD",
+                        help=f"USD one stage may spend, repeatable; stages: {', '.join(STAGES)}")
+    parser.add_argument("--cost-report", default=None, help="JSON file the token and cost report is written to")
+    parser.add_argument("--run-dir", default=None,
+                        help=f"directory the run checkpoints into (default: a new one under {DEFAULT_RUNS_DIR}/)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the run in --run-dir (default: the latest run), skipping finished work")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="run the simulations in N worker processes through the run's work queue; "
+                             "0 only queues them for workers started with shard_runner.py on other hosts")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="simulations per work queue shard")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="generate personas, simulate in lockstep (one batch job per turn) and score through the Batch API")
+    parser.add_argument("--batch-poll-interval", type=float, default=DEFAULT_BATCH_POLL_INTERVAL,
+                        help="seconds between status checks of a running batch job")
+    parser.add_argument("--cache-mode", choices=CACHE_MODES, default="read-through",
+                        help="LLM response cache mode; replay runs fully offline")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help="SQLite file for cached LLM responses")
+    args = parser.parse_args(argv)
+    if args.batch_api and args.workers is not None:
+        parser.error("--batch-api simulates in lockstep in one process and cannot be combined with --workers")
+    # kept as given, to pass on to shard workers
+    args.route_specs = list(args.route)
+    try:
+        args.stage_budget = parse_stage_budgets(args.stage_budget)
+        args.route = parse_routes(args.route, args.routes)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def report_coverage(coverage: dict, path: str | None):
+    cells = coverage["pair_cells"]
+    logging.info(
+        f"persona coverage: {cells['covered']}/{cells['total']} trait pairs covered, "
+        f"empty values: {', '.join(coverage['empty_values']) or 'none'}"
+    )
+    if path:
+        with open(path, "w") as f:
+            json.dump(coverage, f, indent=4)
+        logging.info(f"coverage report written to {path}")
+
+
+def report_usage(usage: UsageTracker, path: str | None):
+    usage.log_summary()
+    if path:
+        usage.write(path)
+        logging.info(f"cost report written to {path}")
+
+async def main(args):
     """Main function to run the mini pipeline."""
-    if not OPENAI_API_KEY:
+    # replay never reaches the API and local endpoints ignore the key, so neither needs one
+    if not OPENAI_API_KEY and args.cache_mode != "replay" and not args.base_url:
         logging.error("OPENAI_API_KEY not found in .env.local")
         return
+    api_key = OPENAI_API_KEY or "offline"
+
+    num_simulations = args.num_simulations
 
-    num_simulations = 5
-    all_conversation_logs = []
-
-    # 1. Initialize the components
-    personality_gen = PersonalityGenerator(api_key=OPENAI_API_KEY)
-    chat_sim = ChatSimulator(api_key=OPENAI_API_KEY)
-    script_opt = ScriptOptimizer(api_key=OPENAI_API_KEY)
-
-    # 2. Get the original agent script
-    original_script = get_original_script()
-    logging.info("--- Original Agent Script ---")
-    logging.info(original_script)
-
-    # 3. Run multiple simulations
-    for i in range(num_simulations):
-        logging.info(f"simulating person {i+1}")
-        personality_str = await personality_gen.generate()
-        conversation_log = await chat_sim.simulate(original_script, personality_str)
-        all_conversation_logs.append(conversation_log)
-    
-    logging.info("simulations complete.")
-
-    # 4. Optimize the script
-    logging.info("--- Optimizing Agent Script ---")
-    optimization_results = await script_opt.optimize(original_script, all_conversation_logs)
-
-    # 5. Display the results
-    logging.info("--- Optimization Results ---")
+    # 1. Initialize the components (one connection pool, rate limiter, response cache and usage tracker
+    # shared by every API call, whichever stage and endpoint it is routed to)
+    rate_limiter = RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    cache = ResponseCache(args.cache_path, mode=args.cache_mode) if args.cache_mode != "off" else None
+    usage = UsageTracker(run_budget=args.run_budget, stage_budgets=args.stage_budget)
+    http_client = make_http_client(
+        max_connections=args.max_connections,
+        max_keepalive=args.max_connections,
+        keepalive_expiry=args.keepalive_expiry,
+        http2=not args.no_http2,
+    )
+    llm = LLMClient(
+        api_key=api_key,
+        rate_limiter=rate_limiter,
+        cache=cache,
+        base_url=args.base_url,
+        usage=usage,
+        routes=args.route,
+        http_client=http_client,
+        batch_poll_interval=args.batch_poll_interval,
+    )
     try:
-        results = json.loads(optimization_results)
-        print(json.dumps(results, indent=4))
-    except json.JSONDecodeError:
-        logging.error("Failed to parse optimization results as JSON.")
-        print(optimization_results)
+        for stage, route in args.route.items():
+            logging.info(f"routing {stage} to {route}")
+        personality_gen = PersonalityGenerator(api_key=api_key, llm=llm, batch_api=args.batch_api)
+        chat_sim = ChatSimulator(
+            api_key=api_key,
+            llm=llm,
+            context_strategy=make_context_strategy(args.context_strategy, llm, args.context_budget),
+        )
+        script_opt = ScriptOptimizer(
+            api_key=api_key,
+            llm=llm,
+            score_cache=ScoreCache(args.score_cache),
+            max_concurrency=args.max_concurrency,
+            batch_api=args.batch_api,
+        )
+        persona_pool = PersonaPool(args.persona_pool)
+        scheduler = SimulationScheduler(max_concurrency=args.max_concurrency)
+
+        # Every finished piece of work is checkpointed, so a resumed run only does what is missing
+        config = {key: getattr(args, key) for key in RESUME_KEYS}
+        try:
+            if args.resume:
+                run_dir = args.run_dir or RunStore.latest()
+                if run_dir is None:
+                    logging.error(f"no run to resume under {DEFAULT_RUNS_DIR}/")
+                    return
+                store = RunStore.open(run_dir, config)
+                logging.info(f"resuming run {store.path}")
+            else:
+                store = RunStore.create(args.run_dir or RunStore.new_path(), config)
+                logging.info(f"checkpointing run to {store.path}")
+        except (OSError, ValueError) as e:
+            logging.error(str(e))
+            return
+
+        # 2. Get the original agent script (the one the run started with, when resuming)
+        if store.done("script"):
+            original_script = store.load_text("script")
+        else:
+            original_script = get_original_script()
+            store.save_text("script", "script.txt", original_script)
+        # the template as registered: the optimizer rewrites it placeholders and all, so {customer_name} stays unrendered
+        logging.info("--- Original Agent Script (template, placeholders unrendered) ---")
+        logging.info(original_script)
+
+        # 3. Take personas from the pool, generating only the ones it is missing
+        sampler = None
+        if args.persona_sampling == "stratified":
+            sampler = PersonaSampler(
+                quotas=load_quotas(args.persona_quotas),
+                similarity_threshold=args.similarity_threshold,
+                seed=args.seed,
+            )
+        if store.done("personas"):
+            personalities = json.loads(store.load_text("personas"))
+        else:
+            try:
+                if sampler is not None:
+                    personalities = await sampler.sample(personality_gen, persona_pool, num_simulations)
+                else:
+                    personalities = await persona_pool.get(personality_gen, num_simulations, seed=args.seed)
+            except BudgetExceededError as e:
+                logging.error(f"could not generate the personas: {e}")
+                report_usage(usage, args.cost_report)
+                return
+            store.save_text("personas", "personas.json", json.dumps(personalities, indent=1), count=len(personalities))
+        if sampler is not None:
+            report_coverage(sampler.coverage(personalities), args.coverage_report)
+
+        if args.iterations > 0:
+            # Self-improvement loop: race candidate scripts on the same personas and keep the best
+            loop = IterativeOptimizer(
+                chat_sim,
+                script_opt,
+                scheduler,
+                max_turns=args.max_turns,
+                max_extra_turns=args.max_extra_turns,
+                candidates_per_round=args.candidates,
+                max_simulations=args.max_simulation_budget,
+            )
+            if store.done("self_improvement"):
+                result = json.loads(store.load_text("self_improvement"))
+                logging.info(f"self-improvement already finished in {store.path}")
+                if result["best_script"] != original_script:
+                    with open(args.output, "w") as f:
+                        f.write(result["best_script"])
+            else:
+                result = await loop.run(original_script, personalities, args.iterations, output_path=args.output)
+                store.save_text("self_improvement", "self_improvement.json", json.dumps(result, indent=4))
+            logging.info(
+                f"self-improvement finished: score history {result['score_history']}, "
+                f"{result['simulations_used']} simulations used"
+            )
+            if result["best_script"] != original_script and not store.done("publish"):
+                # registered but not activated: roll it out with `script_registry.py activate`
+                version = ScriptRegistry().publish(
+                    result["best_script"],
+                    note=f"self-improvement, score {result['score_history'][0]:.2f} -> {result['best_score']:.2f}",
+                )
+                logging.info(f"published improved script as {version}")
+                store.complete("publish", version=version)
+            if cache is not None:
+                cache.close()
+            report_usage(usage, args.cost_report)
+            return
+
+        # 4. Run the simulations concurrently (only the ones that have not finished yet, when resuming)
+        finished = store.load_simulations()
+        pending = [i for i in range(len(personalities)) if i not in finished]
+        if finished:
+            logging.info(f"{len(finished)} simulations already finished, running the other {len(pending)}")
+
+        async def simulate_person(i: int):
+            logging.info(f"simulating person {i+1}")
+            log = await chat_sim.simulate(
+                original_script, personalities[i], max_turns=args.max_turns, max_extra_turns=args.max_extra_turns
+            )
+            store.add_simulation(i, log)
+            return log
+
+        if args.batch_api and pending:
+            # every turn of all pending conversations goes out as one batch job; finished ones are checkpointed as they end
+            try:
+                lockstep = await chat_sim.simulate_lockstep(
+                    original_script,
+                    [personalities[i] for i in pending],
+                    max_turns=args.max_turns,
+                    max_extra_turns=args.max_extra_turns,
+                    on_finished=lambda n, log: store.add_simulation(pending[n], log),
+                )
+            except BudgetExceededError as e:
+                logging.warning(f"skipping the simulations: {e}")
+                lockstep = []
+            finished.update((i, log) for i, log in zip(pending, lockstep) if log is not None)
+        elif args.workers is not None and pending:
+            # workers simulate shards of the pending personas within a share of the budgets; their usage is merged into ours
+            sharded = await run_sharded(store, pending, args, usage)
+            for i, log in sharded.items():
+                store.add_simulation(i, log)
+            finished.update(sharded)
+        else:
+            results = await scheduler.run([
+                lambda i=i: simulate_person(i) for i in pending
+            ])
+            finished.update((i, log) for i, log in zip(pending, results) if log is not None)
+        # in persona order, so a resumed run hands the optimizer exactly what an uninterrupted one would
+        all_conversation_logs = [finished[i] for i in sorted(finished)]
+        simulations_complete = len(finished) == len(personalities)
+        store.complete("simulations", succeeded=len(all_conversation_logs), total=len(personalities))
+
+        logging.info(
+            f"simulations complete: {len(all_conversation_logs)}/{num_simulations} succeeded, "
+            f"{rate_limiter.retries} retried API calls."
+        )
+        logging.info(f"simulation prompt tokens: {chat_sim.context_report()}")
+        outcomes = Counter(log.outcome["outcome"] for log in all_conversation_logs)
+        turns = [log.outcome["turns"] for log in all_conversation_logs]
+        logging.info(
+            f"simulation outcomes: {dict(outcomes.most_common())}, "
+            f"{sum(turns) / max(1, len(turns)):.1f} exchanges per call on average"
+        )
+
+        if args.production_transcripts:
+            recorded = read_conversations(args.production_transcripts)
+            all_conversation_logs.extend(recorded)
+            logging.info(f"added {len(recorded)} recorded production calls")
+
+        # 5. Pre-score locally: a free regression signal on every run, and a filter for the LLM judge
+        logging.info(f"transcript features: {summarize_features(extract_features(all_conversation_logs))}")
+        if args.judge_limit is not None and args.judge_limit < len(all_conversation_logs):
+            selected = select_for_judging(all_conversation_logs, args.judge_limit)
+            all_conversation_logs = [all_conversation_logs[i] for i in selected]
+            logging.info(f"judging the {len(all_conversation_logs)} lowest pre-scored conversations")
+
+        # 6. Optimize the script
+        logging.info("--- Optimizing Agent Script ---")
+        if store.done("optimization"):
+            optimization_results = store.load_text("optimization")
+        else:
+            try:
+                if args.scoring == "map-reduce":
+                    # per-conversation scores are checkpointed in the score cache as they come in
+                    optimization_results = await script_opt.optimize_map_reduce(original_script, all_conversation_logs)
+                else:
+                    optimization_results = await script_opt.optimize(original_script, all_conversation_logs)
+            except BudgetExceededError as e:
+                logging.warning(f"skipping the optimization: {e}")
+                optimization_results = None
+            # with simulations missing, a resumed run runs them and optimizes again
+            if optimization_results is not None and simulations_complete:
+                store.save_text("optimization", "optimization.json", optimization_results)
+
+        if cache is not None:
+            logging.info(f"response cache: {cache.hits} hits, {cache.misses} misses ({cache.mode})")
+            cache.close()
+        report_usage(usage, args.cost_report)
+        if optimization_results is None:
+            return
+
+        # 7. Display the results
+        logging.info("--- Optimization Results ---")
+        try:
+            results = json.loads(optimization_results)
+            print(json.dumps(results, indent=4))
+        except json.JSONDecodeError:
+            logging.error("Failed to parse optimization results as JSON.")
+            print(optimization_results)
+    finally:
+        await llm.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(parse_args()))
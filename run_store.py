@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import time
+from conversation_state import ConversationLog
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_RUNS_DIR = "runs"
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+# pipeline arguments that change what a run produces; a run only resumes with the same values
+RESUME_KEYS = (
+    "num_simulations",
+    "max_turns",
+    "max_extra_turns",
+    "context_strategy",
+    "context_budget",
+    "scoring",
+    "judge_limit",
+    "iterations",
+    "candidates",
+    "max_simulation_budget",
+    "persona_sampling",
+    "persona_quotas",
+    "seed",
+    "production_transcripts",
+)
+
+
+class RunStore:
+    """Run directory a pipeline run checkpoints into, so `--resume` can skip finished work.
+
+    Holds the script and personas the run started with, one JSONL line per finished
+    simulation (appended as soon as it completes) and every stage's output.
+    `manifest.json` records the run's settings and which stages are complete; it
+    and every other whole file are replaced atomically, so a crash at any point
+    leaves the previous consistent state behind.
+    """
+
+    def __init__(self, path: str, manifest: dict):
+        self.path = path
+        self.manifest = manifest
+
+    @classmethod
+    def create(cls, path: str, config: dict) -> "RunStore":
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            raise FileExistsError(f"{path} already holds a run; pass --resume to continue it")
+        os.makedirs(path, exist_ok=True)
+        store = cls(path, {
+            "version": MANIFEST_VERSION,
+            "config": config,
+            "created_at": time.time(),
+            "stages": {},
+        })
+        store._write_manifest()
+        return store
+
+    @classmethod
+    def open(cls, path: str, config: dict | None = None) -> "RunStore":
+        """Opens a run to resume it; fails if it was started with different settings.
+
+        Without `config` the run's own settings are taken as they are (shard workers do this).
+        """
+        with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+            manifest = json.load(f)
+        changed = {
+            key: (manifest["config"].get(key), value)
+            for key, value in (config or {}).items() if manifest["config"].get(key) != value
+        }
+        if changed:
+            details = ", ".join(f"{key}: {old!r} -> {new!r}" for key, (old, new) in changed.items())
+            raise ValueError(f"cannot resume {path} with different settings ({details})")
+        return cls(path, manifest)
+
+    @staticmethod
+    def latest(runs_dir: str = DEFAULT_RUNS_DIR) -> str | None:
+        """The most recently created run directory under `runs_dir`."""
+        if not os.path.isdir(runs_dir):
+            return None
+        runs = [
+            os.path.join(runs_dir, name) for name in os.listdir(runs_dir)
+            if os.path.exists(os.path.join(runs_dir, name, MANIFEST_FILE))
+        ]
+        return max(runs, key=os.path.getmtime, default=None)
+
+    @staticmethod
+    def new_path(runs_dir: str = DEFAULT_RUNS_DIR) -> str:
+        return os.path.join(runs_dir, time.strftime("run-%Y%m%d-%H%M%S"))
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _write_atomic(self, name: str, text: str):
+        tmp = self._file(f"{name}.tmp")
+        with open(tmp, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file(name))
+
+    def _write_manifest(self):
+        self.manifest["updated_at"] = time.time()
+        self._write_atomic(MANIFEST_FILE, json.dumps(self.manifest, indent=4))
+
+    def done(self, stage: str) -> bool:
+        return self.manifest["stages"].get(stage, {}).get("done", False)
+
+    def complete(self, stage: str, **details):
+        """Marks a stage complete in the manifest."""
+        self.manifest["stages"][stage] = {"done": True, "finished_at": time.time(), **details}
+        self._write_manifest()
+
+    def save_text(self, stage: str, name: str, text: str, **details):
+        """Stores a stage's output and marks the stage complete."""
+        self._write_atomic(name, text)
+        self.complete(stage, file=name, **details)
+
+    def load_text(self, stage: str) -> str:
+        with open(self._file(self.manifest["stages"][stage]["file"]), "r") as f:
+            return f.read()
+
+    def add_simulation(self, index: int, log: list):
+        """Appends one finished simulation; called as each one completes."""
+        record = {"index": index, "messages": list(log), "outcome": getattr(log, "outcome", {})}
+        with open(self._file("simulations.jsonl"), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def load_simulations(self) -> dict:
+        """Finished simulations by persona index."""
+        path = self._file("simulations.jsonl")
+        if not os.path.exists(path):
+            return {}
+        simulations = {}
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # a crash mid-append can leave a partial last line
+                    continue
+                simulations[record["index"]] = ConversationLog(record["messages"], outcome=record["outcome"])
+        return simulations
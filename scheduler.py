@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable
+
+import openai
+from usage_tracker import BudgetExceededError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Refills continuously at `rate_per_minute` up to `capacity` units."""
+
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        """Waits until `amount` units are available and takes them."""
+        # a single request larger than the bucket could never be served otherwise
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return
+                await asyncio.sleep((amount - self.level) / self.rate)
+
+    def refund(self, amount: float):
+        """Gives back (or, if negative, takes) units once the real cost is known."""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Keeps API calls under requests/min and tokens/min limits and retries 429/5xx responses."""
+
+    def __init__(
+        self,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 200_000,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when the server sends it."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(self.max_delay, float(retry_after)) + random.uniform(0, self.base_delay)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS_CODES
+        return False
+
+    async def call(self, request: Callable[[], Awaitable], estimated_tokens: int):
+        """Runs `request` once both buckets allow it, retrying transient failures."""
+        for attempt in range(self.max_retries + 1):
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimated_tokens)
+            try:
+                response = await request()
+            except Exception as e:
+                if attempt == self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                self.retries += 1
+                logging.warning(f"API call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            usage = getattr(response, "usage", None)
+            if usage is not None and usage.total_tokens:
+                self.tokens.refund(estimated_tokens - usage.total_tokens)
+            return response
+
+
+class SimulationScheduler:
+    """Runs independent simulation jobs concurrently under a concurrency cap."""
+
+    def __init__(self, max_concurrency: int = 4, progress_every: int = 1):
+        self.max_concurrency = max_concurrency
+        self.progress_every = progress_every
+
+    async def run(self, jobs: list[Callable[[], Awaitable]]) -> list:
+        """Runs every job and returns their results in order; failed jobs yield None.
+
+        Once a job runs out of API budget, jobs that have not started yet are skipped
+        (and yield None too), while the ones already running finish.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = [None] * len(jobs)
+        total = len(jobs)
+        done = 0
+        failed = 0
+        budget_error = None
+        start = time.monotonic()
+
+        async def _run_job(index: int, job: Callable[[], Awaitable]):
+            nonlocal done, failed, budget_error
+            async with semaphore:
+                try:
+                    if budget_error is not None:
+                        failed += 1
+                    else:
+                        results[index] = await job()
+                except BudgetExceededError as e:
+                    failed += 1
+                    if budget_error is None:
+                        budget_error = e
+                        logging.warning(f"stopping simulations: {e}")
+                except Exception as e:
+                    failed += 1
+                    logging.error(f"simulation {index + 1} failed: {e}")
+            done += 1
+            if done % self.progress_every == 0 or done == total:
+                self._report_progress(done, failed, total, time.monotonic() - start)
+
+        await asyncio.gather(*(_run_job(i, job) for i, job in enumerate(jobs)))
+        return results
+
+    @staticmethod
+    def _report_progress(done: int, failed: int, total: int, elapsed: float):
+        rate = done / elapsed * 60 if elapsed > 0 else 0.0
+        eta = (total - done) / (done / elapsed) if done and elapsed > 0 else 0.0
+        logging.info(
+            f"progress: {done}/{total} simulations done ({failed} failed), "
+            f"{rate:.1f}/min, eta {eta:.0f}s"
+        )
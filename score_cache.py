@@ -0,0 +1,45 @@
+import hashlib
+import json
+import logging
+import os
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_SCORE_CACHE_PATH = ".pipeline_cache/scores.jsonl"
+
+
+class ScoreCache:
+    """Append-only JSONL store of per-conversation score records, keyed by transcript and scorer."""
+
+    def __init__(self, path: str = DEFAULT_SCORE_CACHE_PATH):
+        self.path = path
+        self._records = None
+
+    @staticmethod
+    def key(conversation_log: list, scorer_id: str) -> str:
+        payload = json.dumps({"log": conversation_log, "scorer": scorer_id}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _load(self) -> dict:
+        if self._records is None:
+            self._records = {}
+            if os.path.exists(self.path):
+                with open(self.path, "r") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            # a crash mid-append can leave a partial last line
+                            continue
+                        self._records[entry["key"]] = entry["record"]
+        return self._records
+
+    def get(self, key: str) -> dict | None:
+        return self._load().get(key)
+
+    def put(self, key: str, record: dict):
+        self._load()[key] = record
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"key": key, "record": record}) + "\n")
@@ -1,13 +1,68 @@
-
+import asyncio
+import json
 import logging
-from openai import AsyncOpenAI
+import statistics
+from collections import Counter
+from llm_client import LLMClient
+from score_cache import ScoreCache
+from script_registry import ScriptTemplate
+from usage_tracker import BudgetExceededError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+METRICS = ("negotiation_effectiveness", "response_relevance")
+
+# fixed taxonomy so failure reasons from independent scoring calls can be counted together
+FAILURE_CATEGORIES = (
+    "no_identity_verification",
+    "no_payment_options",
+    "ignored_customer_concern",
+    "too_pushy",
+    "too_verbose",
+    "markdown_or_unspeakable_output",
+    "mishandled_dispute",
+    "mishandled_do_not_call",
+    "no_clear_next_steps",
+    "repetitive",
+    "other",
+)
+
+# bump whenever SCORING_PROMPT changes so cached scores are not reused
+SCORING_VERSION = "1"
+
+SCORING_PROMPT = """
+        You are grading one conversation between a debt collection agent (assistant) and a debtor (user).
+
+        Rate the agent on a scale of 1 to 10:
+        - `negotiation_effectiveness`: How well did the agent attempt to negotiate payment plans or settlements?
+        - `response_relevance`: How relevant were the agent's responses to the user's queries?
+
+        Also give the outcome of the call (one of: payment_commitment, payment_plan, dispute, do_not_call,
+        callback, refused, unresolved), the agent's failures picked from this list: {categories},
+        and one sentence describing the biggest problem.
+
+        Return a JSON object:
+        {{"negotiation_effectiveness": <int>, "response_relevance": <int>, "outcome": "<outcome>",
+        "failure_reasons": ["<category>", ...], "worst_moment": "<one sentence>"}}
+        """
+
 class ScriptOptimizer:
-    def __init__(self, api_key: str):
-        self.client = AsyncOpenAI(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        llm: LLMClient | None = None,
+        score_cache: ScoreCache | None = None,
+        scoring_model: str = "gpt-4o-mini",
+        max_concurrency: int = 8,
+        batch_api: bool = False,
+    ):
+        self.llm = llm or LLMClient(api_key)
+        self.score_cache = score_cache
+        self.scoring_model = scoring_model
+        self.max_concurrency = max_concurrency
+        # score all uncached conversations as one Batch API job instead of concurrent calls
+        self.batch_api = batch_api
 
     async def optimize(self, original_script: str, conversation_logs: list) -> str:
         """Analyzes conversation logs and generates an improved agent script."""
@@ -61,7 +116,8 @@ class ScriptOptimizer:
         }}
         """
 
-        response = await self.client.chat.completions.create(
+        response = await self.llm.chat(
+            stage="optimization",
             model="gpt-4",
             messages=[
                 {"role": "system", "content": prompt}
@@ -70,4 +126,254 @@ class ScriptOptimizer:
 
         new_script_suggestions = response.choices[0].message.content
         logging.info("Script optimization complete.")
-        return new_script_suggestions
\ No newline at end of file
+        return new_script_suggestions
+
+    async def optimize_map_reduce(self, original_script: str, conversation_logs: list) -> str:
+        """Scores each conversation separately, then asks for suggestions on the aggregated digest only."""
+        logging.info("Optimizing agent script with map-reduce scoring...")
+        records = await self.score_conversations(conversation_logs)
+        digest = aggregate_scores(records)
+
+        prompt = f"""
+        You are an expert in conversational AI and prompt engineering.
+        Your task is to suggest improvements to an agent's instruction script, based on a digest of
+        per-conversation evaluations of {digest["count"]} simulated calls.
+
+        Here is the agent's original script:
+        -------------------
+        {original_script}
+        -------------------
+
+        Here is the evaluation digest (scores are on a scale of 1 to 10):
+        -------------------
+        {json.dumps(digest, indent=2)}
+        -------------------
+
+        1.  **Provide actionable suggestions** for what to add or change in the original script to fix the most
+            frequent failure reasons and the worst cases.
+
+        2.  **Estimate the impact** of your suggestions by providing the expected score for each metric after the changes are applied.
+
+        Return your response as a JSON object with the following structure:
+        {{
+            "suggestions": [
+                {{
+                    "suggestion": "<Your suggestion for what to add or change>",
+                    "reason": "<Brief reason for the suggestion>"
+                }}
+            ],
+            "expected_scores_after_improvement": {{
+                "negotiation_effectiveness": <expected_score>,
+                "response_relevance": <expected_score>
+            }}
+        }}
+        """
+
+        response = await self.llm.chat(
+            stage="optimization",
+            model="gpt-4",
+            messages=[
+                {"role": "system", "content": prompt}
+            ]
+        )
+
+        try:
+            suggestions = json.loads(response.choices[0].message.content)
+        except json.JSONDecodeError:
+            logging.error("Failed to parse optimization suggestions as JSON.")
+            suggestions = {"raw_suggestions": response.choices[0].message.content}
+
+        logging.info("Script optimization complete.")
+        return json.dumps({
+            "current_scores": {metric: digest[metric]["mean"] for metric in METRICS},
+            **suggestions,
+            "digest": digest,
+        })
+
+    async def propose_scripts(self, original_script: str, digest: dict, count: int) -> list:
+        """Asks for `count` revised versions of the script that address the digest's failures."""
+        prompt = f"""
+        You are an expert in conversational AI and prompt engineering.
+        Rewrite the agent's instruction script below to fix the problems found when evaluating it.
+        Produce {count} clearly different revisions, each trying a different fix.
+        Keep every placeholder in curly braces (e.g. {{customer_name}}) unchanged and do not add new ones,
+        and do not use curly braces anywhere else.
+
+        Here is the agent's current script:
+        -------------------
+        {original_script}
+        -------------------
+
+        Here is the evaluation digest (scores are on a scale of 1 to 10):
+        -------------------
+        {json.dumps(digest, indent=2)}
+        -------------------
+
+        Return a JSON object: {{"scripts": ["<full revised script>", ...]}}
+        """
+
+        response = await self.llm.chat(
+            stage="optimization",
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": prompt}
+            ],
+            response_format={"type": "json_object"}
+        )
+        try:
+            scripts = json.loads(response.choices[0].message.content).get("scripts", [])
+        except (json.JSONDecodeError, AttributeError):
+            logging.error("Failed to parse candidate scripts as JSON.")
+            return []
+        valid = []
+        seen = {original_script.strip()}
+        for script in scripts:
+            if not isinstance(script, str) or not script.strip():
+                continue
+            if script.strip() in seen:
+                # a copy of the incumbent or of another candidate would be simulated again for nothing
+                logging.info("Discarding a duplicate candidate script.")
+                continue
+            seen.add(script.strip())
+            try:
+                # candidates must stay usable as registry templates
+                ScriptTemplate("candidate", script)
+            except ValueError as e:
+                logging.warning(f"Discarding candidate script: {e}")
+                continue
+            valid.append(script)
+        return valid[:count]
+
+    async def score_conversations(self, conversation_logs: list, keep_failed: bool = False) -> list:
+        """Scores every conversation concurrently, reusing cached scores for unchanged transcripts.
+
+        Conversations that could not be scored (or were not, because the scoring budget
+        ran out) are dropped, or kept as None with `keep_failed` so the result lines up
+        with `conversation_logs`.
+        """
+        if self.batch_api:
+            records = await self._score_batch(conversation_logs)
+            return list(records) if keep_failed else [record for record in records if record is not None]
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        budget_errors = []
+
+        async def _score(log: list):
+            async with semaphore:
+                try:
+                    return await self.score_conversation(log)
+                except BudgetExceededError as e:
+                    budget_errors.append(e)
+                    return None
+
+        # identical transcripts are scored once: two concurrent calls for the same request would
+        # get different answers, and only one of them lands in the response cache to be replayed
+        scoring = {}
+        for log in conversation_logs:
+            key = self._score_key(log)
+            if key not in scoring:
+                scoring[key] = asyncio.ensure_future(_score(log))
+        records = await asyncio.gather(*(scoring[self._score_key(log)] for log in conversation_logs))
+        if budget_errors:
+            logging.warning(f"{len(budget_errors)} conversations left unscored: {budget_errors[0]}")
+        if keep_failed:
+            return list(records)
+        return [record for record in records if record is not None]
+
+    async def _score_batch(self, conversation_logs: list) -> list:
+        """Scores the conversations missing from the score cache in one Batch API job; None where that failed."""
+        keys = [self._score_key(log) for log in conversation_logs]
+        records = [self.score_cache.get(key) if self.score_cache is not None else None for key in keys]
+        # one request per distinct transcript, as in score_conversations
+        missing = {}
+        for i, record in enumerate(records):
+            if record is None:
+                missing.setdefault(keys[i], i)
+        if not missing:
+            return records
+        try:
+            responses = await self.llm.chat_batch(
+                [self._score_request(conversation_logs[i]) for i in missing.values()], stage="scoring"
+            )
+        except BudgetExceededError as e:
+            logging.warning(f"{len(missing)} conversations left unscored: {e}")
+            return records
+        scored = {
+            key: self._score_record(key, response)
+            for key, response in zip(missing, responses) if response is not None
+        }
+        return [record if record is not None else scored.get(key) for key, record in zip(keys, records)]
+
+    def _score_key(self, conversation_log: list) -> str:
+        # routed to another model, the old scores no longer apply
+        scorer_id = f"v{SCORING_VERSION}:{self.llm.model_for('scoring', self.scoring_model)}"
+        return ScoreCache.key(conversation_log, scorer_id)
+
+    def _score_request(self, conversation_log: list) -> dict:
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in conversation_log)
+        return dict(
+            model=self.scoring_model,
+            messages=[
+                {"role": "system", "content": SCORING_PROMPT.format(categories=", ".join(FAILURE_CATEGORIES))},
+                {"role": "user", "content": transcript},
+            ],
+            response_format={"type": "json_object"}
+        )
+
+    async def score_conversation(self, conversation_log: list) -> dict | None:
+        """Scores one conversation with the scoring model into a compact record."""
+        key = self._score_key(conversation_log)
+        if self.score_cache is not None:
+            cached = self.score_cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = await self.llm.chat(stage="scoring", **self._score_request(conversation_log))
+        return self._score_record(key, response)
+
+    def _score_record(self, key: str, response) -> dict | None:
+        record = parse_score_record(response.choices[0].message.content)
+        if record is None:
+            logging.warning("Discarding conversation score that did not match the expected format")
+            return None
+
+        record["key"] = key
+        if self.score_cache is not None:
+            self.score_cache.put(key, record)
+        return record
+
+
+def parse_score_record(content: str) -> dict | None:
+    """Validates a scoring response, clamping scores to 1-10 and unknown reasons to `other`."""
+    try:
+        data = json.loads(content)
+        record = {metric: min(10.0, max(1.0, float(data[metric]))) for metric in METRICS}
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return None
+    reasons = data.get("failure_reasons") or []
+    record["failure_reasons"] = sorted({r if r in FAILURE_CATEGORIES else "other" for r in reasons if isinstance(r, str)})
+    record["outcome"] = str(data.get("outcome", "unresolved"))
+    record["worst_moment"] = str(data.get("worst_moment", ""))
+    return record
+
+
+def aggregate_scores(records: list, worst_cases: int = 3) -> dict:
+    """Reduces per-conversation records to means, variance, worst cases and failure-reason counts."""
+    digest = {"count": len(records)}
+    for metric in METRICS:
+        values = [r[metric] for r in records]
+        digest[metric] = {
+            "mean": round(statistics.fmean(values), 2) if values else None,
+            "variance": round(statistics.pvariance(values), 2) if values else None,
+            "min": min(values, default=None),
+        }
+    digest["outcomes"] = dict(Counter(r["outcome"] for r in records).most_common())
+    digest["failure_reasons"] = dict(Counter(
+        reason for r in records for reason in r["failure_reasons"]
+    ).most_common())
+    worst = sorted(records, key=lambda r: sum(r[metric] for metric in METRICS))[:worst_cases]
+    digest["worst_cases"] = [
+        {**{metric: r[metric] for metric in METRICS}, "outcome": r["outcome"], "worst_moment": r["worst_moment"]}
+        for r in worst
+    ]
+    return digest
@@ -0,0 +1,211 @@
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import string
+import threading
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_REGISTRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts")
+
+# placeholders the agent fills in from the job metadata
+SCRIPT_FIELDS = {"customer_name", "account_number", "outstanding_amount", "due_date", "card_type"}
+
+
+class ScriptTemplate:
+    """An agent script with its placeholders parsed once, so rendering is a single join."""
+
+    def __init__(self, version: str, source: str):
+        self.version = version
+        self.source = source
+        # alternating literal text and field names, from str.format's own parser
+        self._parts = []
+        for literal, field, format_spec, conversion in string.Formatter().parse(source):
+            if format_spec or conversion:
+                raise ValueError(f"script {version}: format specs are not supported ({field})")
+            if literal:
+                self._parts.append((literal, None))
+            if field is not None:
+                if field not in SCRIPT_FIELDS:
+                    raise ValueError(f"script {version}: unknown placeholder {{{field}}}")
+                self._parts.append((None, field))
+
+    @property
+    def fields(self) -> set:
+        return {field for _, field in self._parts if field is not None}
+
+    def render(self, **values) -> str:
+        return "".join(literal if field is None else str(values[field]) for literal, field in self._parts)
+
+
+def validate_split(split: dict):
+    """Rejects a traffic split no call could be assigned from."""
+    if any(weight < 0 for weight in split.values()):
+        raise ValueError(f"negative weight in active split {split}")
+    if sum(split.values()) <= 0:
+        raise ValueError(f"active split {split} has no traffic")
+
+
+class ScriptRegistry:
+    """Versioned agent scripts in a directory, with an active traffic split and hot reload.
+
+    `registry.json` lists every version and the active split, e.g.
+    `{"active": {"v1": 0.9, "v2": 0.1}, "versions": {"v1": {"file": "v1.txt", ...}}}`.
+    Running workers pick up edits to it (or to template files) without a restart:
+    the files are re-checked at most every `reload_interval` seconds.
+    """
+
+    def __init__(self, directory: str = DEFAULT_REGISTRY_DIR, reload_interval: float = 5.0):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._checked_at = 0.0
+        self._active = {}
+        self._templates = {}
+        self._metadata = {}
+        self._maybe_reload(force=True)
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "registry.json")
+
+    def _file_signature(self) -> tuple:
+        paths = [self._index_path, *(os.path.join(self.directory, m["file"]) for m in self._metadata.values())]
+        return tuple(os.stat(p).st_mtime_ns if os.path.exists(p) else None for p in paths)
+
+    def _maybe_reload(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            signature = self._file_signature()
+            if signature == self._signature:
+                return
+            try:
+                index, templates = self._load()
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                if self._signature is None:
+                    raise
+                # a half-written or broken publish must not take down running calls; retried next interval
+                logging.error(f"could not reload script registry, keeping split {self._active}: {e!r}")
+                return
+
+            reloaded = self._signature is not None
+            self._metadata = index["versions"]
+            self._templates = templates
+            self._active = index["active"]
+            self._signature = self._file_signature()
+            if reloaded:
+                logging.info(f"reloaded script registry, active split: {self._active}")
+
+    def _load(self) -> tuple[dict, dict]:
+        """Reads and validates the index and every template it lists."""
+        with open(self._index_path, "r") as f:
+            index = json.load(f)
+        templates = {}
+        for version, meta in index["versions"].items():
+            with open(os.path.join(self.directory, meta["file"]), "r") as f:
+                templates[version] = ScriptTemplate(version, f.read())
+        unknown = set(index["active"]) - set(templates)
+        if unknown:
+            raise ValueError(f"active script versions {sorted(unknown)} are not registered")
+        validate_split(index["active"])
+        return index, templates
+
+    def get(self, version: str) -> ScriptTemplate:
+        self._maybe_reload()
+        return self._templates[version]
+
+    def active(self) -> ScriptTemplate:
+        """The primary active version (largest traffic share)."""
+        self._maybe_reload()
+        return self._templates[max(self._active, key=self._active.get)]
+
+    def pick(self, assignment_key: str) -> ScriptTemplate:
+        """Chooses a version from the active split; the same key always lands on the same version."""
+        self._maybe_reload()
+        bucket = int(hashlib.sha256(assignment_key.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        total = sum(self._active.values())
+        cumulative = 0.0
+        for version, weight in sorted(self._active.items()):
+            cumulative += weight / total
+            if bucket <= cumulative:
+                return self._templates[version]
+        return self._templates[max(self._active, key=self._active.get)]
+
+    def publish(self, source: str, note: str = "", activate: bool = False) -> str:
+        """Stores a new version and returns its name; the template is validated before it is written."""
+        self._maybe_reload(force=True)
+        version = f"v{len(self._metadata) + 1}"
+        while version in self._metadata:
+            version = f"v{int(version[1:]) + 1}"
+        ScriptTemplate(version, source)
+
+        with open(os.path.join(self.directory, f"{version}.txt"), "w") as f:
+            f.write(source)
+        versions = {
+            **self._metadata,
+            version: {
+                "file": f"{version}.txt",
+                "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                "note": note,
+            },
+        }
+        self._write_index({version: 1.0} if activate else self._active, versions)
+        return version
+
+    def set_active(self, split: dict):
+        """Replaces the active traffic split, e.g. {"v1": 0.9, "v2": 0.1}."""
+        self._maybe_reload(force=True)
+        unknown = set(split) - set(self._metadata)
+        if unknown:
+            raise ValueError(f"unknown script versions {sorted(unknown)}")
+        validate_split(split)
+        self._write_index(split, self._metadata)
+
+    def _write_index(self, active: dict, versions: dict):
+        # write-then-rename so a worker reloading mid-write never reads half a file
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"active": active, "versions": versions}, f, indent=4)
+        os.replace(tmp_path, self._index_path)
+        self._maybe_reload(force=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Manage the versioned agent scripts.")
+    parser.add_argument("--dir", default=DEFAULT_REGISTRY_DIR, help="registry directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list versions and the active split")
+    publish = commands.add_parser("publish", help="register a script file as a new version")
+    publish.add_argument("file")
+    publish.add_argument("--note", default="")
+    publish.add_argument("--activate", action="store_true")
+    activate = commands.add_parser("activate", help="set the active split, e.g. v1=0.9 v2=0.1")
+    activate.add_argument("split", nargs="+")
+    return parser.parse_args()
+
+
+def main(args):
+    registry = ScriptRegistry(args.dir)
+    if args.command == "publish":
+        with open(args.file, "r") as f:
+            print(registry.publish(f.read(), note=args.note, activate=args.activate))
+    elif args.command == "activate":
+        split = {}
+        for item in args.split:
+            version, _, weight = item.partition("=")
+            split[version] = float(weight or 1.0)
+        registry.set_active(split)
+    print(json.dumps({"active": registry._active, "versions": registry._metadata}, indent=4))
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,392 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+from dotenv import load_dotenv
+from chat_simulator import ChatSimulator
+from context_strategy import make_context_strategy
+from conversation_state import ConversationLog
+from llm_cache import CACHE_MODES, DEFAULT_CACHE_PATH, ResponseCache
+from llm_client import LLMClient, parse_routes
+from run_store import RunStore
+from scheduler import RateLimiter, SimulationScheduler
+from usage_tracker import UsageTracker, parse_stage_budgets
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+load_dotenv(".env.local")
+
+QUEUE_FILE = "queue.sqlite"
+SHARDS_DIR = "shards"
+# one usage report per worker, merged into the pipeline's cost report
+USAGE_DIR = "usage"
+DEFAULT_SHARD_SIZE = 50
+DEFAULT_LEASE_SECONDS = 120.0
+# a shard that failed this often is given up on, so one poisonous persona cannot stall the run
+MAX_SHARD_ATTEMPTS = 3
+
+
+class WorkQueue:
+    """SQLite queue of simulation shards that workers on any host lease, renew and complete.
+
+    A lease that is not renewed before it expires (the worker crashed, hung or lost
+    its host) makes the shard claimable again, so lost shards are requeued without a
+    coordinator. Only the current lease holder can complete a shard, which keeps a
+    worker that comes back late from overwriting the result. Several hosts can share
+    the queue through a shared file system with working file locks.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # autocommit; the read-modify-write of a claim runs in an explicit IMMEDIATE transaction
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS shards (
+                shard_id TEXT PRIMARY KEY,
+                indices TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                output TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+
+    def reset(self, indices: list, shard_size: int = DEFAULT_SHARD_SIZE):
+        """Replaces the queue with shards of `indices`; leases on the old shards become void."""
+        generation = uuid.uuid4().hex[:8]
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        self.db.execute("DELETE FROM shards")
+        self.db.executemany(
+            "INSERT INTO shards (shard_id, indices, status, updated_at) VALUES (?, ?, 'pending', ?)",
+            [
+                (f"{generation}-{n:05d}", json.dumps(indices[start:start + shard_size]), now)
+                for n, start in enumerate(range(0, len(indices), shard_size))
+            ],
+        )
+        self.db.execute("COMMIT")
+
+    def claim(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> tuple | None:
+        """Leases the next pending (or expired) shard to `worker`; returns (shard_id, indices) or None.
+
+        An expired shard that already had MAX_SHARD_ATTEMPTS leases is failed instead, so a
+        shard that crashes every worker taking it is not handed out forever.
+        """
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            for shard_id, previous in self.db.execute(
+                "SELECT shard_id, worker FROM shards WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, MAX_SHARD_ATTEMPTS),
+            ).fetchall():
+                logging.warning(f"giving up on shard {shard_id}: lease of {previous} expired on its last attempt")
+            self.db.execute(
+                """
+                UPDATE shards SET status = 'failed', worker = NULL, lease_expires = NULL,
+                error = COALESCE(error, 'lease expired'), updated_at = ?
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+                """,
+                (now, now, MAX_SHARD_ATTEMPTS),
+            )
+            row = self.db.execute(
+                """
+                SELECT shard_id, indices, status, worker FROM shards
+                WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                ORDER BY shard_id LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            shard_id, indices, status, previous = row
+            if status == "leased":
+                logging.warning(f"requeueing shard {shard_id}: lease of {previous} expired")
+            self.db.execute(
+                """
+                UPDATE shards SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1,
+                updated_at = ? WHERE shard_id = ?
+                """,
+                (worker, now + lease_seconds, now, shard_id),
+            )
+            return shard_id, json.loads(indices)
+        finally:
+            self.db.execute("COMMIT")
+
+    def renew(self, shard_id: str, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extends a lease; False if the worker no longer holds it."""
+        now = time.time()
+        cursor = self.db.execute(
+            "UPDATE shards SET lease_expires = ?, updated_at = ? WHERE shard_id = ? AND worker = ? AND status = 'leased'",
+            (now + lease_seconds, now, shard_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, shard_id: str, worker: str, output: str) -> bool:
+        cursor = self.db.execute(
+            "UPDATE shards SET status = 'done', output = ?, updated_at = ? WHERE shard_id = ? AND worker = ? AND status = 'leased'",
+            (output, time.time(), shard_id, worker),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, shard_id: str, worker: str, error: str, output: str | None = None):
+        """Gives a shard back after an error; it is failed for good after MAX_SHARD_ATTEMPTS.
+
+        `output` holds the simulations of the shard that did succeed; those of a shard
+        that is given up on are still merged.
+        """
+        self.db.execute(
+            """
+            UPDATE shards SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+            worker = NULL, lease_expires = NULL, error = ?, output = COALESCE(?, output), updated_at = ?
+            WHERE shard_id = ? AND worker = ? AND status = 'leased'
+            """,
+            (MAX_SHARD_ATTEMPTS, error, output, time.time(), shard_id, worker),
+        )
+
+    def counts(self) -> dict:
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall())
+
+    def unfinished(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM shards WHERE status IN ('pending', 'leased')").fetchone()[0]
+
+    def outputs(self) -> list:
+        """Output files of the completed shards, and the partial ones of failed shards, in shard order."""
+        return [row[0] for row in self.db.execute(
+            "SELECT output FROM shards WHERE status IN ('done', 'failed') AND output IS NOT NULL ORDER BY shard_id"
+        )]
+
+    def close(self):
+        self.db.close()
+
+
+def merge_shards(run_dir: str, queue: WorkQueue) -> dict:
+    """Simulations of every completed shard by persona index; the same for any completion order."""
+    merged = {}
+    for output in queue.outputs():
+        with open(os.path.join(run_dir, output), "r") as f:
+            for line in f:
+                record = json.loads(line)
+                merged.setdefault(record["index"], ConversationLog(record["messages"], outcome=record["outcome"]))
+    return dict(sorted(merged.items()))
+
+
+def merge_usage(run_dir: str, usage: UsageTracker):
+    """Adds the usage reports the workers wrote to the run directory to `usage`."""
+    usage_dir = os.path.join(run_dir, USAGE_DIR)
+    for name in sorted(os.listdir(usage_dir)) if os.path.isdir(usage_dir) else []:
+        if name.endswith(".json"):
+            with open(os.path.join(usage_dir, name), "r") as f:
+                usage.merge(json.load(f))
+
+
+def worker_command(run_dir: str, args, usage: UsageTracker) -> list:
+    """Command line of a local worker process with the pipeline's client settings and budgets."""
+    command = [
+        sys.executable, os.path.abspath(__file__), "--run-dir", run_dir,
+        "--concurrency", str(args.max_concurrency),
+        # the pipeline's rate limits are shared out between the local workers
+        "--rpm", str(args.rpm / args.workers), "--tpm", str(args.tpm / args.workers),
+        "--cache-mode", args.cache_mode, "--cache-path", args.cache_path,
+    ]
+    if args.base_url:
+        command += ["--base-url", args.base_url]
+    if args.routes:
+        command += ["--routes", args.routes]
+    for spec in args.route_specs:
+        command += ["--route", spec]
+
+    # what is left of each budget after the pipeline and the workers so far, shared out like the rate limits
+    spent = UsageTracker()
+    spent.merge(usage.report())
+    merge_usage(run_dir, spent)
+    if usage.run_budget is not None:
+        remaining = max(0.0, usage.run_budget - spent.total["cost_usd"])
+        command += ["--run-budget", str(remaining / args.workers)]
+    for stage, budget in usage.stage_budgets.items():
+        remaining = max(0.0, budget - spent.by_stage[stage]["cost_usd"])
+        command += ["--stage-budget", f"{stage}={remaining / args.workers}"]
+    return command
+
+
+async def run_sharded(store: RunStore, indices: list, args, usage: UsageTracker) -> dict:
+    """Runs the simulations of `indices` through the run's work queue and returns the merged results.
+
+    Starts `args.workers` local worker processes (replacing any that die while work is
+    left); workers started on other hosts with `shard_runner.py --run-dir` join in.
+    The usage the workers report is added to `usage` once the queue is finished.
+    """
+    queue = WorkQueue(os.path.join(store.path, QUEUE_FILE))
+    # shards an interrupted run finished but never merged are not simulated again
+    wanted = set(indices)
+    recovered = {i: log for i, log in merge_shards(store.path, queue).items() if i in wanted}
+    if recovered:
+        logging.info(f"recovered {len(recovered)} simulations from the shards of the interrupted run")
+    indices = [i for i in indices if i not in recovered]
+    queue.reset(indices, args.shard_size)
+    # usage of an interrupted run's workers is not part of this run's report
+    usage_dir = os.path.join(store.path, USAGE_DIR)
+    for name in os.listdir(usage_dir) if os.path.isdir(usage_dir) else []:
+        os.remove(os.path.join(usage_dir, name))
+    logging.info(
+        f"queued {len(indices)} simulations in {queue.unfinished()} shards; other hosts can join with "
+        f"`python shard_runner.py --run-dir {store.path}`"
+    )
+
+    processes = []
+    restarts = 0
+    try:
+        while queue.unfinished():
+            alive = [p for p in processes if p.returncode is None]
+            if len(alive) < args.workers:
+                if restarts >= 3 * args.workers:
+                    if not alive:
+                        logging.error("local shard workers keep dying, giving up on the remaining shards")
+                        break
+                else:
+                    if len(processes) >= args.workers:
+                        restarts += 1
+                    processes.append(await asyncio.create_subprocess_exec(*worker_command(store.path, args, usage)))
+                    continue
+            await asyncio.sleep(2)
+            logging.info(f"shards: {queue.counts()}")
+    finally:
+        for process in processes:
+            if process.returncode is None:
+                process.terminate()
+        await asyncio.gather(*(p.wait() for p in processes))
+
+    counts = queue.counts()
+    if counts.get("failed"):
+        logging.warning(f"{counts['failed']} shards failed {MAX_SHARD_ATTEMPTS} times and were given up on")
+    merged = {**recovered, **merge_shards(store.path, queue)}
+    queue.close()
+    merge_usage(store.path, usage)
+    return dict(sorted(merged.items()))
+
+
+async def work(args):
+    """Worker: leases shards of the run's queue until none are left, simulating each one."""
+    store = RunStore.open(args.run_dir)
+    config = store.manifest["config"]
+    script = store.load_text("script")
+    personalities = json.loads(store.load_text("personas"))
+    queue = WorkQueue(os.path.join(args.run_dir, QUEUE_FILE))
+    os.makedirs(os.path.join(args.run_dir, SHARDS_DIR), exist_ok=True)
+    worker = f"{socket.gethostname()}-{os.getpid()}"
+    # rewritten after every shard, so the usage of a worker that dies later is still counted
+    usage_path = os.path.join(args.run_dir, USAGE_DIR, f"{worker}.json")
+
+    cache = ResponseCache(args.cache_path, mode=args.cache_mode) if args.cache_mode != "off" else None
+    usage = UsageTracker(run_budget=args.run_budget, stage_budgets=args.stage_budget)
+    llm = LLMClient(
+        api_key=os.getenv("OPENAI_API_KEY") or "offline",
+        rate_limiter=RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm),
+        cache=cache,
+        base_url=args.base_url,
+        usage=usage,
+        routes=parse_routes(args.route, args.routes),
+    )
+    chat_sim = ChatSimulator(
+        api_key="",
+        llm=llm,
+        context_strategy=make_context_strategy(config["context_strategy"], llm, config["context_budget"]),
+    )
+    scheduler = SimulationScheduler(max_concurrency=args.concurrency, progress_every=10)
+
+    async def _heartbeat(shard_id: str):
+        while True:
+            await asyncio.sleep(args.lease / 3)
+            if not queue.renew(shard_id, worker, args.lease):
+                logging.warning(f"{worker} lost the lease on shard {shard_id}")
+                return
+
+    shards_done = 0
+    while True:
+        claimed = queue.claim(worker, args.lease)
+        if claimed is None:
+            if not queue.unfinished():
+                break
+            # the rest is leased by other workers; wait in case one of them is lost
+            await asyncio.sleep(args.poll_interval)
+            continue
+
+        shard_id, indices = claimed
+        logging.info(f"{worker} simulating shard {shard_id} ({len(indices)} personas)")
+        heartbeat = asyncio.create_task(_heartbeat(shard_id))
+        try:
+            logs = await scheduler.run([
+                lambda i=i: chat_sim.simulate(
+                    script, personalities[i], max_turns=config["max_turns"], max_extra_turns=config["max_extra_turns"]
+                )
+                for i in indices
+            ])
+        except Exception as e:
+            queue.release(shard_id, worker, repr(e))
+            continue
+        finally:
+            heartbeat.cancel()
+            usage.write(usage_path)
+
+        output = os.path.join(SHARDS_DIR, f"{shard_id}.{worker}.jsonl")
+        tmp = os.path.join(args.run_dir, f"{output}.tmp")
+        with open(tmp, "w") as f:
+            for index, log in zip(indices, logs):
+                if log is not None:
+                    f.write(json.dumps({"index": index, "messages": list(log), "outcome": log.outcome}) + "\n")
+        os.replace(tmp, os.path.join(args.run_dir, output))
+        # the scheduler logs and drops failed simulations; a done shard must hold all of them
+        failed = [index for index, log in zip(indices, logs) if log is None]
+        if failed:
+            logging.warning(f"{worker}: {len(failed)} simulations of shard {shard_id} failed, giving it back")
+            queue.release(shard_id, worker, f"simulations {failed} failed", output)
+        elif queue.complete(shard_id, worker, output):
+            shards_done += 1
+        else:
+            logging.warning(f"{worker} finished shard {shard_id} after losing its lease; discarding the result")
+
+    logging.info(f"{worker} done after {shards_done} shards")
+    usage.log_summary()
+    queue.close()
+    if cache is not None:
+        cache.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulate shards of a sharded pipeline run (see run_mini_pipeline.py --workers).")
+    parser.add_argument("--run-dir", required=True, help="run directory of the pipeline run, shared between hosts")
+    parser.add_argument("--concurrency", type=int, default=4, help="simulations running at the same time in this worker")
+    parser.add_argument("--rpm", type=float, default=500, help="OpenAI requests per minute limit of this worker")
+    parser.add_argument("--tpm", type=float, default=200_000, help="OpenAI tokens per minute limit of this worker")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="seconds a shard stays leased without a heartbeat before it is requeued")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="seconds between claims when nothing is free")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"))
+    parser.add_argument("--route", action="append", default=[], metavar="STAGE=MODEL[@BASE_URL]")
+    parser.add_argument("--routes", default=None, help="JSON routing table")
+    parser.add_argument("--cache-mode", choices=CACHE_MODES, default="read-through")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH)
+    parser.add_argument("--run-budget", type=float, default=None, help="USD this worker may spend on API calls")
+    parser.add_argument("--stage-budget", action="append", default=[], metavar="STAGE=USD",
+                        help="USD this worker may spend on a stage, repeatable")
+    args = parser.parse_args()
+    try:
+        args.stage_budget = parse_stage_budgets(args.stage_budget)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(work(parse_args()))
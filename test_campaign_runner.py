@@ -0,0 +1,57 @@
+import pytest
+from campaign_runner import RETRYABLE_STATUSES, CampaignRunner
+
+ROOM = "call-1"
+
+
+def make_runner() -> CampaignRunner:
+    return CampaignRunner(dispatcher=None, progress=None, trunks={}, answer_timeout=90)
+
+
+@pytest.mark.parametrize("code, expected", [("486", "busy"), ("480", "no_answer"), ("487", "no_answer"), ("404", "failed")])
+def test_sip_errors(code, expected):
+    assert make_runner()._classify(ROOM, {"call_status": "sip_error", "sip_status_code": code}, 5) == (
+        expected, {"sip_status_code": code},
+    )
+
+
+@pytest.mark.parametrize("status", [None, "dialing"])
+def test_ringing_call_times_out(status):
+    runner = make_runner()
+    metadata = {"call_status": status} if status else {}
+    assert runner._classify(ROOM, metadata, 30) is None
+    assert runner._classify(ROOM, metadata, 91) == ("timeout", {})
+    assert "timeout" in RETRYABLE_STATUSES
+
+
+def test_answered_call_never_times_out_and_completes():
+    runner = make_runner()
+    assert runner._classify(ROOM, {"call_status": "answered", "script_version": "v3"}, 300) is None
+    assert runner._classify(ROOM, {"call_status": "completed"}, 400) == ("completed", {"script_version": "v3"})
+
+
+def test_room_gone_after_answer_is_completed():
+    runner = make_runner()
+    runner._classify(ROOM, {"call_status": "answered", "script_version": "v3"}, 10)
+    assert runner._classify(ROOM, None, 20) == ("completed", {"script_version": "v3"})
+
+
+def test_room_gone_after_voicemail_is_retried_as_voicemail():
+    runner = make_runner()
+    assert runner._classify(ROOM, {"call_status": "voicemail", "script_version": "v3"}, 10) == (
+        "voicemail", {"script_version": "v3"},
+    )
+    # the room is deleted before the runner handles the result
+    assert runner._classify(ROOM, None, 12) == ("voicemail", {"script_version": "v3"})
+    assert "voicemail" in RETRYABLE_STATUSES
+
+
+def test_room_gone_before_any_status_is_failed():
+    status, details = make_runner()._classify(ROOM, None, 5)
+    assert status == "failed" and "error" in details
+
+
+def test_failed_call_keeps_its_status():
+    runner = make_runner()
+    runner._classify(ROOM, {"call_status": "answered", "script_version": "v2"}, 10)
+    assert runner._classify(ROOM, {"call_status": "failed"}, 15) == ("failed", {"script_version": "v2"})
@@ -0,0 +1,66 @@
+import pytest
+from conversation_state import TERMINAL_PATTERNS, ConversationState
+
+
+def terminal_outcome(text: str) -> str:
+    return next((name for name, pattern in TERMINAL_PATTERNS.items() if pattern.search(text)), "none")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Okay, I'll pay the full amount on Friday.", "commitment"),
+    ("I will make a payment next week.", "commitment"),
+    ("I can pay $50 a month.", "commitment"),
+    ("Let's do it.", "commitment"),
+    ("Fine, that's a deal.", "commitment"),
+    # looser phrasings the transcript feature counts must not end a simulated call
+    ("I'll pay later, maybe.", "none"),
+    ("I can do that math myself.", "none"),
+    ("Let's do the numbers first.", "none"),
+    ("Don't call me again.", "do_not_call"),
+    ("That's not my card.", "dispute"),
+    ("Can you call me back tomorrow?", "callback"),
+    ("I'm driving right now.", "callback"),
+    ("Goodbye.", "hang_up"),
+    ("*hangs up*", "hang_up"),
+    # the stronger outcome wins when a reply has several
+    ("Never call me again, goodbye.", "do_not_call"),
+    ("How much is the minimum?", "none"),
+])
+def test_terminal_patterns(text, expected):
+    assert terminal_outcome(text) == expected
+
+
+def test_commitment_ends_the_call_after_a_closing_turn():
+    state = ConversationState(max_turns=5)
+    state.observe("Who is this?")
+    assert not state.finished()
+    state.observe("Okay, I'll pay the full amount on Friday.")
+    assert state.finished() and state.needs_closing_turn()
+    assert state.summary()["outcome"] == "commitment"
+    assert state.summary()["evidence"] == "I'll pay"
+
+
+def test_hang_up_gets_no_closing_turn():
+    state = ConversationState(max_turns=5)
+    state.observe("Bye.")
+    assert state.finished() and not state.needs_closing_turn()
+
+
+def test_negotiation_extends_the_limit_up_to_the_extra_turns():
+    state = ConversationState(max_turns=2, max_extra_turns=2)
+    for _ in range(3):
+        state.observe("Could I do a payment plan with lower monthly payments?")
+    assert not state.finished()
+    state.observe("What if I pay $20 a month?")
+    assert state.finished()
+    summary = state.summary()
+    assert (summary["ended_by"], summary["turns"], summary["extra_turns"]) == ("turn_limit", 4, 2)
+    assert summary["still_negotiating"]
+
+
+def test_turn_limit_without_negotiation():
+    state = ConversationState(max_turns=2, max_extra_turns=3)
+    state.observe("Who is this?")
+    state.observe("I don't know.")
+    assert state.finished() and not state.needs_closing_turn()
+    assert state.summary()["extra_turns"] == 0
@@ -0,0 +1,77 @@
+import time
+import pytest
+from openai.types.chat import ChatCompletion
+from llm_cache import CacheMissError, ResponseCache
+
+REQUEST = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.7}
+
+
+def completion(content: str) -> ChatCompletion:
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+    })
+
+
+def test_key_ignores_dict_order_but_not_parameters():
+    reordered = {"temperature": 0.7, "messages": REQUEST["messages"], "model": "gpt-4o-mini"}
+    assert ResponseCache.key(REQUEST) == ResponseCache.key(reordered)
+    assert ResponseCache.key(REQUEST) != ResponseCache.key({**REQUEST, "temperature": 0.2})
+    assert ResponseCache.key(REQUEST) != ResponseCache.key({**REQUEST, "model": "gpt-4o"})
+
+
+def test_salt_separates_deliberately_repeated_requests():
+    assert ResponseCache.key(REQUEST, salt="batch-1") != ResponseCache.key(REQUEST, salt="batch-2")
+    assert ResponseCache.key(REQUEST, salt=None) != ResponseCache.key(REQUEST, salt="batch-1")
+
+
+def test_read_through_serves_what_it_stored(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    key = cache.key(REQUEST)
+    assert cache.lookup(key) is None
+    cache.store(key, "gpt-4o-mini", completion("hello"))
+    assert cache.lookup(key).choices[0].message.content == "hello"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_replay_fails_on_a_miss_and_never_stores(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    ResponseCache(path, mode="record").store("recorded", "gpt-4o-mini", completion("hello"))
+    cache = ResponseCache(path, mode="replay")
+    assert cache.lookup("recorded").choices[0].message.content == "hello"
+    cache.store("new", "gpt-4o-mini", completion("ignored"))
+    with pytest.raises(CacheMissError):
+        cache.lookup("new")
+
+
+def test_record_always_calls_the_api(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), mode="record")
+    cache.store("key", "gpt-4o-mini", completion("hello"))
+    assert cache.lookup("key") is None
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseCache(str(tmp_path / "responses.sqlite"), mode="sometimes")
+
+
+def test_evict_drops_least_recently_used_until_under_size(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), evict_every=1000)
+    for name in ("old", "new"):
+        cache.store(name, "gpt-4o-mini", completion(name))
+    size = cache.db.execute("SELECT size FROM responses WHERE key = 'new'").fetchone()[0]
+    cache.db.execute("UPDATE responses SET last_used_at = ? WHERE key = 'old'", (time.time() - 60,))
+    cache.max_bytes = size
+    cache.evict()
+    assert [row[0] for row in cache.db.execute("SELECT key FROM responses")] == ["new"]
+
+
+def test_evict_drops_entries_past_their_age(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_age_days=1, evict_every=1000)
+    cache.store("stale", "gpt-4o-mini", completion("stale"))
+    cache.db.execute("UPDATE responses SET last_used_at = ?", (time.time() - 2 * 86400,))
+    cache.evict()
+    assert cache.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from llm_cache import ResponseCache
+from llm_client import LLMClient, Route, parse_routes
+from test_llm_cache import completion
+
+REQUEST = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "hi"}]}
+
+
+def make_client(tmp_path, **kwargs) -> LLMClient:
+    return LLMClient(api_key="test", cache=ResponseCache(str(tmp_path / "responses.sqlite")), **kwargs)
+
+
+def test_cache_key_includes_the_effective_endpoint(tmp_path):
+    default = make_client(tmp_path)
+    mock = make_client(tmp_path, base_url="http://127.0.0.1:8799/v1")
+    assert default._cache_key("agent_turn", REQUEST, None) != mock._cache_key("agent_turn", REQUEST, None)
+    # an explicit default endpoint is the same endpoint as none at all
+    assert default._cache_key("agent_turn", REQUEST, None) == default.cache.key({**REQUEST, "base_url": "default"})
+
+
+def test_routed_stage_is_keyed_on_its_own_endpoint(tmp_path):
+    client = make_client(tmp_path, routes={"scoring": Route("local-model", "http://localhost:8000/v1")})
+    routed = make_client(tmp_path, base_url="http://localhost:8000/v1")
+    assert client._cache_key("scoring", REQUEST, None) == routed._cache_key("scoring", REQUEST, None)
+    assert client._cache_key("agent_turn", REQUEST, None) != routed._cache_key("agent_turn", REQUEST, None)
+    # a route that only changes the model stays on the client's endpoint
+    model_only = make_client(tmp_path, routes={"scoring": Route("gpt-4o")})
+    assert model_only._cache_key("scoring", REQUEST, None) == model_only._cache_key("agent_turn", REQUEST, None)
+
+
+def test_salt_is_part_of_the_key(tmp_path):
+    client = make_client(tmp_path)
+    assert client._cache_key("persona", REQUEST, "a") != client._cache_key("persona", REQUEST, "b")
+
+
+def test_chat_calls_the_api_once_per_endpoint(tmp_path):
+    calls = []
+
+    async def create(client, stage, persona, check_budget, **kwargs):
+        calls.append(str(client.base_url))
+        return completion(f"reply {len(calls)}")
+
+    async def ask(llm: LLMClient) -> str:
+        llm._create = create
+        try:
+            response = await llm.chat(stage="agent_turn", **REQUEST)
+            return response.choices[0].message.content
+        finally:
+            await llm.aclose()
+
+    assert asyncio.run(ask(make_client(tmp_path))) == "reply 1"
+    assert asyncio.run(ask(make_client(tmp_path))) == "reply 1"
+    assert asyncio.run(ask(make_client(tmp_path, base_url="http://127.0.0.1:8799/v1"))) == "reply 2"
+    assert len(calls) == 2
+
+
+def test_parse_routes_rejects_unknown_stages():
+    routes = parse_routes(["scoring=local-model@http://localhost:8000/v1", "agent_turn=gpt-4o"])
+    assert (routes["scoring"].model, routes["scoring"].base_url) == ("local-model", "http://localhost:8000/v1")
+    assert routes["agent_turn"].base_url is None
+    with pytest.raises(ValueError):
+        parse_routes(["judging=gpt-4o"])
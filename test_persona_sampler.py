@@ -0,0 +1,88 @@
+import asyncio
+import json
+import pytest
+from persona_pool import PersonaPool
+from persona_sampler import DIMENSIONS, PersonaSampler
+
+
+class FakeGenerator:
+    """Writes a persona per trait dict; the same text every time unless `distinct`."""
+
+    stratified_prompt_id = "test"
+
+    def __init__(self, distinct: bool = True):
+        self.distinct = distinct
+        self.requested = []
+
+    async def generate_for_traits(self, targets: list, batch_size: int = 10, cache_salt: str = "") -> list:
+        self.requested.extend(targets)
+        personas = []
+        for traits in targets:
+            if self.distinct:
+                story = " ".join(f"{dim} {value} persona number {len(self.requested)}" for dim, value in traits.items())
+            else:
+                story = "A debtor who lost their job and cannot pay this month."
+            personas.append({"name": "Sam", "background": story, "traits": dict(traits)})
+        return personas
+
+
+def test_plan_meets_uniform_quotas():
+    sampler = PersonaSampler(seed=0)
+    planned = sampler.plan(30)
+    hostility = [traits["hostility"] for traits in planned]
+    assert {value: hostility.count(value) for value in DIMENSIONS["hostility"]} == {
+        "calm": 10, "irritated": 10, "hostile": 10,
+    }
+    assert len({json.dumps(traits, sort_keys=True) for traits in planned}) == 30
+
+
+def test_plan_follows_quota_shares_and_skips_zero_quotas():
+    sampler = PersonaSampler(quotas={"hostility": {"hostile": 0.5, "irritated": 0.5, "calm": 0}}, seed=0)
+    hostility = [traits["hostility"] for traits in sampler.plan(20)]
+    assert hostility.count("hostile") == hostility.count("irritated") == 10
+    assert "calm" not in hostility
+
+
+def test_plan_is_reproducible_for_a_seed():
+    assert PersonaSampler(seed=3).plan(10) == PersonaSampler(seed=3).plan(10)
+
+
+@pytest.mark.parametrize("quotas", [
+    {"mood": {"calm": 1.0}},
+    {"hostility": {"furious": 1.0}},
+    {"hostility": {"calm": -1.0, "hostile": 2.0}},
+    {"hostility": {"calm": 0, "hostile": 0}},
+])
+def test_invalid_quotas_are_rejected(quotas):
+    with pytest.raises(ValueError):
+        PersonaSampler(quotas=quotas)
+
+
+def test_coverage_reports_empty_values_and_cells():
+    sampler = PersonaSampler(seed=0)
+    report = sampler.coverage([json.dumps({"traits": sampler.plan(1)[0]})])
+    assert report["personas"] == 1
+    assert report["pair_cells"]["covered"] == 10
+    assert len(report["empty_pair_cells"]) == report["pair_cells"]["total"] - 10
+    assert "hostility=hostile" in report["empty_values"] or "hostility=calm" in report["empty_values"]
+
+
+def test_sample_rejects_near_duplicates(tmp_path):
+    sampler = PersonaSampler(seed=0)
+    generator = FakeGenerator(distinct=False)
+    personas = asyncio.run(sampler.sample(generator, PersonaPool(str(tmp_path / "pool.jsonl")), 3, max_rounds=2))
+    # every generated persona reads the same, so only the first one is kept
+    assert len(personas) == 1
+    assert sampler.duplicates_rejected == 4
+    # the two rejected slots were asked for again with other trait combinations
+    first_round, second_round = generator.requested[1:3], generator.requested[3:]
+    assert all(retry != rejected for retry, rejected in zip(second_round, first_round))
+
+
+def test_sample_reuses_pooled_personas(tmp_path):
+    pool = PersonaPool(str(tmp_path / "pool.jsonl"))
+    first = asyncio.run(PersonaSampler(seed=0).sample(FakeGenerator(), pool, 4))
+    generator = FakeGenerator()
+    again = asyncio.run(PersonaSampler(seed=0).sample(generator, pool, 4))
+    assert sorted(again) == sorted(first)
+    assert generator.requested == []
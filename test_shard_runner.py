@@ -0,0 +1,89 @@
+import json
+from shard_runner import MAX_SHARD_ATTEMPTS, WorkQueue, merge_shards
+
+
+def make_queue(tmp_path, indices=range(5), shard_size=2) -> WorkQueue:
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+    queue.reset(list(indices), shard_size=shard_size)
+    return queue
+
+
+def test_claims_shards_in_order_until_empty(tmp_path):
+    queue = make_queue(tmp_path)
+    claimed = [queue.claim("w1"), queue.claim("w2"), queue.claim("w1")]
+    assert [indices for _, indices in claimed] == [[0, 1], [2, 3], [4]]
+    assert queue.claim("w2") is None
+    assert queue.counts() == {"leased": 3}
+
+
+def test_only_the_lease_holder_completes_a_shard(tmp_path):
+    queue = make_queue(tmp_path)
+    shard_id, _ = queue.claim("w1")
+    assert not queue.complete(shard_id, "w2", "shards/a.jsonl")
+    assert queue.complete(shard_id, "w1", "shards/a.jsonl")
+    assert not queue.renew(shard_id, "w1")
+    assert queue.outputs() == ["shards/a.jsonl"]
+
+
+def test_expired_lease_is_requeued(tmp_path):
+    queue = make_queue(tmp_path, indices=[0])
+    shard_id, _ = queue.claim("w1", lease_seconds=-1)
+    assert queue.claim("w2") == (shard_id, [0])
+    # the first worker came back too late
+    assert not queue.complete(shard_id, "w1", "shards/late.jsonl")
+    assert queue.complete(shard_id, "w2", "shards/w2.jsonl")
+    assert queue.outputs() == ["shards/w2.jsonl"]
+
+
+def test_expired_lease_on_last_attempt_fails_the_shard(tmp_path):
+    queue = make_queue(tmp_path, indices=[0])
+    for attempt in range(MAX_SHARD_ATTEMPTS):
+        assert queue.claim(f"w{attempt}", lease_seconds=-1) is not None
+    assert queue.claim("w-last") is None
+    assert queue.counts() == {"failed": 1}
+    assert queue.unfinished() == 0
+
+
+def test_released_shard_is_retried_then_failed(tmp_path):
+    queue = make_queue(tmp_path, indices=[0, 1])
+    for attempt in range(1, MAX_SHARD_ATTEMPTS + 1):
+        shard_id, _ = queue.claim("w1")
+        queue.release(shard_id, "w1", "boom", output=f"shards/attempt{attempt}.jsonl")
+        expected = "failed" if attempt == MAX_SHARD_ATTEMPTS else "pending"
+        assert queue.counts() == {expected: 1}
+    # the simulations that succeeded on the last attempt are kept
+    assert queue.outputs() == [f"shards/attempt{MAX_SHARD_ATTEMPTS}.jsonl"]
+
+
+def test_release_without_output_keeps_the_previous_one(tmp_path):
+    queue = make_queue(tmp_path, indices=[0])
+    shard_id, _ = queue.claim("w1")
+    queue.release(shard_id, "w1", "partial", output="shards/first.jsonl")
+    shard_id, _ = queue.claim("w1")
+    queue.release(shard_id, "w1", "crashed")
+    shard_id, _ = queue.claim("w1")
+    queue.release(shard_id, "w1", "crashed")
+    assert queue.outputs() == ["shards/first.jsonl"]
+
+
+def test_reset_voids_old_leases(tmp_path):
+    queue = make_queue(tmp_path, indices=[0])
+    shard_id, _ = queue.claim("w1")
+    queue.reset([0])
+    assert not queue.complete(shard_id, "w1", "shards/old.jsonl")
+    assert queue.counts() == {"pending": 1}
+
+
+def test_merge_keeps_the_first_log_per_persona(tmp_path):
+    queue = make_queue(tmp_path, indices=[0, 1, 2], shard_size=2)
+    (tmp_path / "shards").mkdir()
+    for worker, records in (("w1", [0, 1]), ("w2", [2, 1])):
+        shard_id, _ = queue.claim(worker)
+        output = f"shards/{worker}.jsonl"
+        with open(tmp_path / output, "w") as f:
+            for index in records:
+                f.write(json.dumps({"index": index, "messages": [], "outcome": {"worker": worker}}) + "\n")
+        queue.complete(shard_id, worker, output)
+    merged = merge_shards(str(tmp_path), queue)
+    assert list(merged) == [0, 1, 2]
+    assert merged[1].outcome == {"worker": "w1"}
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from transcript_features import OUTCOME_PATTERNS, OUTCOMES, extract_features, select_for_judging, summarize_features
+
+
+def outcome_of(text: str) -> str:
+    return next((name for name, pattern in OUTCOME_PATTERNS.items() if pattern.search(text)), "none")
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Okay, I'll pay the full amount on Friday.", "commitment"),
+    ("I will make a payment next week.", "commitment"),
+    ("I can set that up today.", "commitment"),
+    ("Sounds good to me.", "commitment"),
+    ("Fine, it's a deal.", "commitment"),
+    ("I'll think about it.", "none"),
+    ("I agree that I owe something, but not this much.", "commitment"),
+    ("This is not my debt.", "dispute"),
+    ("I already paid that last month.", "dispute"),
+    ("Don't call me again.", "do_not_call"),
+    # the first matching outcome in OUTCOME_PATTERNS order wins
+    ("Stop calling me, I already paid.", "do_not_call"),
+    ("What is this about?", "none"),
+])
+def test_outcome_patterns(text, expected):
+    assert outcome_of(text) == expected
+
+
+def conversation(agent_turns: list, user_turns: list) -> list:
+    log = []
+    for agent, user in zip(agent_turns, user_turns):
+        log += [{"role": "assistant", "content": agent}, {"role": "user", "content": user}]
+    return log
+
+
+def test_extract_features_per_conversation():
+    logs = [
+        conversation(
+            ["Hello, am I speaking with Sam?", "You can pay the full balance or set up a payment plan."],
+            ["Yes.", "I'll pay the full amount."],
+        ),
+        conversation(["**Hello** there", "**Hello** there"], ["Who is this?", "Not my account."]),
+        [],
+    ]
+    features = extract_features(logs)
+    assert features["turns_to_verification"][0] == 1
+    assert np.isnan(features["turns_to_verification"][1])
+    assert features["payment_options_offered"].tolist() == [2, 0, 0]
+    assert [OUTCOMES[code] for code in features["outcome"]] == ["commitment", "dispute", "none"]
+    assert features["markdown_rate"].tolist() == [0, 1, 0]
+    assert features["repetition"][1] == pytest.approx(1.0)
+    assert features["repetition"][0] < 0.5
+
+
+def test_select_for_judging_picks_the_lowest_prescored():
+    good = conversation(
+        ["Am I speaking with Sam? You can pay the full balance, the minimum payment, or a payment plan."],
+        ["I'll pay the minimum payment."],
+    )
+    bad = conversation(["**Hi**", "**Hi**"], ["What?", "Huh?"])
+    assert select_for_judging([good, bad, good], 1) == [1]
+    assert summarize_features(extract_features([]))["count"] == 0
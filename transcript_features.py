@@ -0,0 +1,184 @@
+import logging
+import re
+import zlib
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+VERIFICATION_PATTERN = re.compile(
+    r"am i speaking (with|to)|is this \w+|confirm (your|that)|verify|date of birth|last four", re.I
+)
+PAYMENT_OPTION_PATTERNS = (
+    re.compile(r"full (amount|balance|payment)|pay (it|the balance) in full", re.I),
+    re.compile(r"minimum (payment|amount|due)", re.I),
+    re.compile(r"payment plan|installments?|monthly payments?", re.I),
+)
+MARKDOWN_PATTERN = re.compile(r"\*\*|__|^\s*#|^\s*[-*•]\s|^\s*\d+\.\s|\[[^\]]*\]\(", re.M)
+
+# debtor phrases that mark how the call ended, checked in this order
+OUTCOME_PATTERNS = {
+    "do_not_call": re.compile(r"(stop|don'?t|do not|never) call", re.I),
+    "dispute": re.compile(r"not my (debt|card|account)|already paid|dispute|never (had|opened)", re.I),
+    "commitment": re.compile(
+        r"\bi(?:'ll| will| can) (pay|make (a|the) payment|do that|set (that|it) up)|\b(sounds good|let'?s do|i agree)\b|\b(it'?s a |that'?s a )deal\b", re.I
+    ),
+}
+OUTCOMES = ("none", *OUTCOME_PATTERNS)
+
+FEATURE_NAMES = (
+    "turns_to_verification",
+    "payment_options_offered",
+    "outcome",
+    "agent_words_per_turn",
+    "markdown_rate",
+    "repetition",
+)
+
+# width of the hashed bag-of-words vectors used to spot repeated agent turns
+HASH_DIM = 1024
+WORD_PATTERN = re.compile(r"[a-z']+")
+
+# agent turns vectorised at a time, keeps the dense matrix small for very large batches
+CHUNK_SIZE = 4096
+
+
+def hashed_bow(texts: list) -> np.ndarray:
+    """L2-normalised hashed bag-of-words matrix, one row per text."""
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        hashes = [zlib.crc32(word.encode()) % HASH_DIM for word in WORD_PATTERN.findall(text.lower())]
+        rows.extend([row] * len(hashes))
+        cols.extend(hashes)
+    matrix = np.zeros((len(texts), HASH_DIM), dtype=np.float32)
+    np.add.at(matrix, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)), 1.0)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _consecutive_similarity(texts: list) -> np.ndarray:
+    """Cosine similarity of every text with the one before it (len(texts) - 1 values)."""
+    similarity = np.zeros(max(len(texts) - 1, 0), dtype=np.float32)
+    previous = None
+    for start in range(0, len(texts), CHUNK_SIZE):
+        block = hashed_bow(texts[start:start + CHUNK_SIZE])
+        if previous is not None:
+            similarity[start - 1] = block[0] @ previous
+        similarity[start:start + len(block) - 1] = np.einsum("ij,ij->i", block[1:], block[:-1])
+        previous = block[-1]
+    return similarity
+
+
+def extract_features(conversation_logs: list) -> dict:
+    """Computes per-conversation features for a batch of logs.
+
+    Returns a dict of arrays of length len(conversation_logs), keyed by FEATURE_NAMES.
+    `turns_to_verification` is NaN when the agent never verified identity and
+    `outcome` indexes into OUTCOMES.
+    """
+    n = len(conversation_logs)
+    # flatten every agent message of every log so the per-message work is done once, in bulk
+    owner, turn, texts = [], [], []
+    user_texts = [""] * n
+    for i, log in enumerate(conversation_logs):
+        agent_turn = 0
+        user_parts = []
+        for msg in log:
+            if msg["role"] == "assistant":
+                owner.append(i)
+                turn.append(agent_turn)
+                texts.append(msg["content"] or "")
+                agent_turn += 1
+            else:
+                user_parts.append(msg["content"] or "")
+        user_texts[i] = "\n".join(user_parts)
+
+    owner = np.asarray(owner, dtype=np.int64)
+    turn = np.asarray(turn, dtype=np.float64)
+    words = np.fromiter((len(t.split()) for t in texts), dtype=np.float64, count=len(texts))
+    verifies = np.fromiter((bool(VERIFICATION_PATTERN.search(t)) for t in texts), dtype=bool, count=len(texts))
+    markdown = np.fromiter((bool(MARKDOWN_PATTERN.search(t)) for t in texts), dtype=bool, count=len(texts))
+    options = np.array(
+        [[bool(p.search(t)) for p in PAYMENT_OPTION_PATTERNS] for t in texts], dtype=bool
+    ).reshape(len(texts), len(PAYMENT_OPTION_PATTERNS))
+
+    agent_turns = np.bincount(owner, minlength=n).astype(np.float64)
+    per_log = np.maximum(agent_turns, 1.0)
+
+    turns_to_verification = np.full(n, np.inf)
+    np.minimum.at(turns_to_verification, owner[verifies], turn[verifies] + 1)
+    turns_to_verification[np.isinf(turns_to_verification)] = np.nan
+
+    offered = np.zeros((n, len(PAYMENT_OPTION_PATTERNS)), dtype=bool)
+    np.logical_or.at(offered, owner, options)
+
+    # cosine similarity of each agent turn with the agent's previous turn in the same log
+    repetition = np.zeros(n)
+    if len(texts) > 1:
+        similarity = _consecutive_similarity(texts)
+        same_log = owner[1:] == owner[:-1]
+        np.maximum.at(repetition, owner[1:][same_log], similarity[same_log])
+
+    outcome = np.zeros(n, dtype=np.int64)
+    for i, text in enumerate(user_texts):
+        for code, pattern in enumerate(OUTCOME_PATTERNS.values(), start=1):
+            if pattern.search(text):
+                outcome[i] = code
+                break
+
+    return {
+        "turns_to_verification": turns_to_verification,
+        "payment_options_offered": offered.sum(axis=1).astype(np.float64),
+        "outcome": outcome,
+        "agent_words_per_turn": np.bincount(owner, weights=words, minlength=n) / per_log,
+        "markdown_rate": np.bincount(owner, weights=markdown.astype(np.float64), minlength=n) / per_log,
+        "repetition": repetition,
+    }
+
+
+def prescore(features: dict) -> np.ndarray:
+    """Cheap 1-10 quality estimate per conversation, used only to rank and filter."""
+    verification = np.where(
+        np.isnan(features["turns_to_verification"]),
+        0.0,
+        1.0 / np.maximum(features["turns_to_verification"], 1.0),
+    )
+    options = features["payment_options_offered"] / len(PAYMENT_OPTION_PATTERNS)
+    resolved = (features["outcome"] > 0).astype(np.float64)
+    # past ~60 words a spoken turn gets too long to listen to
+    verbosity_penalty = np.clip((features["agent_words_per_turn"] - 60.0) / 60.0, 0.0, 1.0)
+
+    score = (
+        2.5 * verification
+        + 2.5 * options
+        + 2.0 * resolved
+        + 3.0
+        - 1.5 * verbosity_penalty
+        - 2.0 * features["markdown_rate"]
+        - 2.0 * np.clip(features["repetition"] - 0.6, 0.0, 0.4) / 0.4
+    )
+    return np.clip(score, 1.0, 10.0)
+
+
+def select_for_judging(conversation_logs: list, limit: int) -> list:
+    """Indices of the `limit` lowest pre-scored conversations, the ones an LLM judge learns most from."""
+    scores = prescore(extract_features(conversation_logs))
+    return sorted(np.argsort(scores, kind="stable")[:limit].tolist())
+
+
+def summarize_features(features: dict) -> dict:
+    """Run-level regression signal: averages of every feature plus the outcome mix."""
+    if len(features["outcome"]) == 0:
+        return {"count": 0}
+    summary = {
+        "count": len(features["outcome"]),
+        "verified_rate": float(np.mean(~np.isnan(features["turns_to_verification"]))),
+        "mean_turns_to_verification": float(np.nanmean(features["turns_to_verification"]))
+        if np.any(~np.isnan(features["turns_to_verification"])) else None,
+    }
+    for name in ("payment_options_offered", "agent_words_per_turn", "markdown_rate", "repetition"):
+        summary[f"mean_{name}"] = float(np.mean(features[name]))
+    counts = np.bincount(features["outcome"], minlength=len(OUTCOMES))
+    summary["outcomes"] = {name: int(count) for name, count in zip(OUTCOMES, counts)}
+    summary["mean_prescore"] = float(np.mean(prescore(features)))
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in summary.items()}
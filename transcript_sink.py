@@ -0,0 +1,129 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_TRANSCRIPT_DIR = "transcripts"
+
+
+class TranscriptSink:
+    """Buffers call events in memory and appends them to rotating JSONL files off the event loop.
+
+    Each line is one event of one call: `{"call_id", "ts", "type": "message", "role", "content"}`
+    for conversation items, `{"type": "tool", "name", "arguments", "output", "is_error"}` for tool
+    calls, and `{"type": "call", ...}` for call-level details. `read_conversations` groups them
+    back into the `[{"role", "content"}, ...]` logs the simulator produces and the optimizer scores.
+
+    At most `max_pending` events are held. `emit` (for synchronous session callbacks) drops
+    and counts events beyond that instead of blocking the call; `put` waits for room instead.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_TRANSCRIPT_DIR,
+        max_pending: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_file_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_file_bytes = max_file_bytes
+        self.dropped = 0
+        self.written = 0
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._writer = None
+        self._path = None
+        self._file_index = 0
+
+    def emit(self, call_id: str, type: str, **fields):
+        """Queues an event without waiting; never blocks the caller."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait({"call_id": call_id, "ts": time.time(), "type": type, **fields})
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logging.warning(f"transcript sink is full, {self.dropped} events dropped so far")
+
+    async def put(self, call_id: str, type: str, **fields):
+        """Queues an event, waiting while the buffer is full."""
+        self._ensure_writer()
+        await self._queue.put({"call_id": call_id, "ts": time.time(), "type": type, **fields})
+
+    async def flush(self):
+        """Waits until every event queued so far is on disk."""
+        if self._writer is not None:
+            await self._queue.join()
+
+    async def aclose(self):
+        await self.flush()
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+
+    def _ensure_writer(self):
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            # wait a little for more events so each write covers many of them
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+                self.written += len(batch)
+            except Exception as e:
+                logging.error(f"failed to write {len(batch)} transcript events: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch: list):
+        if self._path is None or os.path.getsize(self._path) >= self.max_file_bytes:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file_index += 1
+            self._path = os.path.join(
+                self.directory,
+                f"transcripts-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._file_index:04d}.jsonl",
+            )
+            open(self._path, "a").close()
+        with open(self._path, "a") as f:
+            f.write("".join(json.dumps(event, default=str) + "\n" for event in batch))
+
+
+def read_events(directory: str = DEFAULT_TRANSCRIPT_DIR):
+    """Yields every event from the sink's files, oldest file first; skips a torn last line."""
+    for path in sorted(glob.glob(os.path.join(directory, "transcripts-*.jsonl"))):
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def read_conversations(directory: str = DEFAULT_TRANSCRIPT_DIR, min_messages: int = 2) -> list:
+    """Conversation logs of recorded calls, in the simulator's `[{"role", "content"}, ...]` format."""
+    conversations = {}
+    for event in read_events(directory):
+        if event["type"] == "message" and event.get("role") in ("user", "assistant") and event.get("content"):
+            conversations.setdefault(event["call_id"], []).append(
+                {"role": event["role"], "content": event["content"]}
+            )
+    return [log for log in conversations.values() if len(log) >= min_messages]
@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+from collections import defaultdict
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# USD per million tokens: (prompt, cached prompt, completion); dated snapshots match by prefix
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4-turbo": (10.00, 10.00, 30.00),
+    "gpt-4": (30.00, 30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+}
+
+# share of the list price Batch API requests are billed at
+BATCH_PRICE_FACTOR = 0.5
+
+# what each pipeline call is charged to
+STAGES = ("persona", "agent_turn", "persona_turn", "summary", "scoring", "optimization")
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised before an API call once its stage (or the whole run) has spent its budget."""
+
+    def __init__(self, stage: str, message: str):
+        super().__init__(message)
+        self.stage = stage
+
+
+def model_price(model: str) -> tuple | None:
+    """Price row of `model`, matching the longest known prefix (e.g. gpt-4o-mini-2024-07-18)."""
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_PRICES[name]
+    return None
+
+
+def parse_stage_budgets(values: list) -> dict:
+    """Turns `["scoring=0.5", "optimization=2"]` into `{"scoring": 0.5, "optimization": 2.0}`."""
+    budgets = {}
+    for value in values:
+        stage, _, amount = value.partition("=")
+        if stage not in STAGES or not amount:
+            raise ValueError(f"invalid stage budget {value!r}, expected <stage>=<usd> with a stage from {STAGES}")
+        budgets[stage] = float(amount)
+    return budgets
+
+
+def _totals() -> dict:
+    return {"calls": 0, "batch_calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+
+
+class UsageTracker:
+    """Accounts the `usage` of every chat completion per stage, model and persona, and enforces budgets.
+
+    Budgets are in USD, per stage and for the whole run. They are checked before each
+    API call (before each conversation, for simulations), so work already in flight
+    when a budget runs out still completes and the final spend can overshoot by up
+    to one call or conversation per concurrent job. Responses served from the response
+    cache cost nothing and are only counted.
+    """
+
+    def __init__(self, run_budget: float | None = None, stage_budgets: dict | None = None):
+        self.run_budget = run_budget
+        self.stage_budgets = dict(stage_budgets or {})
+        self.total = _totals()
+        self.by_stage = defaultdict(_totals)
+        self.by_model = defaultdict(_totals)
+        self.by_persona = defaultdict(_totals)
+        self.cache_hits = defaultdict(int)
+        self.unpriced_models = set()
+
+    def record(self, stage: str, model: str, usage, persona: str | None = None, batch: bool = False):
+        """Adds one response's `usage` (the SDK object, a dict, or None if the API sent none).
+
+        `batch` marks a response of a Batch API job, billed at BATCH_PRICE_FACTOR of the list price.
+        """
+        if usage is None:
+            usage = {}
+        elif not isinstance(usage, dict):
+            usage = usage.model_dump()
+        prompt = usage.get("prompt_tokens") or 0
+        completion = usage.get("completion_tokens") or 0
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        cost = self.cost(model, prompt, cached, completion)
+        if batch:
+            cost *= BATCH_PRICE_FACTOR
+
+        buckets = [self.total, self.by_stage[stage], self.by_model[model]]
+        if persona is not None:
+            buckets.append(self.by_persona[persona])
+        for bucket in buckets:
+            bucket["calls"] += 1
+            bucket["batch_calls"] += batch
+            bucket["prompt_tokens"] += prompt
+            bucket["cached_tokens"] += cached
+            bucket["completion_tokens"] += completion
+            bucket["cost_usd"] += cost
+
+    def merge(self, report: dict):
+        """Adds the usage of another tracker's `report()`, e.g. one written by a shard worker."""
+        def _add(bucket: dict, totals: dict):
+            for key, value in totals.items():
+                bucket[key] = bucket.get(key, 0) + value
+
+        _add(self.total, report["total"])
+        for buckets, totals in (
+            (self.by_stage, report["by_stage"]),
+            (self.by_model, report["by_model"]),
+            (self.by_persona, report["by_persona"]),
+        ):
+            for name, entry in totals.items():
+                _add(buckets[name], entry)
+        for stage, hits in report["cache_hits"].items():
+            self.cache_hits[stage] += hits
+        self.unpriced_models.update(report["unpriced_models"])
+
+    def record_cache_hit(self, stage: str):
+        self.cache_hits[stage] += 1
+
+    def cost(self, model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+        price = model_price(model)
+        if price is None:
+            if model not in self.unpriced_models:
+                logging.warning(f"no price known for model {model!r}, its calls are counted at $0")
+                self.unpriced_models.add(model)
+            return 0.0
+        prompt_price, cached_price, completion_price = price
+        return (
+            (prompt_tokens - cached_tokens) * prompt_price
+            + cached_tokens * cached_price
+            + completion_tokens * completion_price
+        ) / 1_000_000
+
+    def exhausted(self, *stages: str) -> str | None:
+        """Why no more calls may be made for `stages` (or for the run), or None if they still may."""
+        if self.run_budget is not None and self.total["cost_usd"] >= self.run_budget:
+            return f"run budget of ${self.run_budget:g} spent (${self.total['cost_usd']:.4f})"
+        for stage in stages:
+            budget = self.stage_budgets.get(stage)
+            if budget is not None and self.by_stage[stage]["cost_usd"] >= budget:
+                return f"{stage} budget of ${budget:g} spent (${self.by_stage[stage]['cost_usd']:.4f})"
+        return None
+
+    def check(self, stage: str):
+        reason = self.exhausted(stage)
+        if reason is not None:
+            raise BudgetExceededError(stage, reason)
+
+    def report(self) -> dict:
+        def _rounded(totals: dict) -> dict:
+            return {**totals, "cost_usd": round(totals["cost_usd"], 6)}
+
+        return {
+            "total": _rounded(self.total),
+            "by_stage": {stage: _rounded(t) for stage, t in self.by_stage.items()},
+            "by_model": {model: _rounded(t) for model, t in self.by_model.items()},
+            "by_persona": {persona: _rounded(t) for persona, t in self.by_persona.items()},
+            "cache_hits": dict(self.cache_hits),
+            "budgets": {"run": self.run_budget, "stages": self.stage_budgets},
+            "unpriced_models": sorted(self.unpriced_models),
+        }
+
+    def log_summary(self):
+        logging.info(
+            f"API usage: {self.total['calls']} calls, {self.total['prompt_tokens']} prompt tokens "
+            f"({self.total['cached_tokens']} cached), {self.total['completion_tokens']} completion tokens, "
+            f"${self.total['cost_usd']:.4f}"
+        )
+        for stage, totals in sorted(self.by_stage.items(), key=lambda item: -item[1]["cost_usd"]):
+            logging.info(
+                f"  {stage}: {totals['calls']} calls, {totals['prompt_tokens'] + totals['completion_tokens']} tokens, "
+                f"${totals['cost_usd']:.4f}"
+            )
+        if self.by_persona:
+            per_persona = sum(t["cost_usd"] for t in self.by_persona.values()) / len(self.by_persona)
+            logging.info(f"  mean simulation cost per persona: ${per_persona:.4f} over {len(self.by_persona)} personas")
+
+    def write(self, path: str):
+        """Writes the report as JSON, atomically."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.report(), f, indent=4)
+        os.replace(tmp, path)
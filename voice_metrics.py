@@ -0,0 +1,203 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+from collections import deque
+from livekit.agents import (
+    AgentSession,
+    AgentStateChangedEvent,
+    ConversationItemAddedEvent,
+    FunctionToolsExecutedEvent,
+    MetricsCollectedEvent,
+    metrics,
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+QUANTILES = (0.5, 0.95, 0.99)
+# samples kept per histogram; older ones are dropped so memory stays flat on long-lived workers
+MAX_SAMPLES = 5000
+DEFAULT_METRICS_DIR = "metrics"
+
+
+class LatencyHistogram:
+    """Count and sum of every observation, plus a bounded window of recent samples for quantiles."""
+
+    def __init__(self, samples: list | None = None, count: int = 0, total: float = 0.0):
+        self.samples = deque(samples or (), maxlen=MAX_SAMPLES)
+        self.count = count
+        self.total = total
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def merge(self, other: "LatencyHistogram"):
+        self.samples.extend(other.samples)
+        self.count += other.count
+        self.total += other.total
+
+
+class VoiceMetrics:
+    """Per-turn latency, tool-call durations and interruption counts for one worker process.
+
+    A turn's latency is end of user speech -> turn committed (EOU delay) -> first LLM token
+    (TTFT) -> first TTS audio (TTFB); the three parts are matched on their `speech_id`.
+    All handlers are plain synchronous callbacks, so no task is created per event.
+    """
+
+    def __init__(self):
+        # stage name -> histogram (seconds)
+        self.histograms = {}
+        self.counters = {"turns": 0, "interruptions": 0, "tool_calls": 0, "tool_errors": 0}
+        # speech_id -> stage parts seen so far for turns that are not complete yet
+        self._open_turns = {}
+
+    def observe(self, stage: str, seconds: float):
+        self.histograms.setdefault(stage, LatencyHistogram()).observe(seconds)
+
+    def attach(self, session: AgentSession):
+        session.on("metrics_collected", self._on_metrics)
+        session.on("function_tools_executed", self._on_tools_executed)
+        session.on("conversation_item_added", self._on_item_added)
+
+    def track_first_audio(self, session: AgentSession, since: float, on_measured=None):
+        """Observes `time_to_first_audio`: seconds from `since` (perf_counter() at pickup) until the agent first speaks.
+
+        `on_measured(seconds)` is called with the call's value, e.g. to record it with the transcript.
+        """
+        def on_state_changed(event: AgentStateChangedEvent):
+            if event.new_state != "speaking":
+                return
+            session.off("agent_state_changed", on_state_changed)
+            seconds = time.perf_counter() - since
+            self.observe("time_to_first_audio", seconds)
+            if on_measured is not None:
+                on_measured(seconds)
+
+        session.on("agent_state_changed", on_state_changed)
+
+    def _on_metrics(self, event: MetricsCollectedEvent):
+        m = event.metrics
+        if isinstance(m, metrics.EOUMetrics):
+            self._turn_part(m.speech_id, "eou_delay", m.end_of_utterance_delay)
+        elif isinstance(m, metrics.LLMMetrics) and not m.cancelled:
+            self._turn_part(m.speech_id, "llm_ttft", m.ttft)
+        elif isinstance(m, metrics.TTSMetrics) and not m.cancelled:
+            self._turn_part(m.speech_id, "tts_ttfb", m.ttfb)
+
+    def _turn_part(self, speech_id: str | None, stage: str, seconds: float):
+        if seconds is None or seconds < 0:
+            return
+        self.observe(stage, seconds)
+        if not speech_id:
+            return
+        parts = self._open_turns.setdefault(speech_id, {})
+        # a turn can produce several LLM/TTS requests (e.g. after tool calls); the first one is what the caller hears
+        parts.setdefault(stage, seconds)
+        if len(parts) == 3:
+            self.observe("turn_latency", sum(parts.values()))
+            logging.debug(f"turn {speech_id}: {parts}")
+            self.counters["turns"] += 1
+            del self._open_turns[speech_id]
+        elif len(self._open_turns) > 100:
+            # agent-initiated speech (greetings, fillers) never gets an EOU part
+            self._open_turns.pop(next(iter(self._open_turns)))
+
+    def _on_tools_executed(self, event: FunctionToolsExecutedEvent):
+        for call, output in zip(event.function_calls, event.function_call_outputs):
+            self.counters["tool_calls"] += 1
+            if output is None:
+                continue
+            if output.is_error:
+                self.counters["tool_errors"] += 1
+            self.observe(f"tool:{call.name}", max(0.0, output.created_at - call.created_at))
+
+    def _on_item_added(self, event: ConversationItemAddedEvent):
+        if getattr(event.item, "interrupted", False):
+            self.counters["interruptions"] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "histograms": {
+                stage: {"samples": list(h.samples), "count": h.count, "sum": h.total}
+                for stage, h in self.histograms.items()
+            },
+        }
+
+    @classmethod
+    def from_snapshots(cls, snapshots: list) -> "VoiceMetrics":
+        merged = cls()
+        for snapshot in snapshots:
+            for name, value in snapshot["counters"].items():
+                merged.counters[name] = merged.counters.get(name, 0) + value
+            for stage, h in snapshot["histograms"].items():
+                merged.histograms.setdefault(stage, LatencyHistogram()).merge(
+                    LatencyHistogram(h["samples"], h["count"], h["sum"])
+                )
+        return merged
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition: one summary per stage plus the counters."""
+        lines = [
+            "# HELP voice_stage_latency_seconds Voice pipeline latency per stage",
+            "# TYPE voice_stage_latency_seconds summary",
+        ]
+        for stage, h in sorted(self.histograms.items()):
+            for q in QUANTILES:
+                value = h.quantile(q)
+                if value is not None:
+                    lines.append(f'voice_stage_latency_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'voice_stage_latency_seconds_sum{{stage="{stage}"}} {h.total:.6f}')
+            lines.append(f'voice_stage_latency_seconds_count{{stage="{stage}"}} {h.count}')
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE voice_{name}_total counter")
+            lines.append(f"voice_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: str = DEFAULT_METRICS_DIR):
+        """Writes this process's snapshot and Prometheus file, atomically."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"voice_metrics_{os.getpid()}")
+        for path, content in ((f"{base}.json", json.dumps(self.snapshot())), (f"{base}.prom", self.to_prometheus())):
+            with open(path + ".tmp", "w") as f:
+                f.write(content)
+            os.replace(path + ".tmp", path)
+
+
+
+def merge_directory(directory: str) -> VoiceMetrics:
+    """Aggregates the snapshots of every worker process that exported into `directory`."""
+    snapshots = []
+    for path in glob.glob(os.path.join(directory, "voice_metrics_*.json")):
+        with open(path, "r") as f:
+            snapshots.append(json.load(f))
+    return VoiceMetrics.from_snapshots(snapshots)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Aggregate the voice latency metrics exported by worker processes.")
+    parser.add_argument("directory", nargs="?", default=DEFAULT_METRICS_DIR)
+    parser.add_argument("--output", default=None, help="write the merged Prometheus file here instead of stdout")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    merged = merge_directory(args.directory).to_prometheus()
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(merged)
+    else:
+        print(merged, end="")